@@ -0,0 +1,441 @@
+"""API benchmark helpers."""
+import functools
+import io
+import json
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import setup_databases
+from django.test.utils import setup_test_environment
+from django.test.utils import teardown_databases
+from django.test.utils import teardown_test_environment
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from curriculum.models import Course
+from curriculum.models import Lesson
+from mission_control.models import BlockDiagram
+from mission_control.models import BlockDiagramBlogQuestion
+from mission_control.models import BlogQuestion
+from mission_control.models import CONTENT_INDEX_FIELDS
+from mission_control.models import Tag
+
+User = get_user_model()
+
+ADJECTIVES = (
+    'amazing', 'blinking', 'brave', 'careful', 'crazy', 'dancing', 'fast',
+    'happy', 'lazy', 'little', 'loud', 'quiet', 'shy', 'sleepy', 'smart',
+    'spinning', 'super', 'tiny', 'wobbly', 'zippy',
+)
+NOUNS = (
+    'avoider', 'bot', 'bumper', 'dance', 'explorer', 'follower', 'light',
+    'line', 'maze', 'obstacle', 'party', 'patrol', 'racer', 'robot',
+    'rover', 'sensor', 'square', 'tracker', 'wanderer', 'zigzag',
+)
+QUESTIONS = (
+    'What does your program do?',
+    'What was the hardest part?',
+    'What would you change next time?',
+    'How did you test your program?',
+    'Which sensor did you use, and why?',
+)
+
+BLOCKLY_NAMESPACE = 'https://developers.google.com/blockly/xml'
+BLOCK_ID_CHARACTERS = (
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!#$%()*+,-'
+)
+MOTORS = ('LEFT', 'RIGHT', 'BOTH')
+SENSORS = ('LEFT_IR', 'RIGHT_IR', 'LEFT_LINE', 'RIGHT_LINE', 'DISTANCE')
+COMPARISONS = ('EQ', 'NEQ', 'LT', 'LTE', 'GT', 'GTE')
+
+
+@contextmanager
+def benchmark_database(verbosity=0, keepdb=False):
+    """Run the benchmark in a throwaway database, like the test runner."""
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity, interactive=False, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def free_port():
+    """Find a free local port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def database_url(settings_dict):
+    """Build a database URL for the connection settings."""
+    credentials = quote(settings_dict['USER'] or '')
+    if settings_dict['PASSWORD']:
+        credentials += ':' + quote(settings_dict['PASSWORD'])
+    host = settings_dict['HOST'] or ''
+    if settings_dict['PORT']:
+        host += f':{settings_dict["PORT"]}'
+    at = '@' if credentials else ''
+    return f'postgres://{credentials}{at}{host}/{settings_dict["NAME"]}'
+
+
+@contextmanager
+def gunicorn(environ, *args):
+    """
+    Serve the benchmark database with gunicorn until the context exits.
+
+    Yields the gunicorn master process and the URL it serves.
+    """
+    port = free_port()
+    environ = dict(
+        environ,
+        DATABASE_URL=database_url(connection.settings_dict),
+        DJANGO_ALLOWED_HOSTS='127.0.0.1',
+    )
+    process = subprocess.Popen([
+        # gunicorn 19 cannot be run with -m
+        sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()',
+        'config.wsgi', '-c', 'config/gunicorn.py',
+        '-b', f'127.0.0.1:{port}', *args,
+    ], cwd=str(settings.ROOT_DIR), env=environ)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except ConnectionError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError('gunicorn failed to start')
+                time.sleep(0.2)
+        yield process, f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def access_token(user, tier=2):
+    """Create an access token for the user, as the JWT login would."""
+    token = AccessToken.for_user(user)
+    token['username'] = user.username
+    token['show_guide'] = user.show_guide
+    token['tier'] = tier
+    return str(token)
+
+
+def authenticated_client(user, tier=2):
+    """Create an API client authenticated as the user."""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'JWT {access_token(user, tier)}')
+    return client
+
+
+def program_name(rand):
+    """Generate a plausible student program name."""
+    return '{} {} {}'.format(
+        rand.choice(ADJECTIVES).title(),
+        rand.choice(NOUNS),
+        rand.randint(1, 999),
+    )
+
+
+def _block_id(rand):
+    """Generate a Blockly block id."""
+    return ''.join(rand.choice(BLOCK_ID_CHARACTERS) for _ in range(20))
+
+
+def _number(rand, name, value):
+    """Generate a value input holding a number shadow block."""
+    return (
+        f'<value name="{name}"><shadow type="math_number" '
+        f'id="{_block_id(rand)}"><field name="NUM">{value}</field>'
+        '</shadow></value>')
+
+
+def _condition(rand):
+    """Generate a sensor comparison for a value input."""
+    return (
+        f'<block type="logic_compare" id="{_block_id(rand)}">'
+        f'<field name="OP">{rand.choice(COMPARISONS)}</field>'
+        f'<value name="A"><block type="sensor_read" id="{_block_id(rand)}">'
+        f'<field name="SENSOR">{rand.choice(SENSORS)}</field></block>'
+        f'</value>{_number(rand, "B", rand.randrange(0, 101, 5))}</block>')
+
+
+def _stack(rand, budget, depth):
+    """
+    Generate a stack of statement blocks, spending the budget of blocks.
+
+    Stacks end at random, so programs are a mix of long sequences and
+    nested loops and conditions.
+    """
+    budget[0] -= 1
+    block_id = _block_id(rand)
+    if depth < 4 and budget[0] > 1 and rand.random() < 0.25:
+        if rand.random() < 0.5:
+            block = (
+                f'<block type="controls_repeat_ext" id="{block_id}">'
+                f'{_number(rand, "TIMES", rand.randint(2, 10))}'
+                f'<statement name="DO">{_stack(rand, budget, depth + 1)}'
+                '</statement>')
+        else:
+            block = (
+                f'<block type="controls_if" id="{block_id}">'
+                f'<value name="IF0">{_condition(rand)}</value>'
+                f'<statement name="DO0">{_stack(rand, budget, depth + 1)}'
+                '</statement>')
+    elif rand.random() < 0.7:
+        block = (
+            f'<block type="motor_start" id="{block_id}">'
+            f'<field name="SIDE">{rand.choice(MOTORS)}</field>'
+            '<field name="DIRECTION">'
+            f'{rand.choice(("FORWARD", "BACKWARD"))}</field>'
+            f'{_number(rand, "SPEED", rand.randrange(10, 101, 10))}')
+    else:
+        block = (
+            f'<block type="motor_stop" id="{block_id}">'
+            f'<field name="SIDE">{rand.choice(MOTORS)}</field>')
+
+    if budget[0] > 0 and rand.random() < 0.85:
+        block += f'<next>{_stack(rand, budget, depth)}</next>'
+    return block + '</block>'
+
+
+def blockly_xml(rand, block_count=None):
+    """
+    Generate the Blockly XML of a plausible student program.
+
+    The program has block_count statement blocks (plus the blocks in their
+    inputs) in one or more stacks. By default the size is drawn from a
+    long-tailed distribution: most programs are small, a few are large.
+    """
+    if block_count is None:
+        block_count = min(300, max(1, int(rand.lognormvariate(2.5, 0.8))))
+    budget = [block_count]
+    stacks = []
+    while budget[0] > 0:
+        stacks.append(_stack(rand, budget, 0).replace(
+            '>', f' x="{rand.randint(0, 800)}" y="{rand.randint(0, 600)}">',
+            1))
+    return f'<xml xmlns="{BLOCKLY_NAMESPACE}">{"".join(stacks)}</xml>'
+
+
+def seed_users(count, prefix='student', batch_size=5000):
+    """Create users, and the support user, without running the signals."""
+    User.objects.bulk_create([
+        User(username='support', email=settings.SUPPORT_CONTACT)])
+    users = [
+        User(username=f'{prefix}{number}', email=f'{prefix}{number}@x.test')
+        for number in range(count)
+    ]
+    User.objects.bulk_create(users, batch_size=batch_size)
+    return list(User.objects.filter(username__startswith=prefix))
+
+
+@functools.lru_cache(maxsize=1)
+def index_content(content):
+    """Index the content as saving a block diagram would."""
+    indexed = BlockDiagram(content=content)
+    indexed.index_content()
+    return {field: getattr(indexed, field) for field in CONTENT_INDEX_FIELDS}
+
+
+def seed_block_diagrams(count, users, content='<xml></xml>', seed=0,
+                        batch_size=5000, tags=(), name_prefix=''):
+    """
+    Create block diagrams without running the signal handlers.
+
+    The content is a string shared by all of them, or a function generating
+    the content of each from a random.Random. Each is given up to three of
+    the tags as owner tags, the first tags being the most popular.
+
+    Returns the block diagrams.
+    """
+    rand = random.Random(seed)
+    tag_weights = [1 / rank for rank in range(1, len(tags) + 1)]
+    through = BlockDiagram.owner_tags.through
+    created = []
+    while len(created) < count:
+        batch = []
+        batch_tags = []
+        for number in range(
+                len(created), min(count, len(created) + batch_size)):
+            bd_content = content(rand) if callable(content) else content
+            bd_tags = set(rand.choices(
+                tags, tag_weights, k=rand.randint(0, 3))) if tags else ()
+            batch.append(BlockDiagram(
+                user=users[number % len(users)],
+                # The number keeps (user, name) unique
+                name=f'{name_prefix}{program_name(rand)} #{number}',
+                description=rand.choice((
+                    None, 'My first program', 'Follows the line',
+                    'Avoids obstacles', 'Dances in a square',
+                )),
+                content=bd_content,
+                tag_names=sorted(tag.name for tag in bd_tags),
+                **index_content(bd_content),
+            ))
+            batch_tags.append(bd_tags)
+        BlockDiagram.objects.bulk_create(batch, batch_size=batch_size)
+        through.objects.bulk_create([
+            through(blockdiagram_id=bd.pk, tag_id=tag.pk)
+            for bd, bd_tags in zip(batch, batch_tags)
+            for tag in bd_tags
+        ], batch_size=batch_size)
+        created += batch
+
+    if tags:
+        call_command('reconcile_tag_counts', stdout=io.StringIO())
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    return created
+
+
+def seed_tags(count):
+    """Create tags named like the ones students use."""
+    names = [*NOUNS, *ADJECTIVES] + [
+        f'{adjective}-{noun}' for adjective in ADJECTIVES for noun in NOUNS]
+    return Tag.objects.bulk_create([
+        Tag(name=names[number % len(names)] + (
+            f'-{number // len(names)}' if number >= len(names) else ''))
+        for number in range(count)
+    ])
+
+
+def seed_blog_questions(count=1):
+    """Create blog questions, starting with the default one."""
+    start = int(settings.DEFAULT_BLOG_QUESTION_ID)
+    return BlogQuestion.objects.bulk_create([
+        BlogQuestion(id=start + number,
+                     question=QUESTIONS[number % len(QUESTIONS)])
+        for number in range(count)
+    ])
+
+
+def seed_curriculum(course_count, lessons_per_course, blog_questions=(),
+                    seed=0):
+    """
+    Create courses of lessons, whose references belong to the support user.
+
+    Each lesson reference asks up to two of the blog questions. Returns the
+    lessons.
+    """
+    rand = random.Random(seed)
+    support = User.objects.get(username='support')
+    references = seed_block_diagrams(
+        course_count * lessons_per_course, [support],
+        content=lambda bd_rand: blockly_xml(
+            bd_rand, bd_rand.randint(5, 40)),
+        seed=seed, name_prefix='Lesson: ')
+    courses = Course.objects.bulk_create([
+        Course(name=f'{rand.choice(ADJECTIVES).title()} '
+                    f'{rand.choice(NOUNS)}s {number + 1}')
+        for number in range(course_count)
+    ])
+    lessons = Lesson.objects.bulk_create([
+        Lesson(
+            course=courses[number // lessons_per_course],
+            reference=reference,
+            sequence_number=number % lessons_per_course + 1,
+            goals='Make the rover {} {}'.format(
+                rand.choice(ADJECTIVES), rand.choice(NOUNS)),
+            tutorial_link='https://docs.rovercode.com/lessons/{}'.format(
+                number + 1),
+            # Most lessons are for paying users
+            tier=rand.choice((1, 2, 2)),
+        )
+        for number, reference in enumerate(references)
+    ])
+    BlockDiagramBlogQuestion.objects.bulk_create([
+        BlockDiagramBlogQuestion(
+            block_diagram=reference,
+            blog_question=question,
+            required=rand.random() < 0.5,
+            sequence_number=number,
+        )
+        for reference in references
+        for number, question in enumerate(rand.sample(
+            blog_questions, min(2, len(blog_questions))))
+    ])
+    return lessons
+
+
+@contextmanager
+def stub_services(latency=0):
+    """
+    Stand in for the profanity check and subscription services.
+
+    Each answers after latency seconds, finding no profanity and reporting a
+    paid plan. Yields the URL of the stub.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self):
+            time.sleep(latency)
+            body = json.dumps({
+                'original_profane_word': '',
+                'subscription': {'plan': 2},
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = _respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def summarize(durations):
+    """Summarize durations, in seconds, as milliseconds."""
+    ordered = sorted(durations)
+
+    def percentile(value):
+        index = min(len(ordered) - 1, int(round(value * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean': round(statistics.mean(ordered) * 1000, 3),
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': round(ordered[-1] * 1000, 3),
+    }
+
+
+def time_calls(function, repeat):
+    """Call the function repeatedly and summarize the durations."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+
+    return summarize(durations)
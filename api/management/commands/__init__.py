@@ -0,0 +1 @@
+"""API management commands."""
@@ -0,0 +1,366 @@
+"""Run repeatable API scenarios and report their performance as JSON."""
+import json
+import platform
+import random
+import subprocess
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.benchmark import ADJECTIVES
+from api.benchmark import authenticated_client
+from api.benchmark import benchmark_database
+from api.benchmark import blockly_xml
+from api.benchmark import NOUNS
+from api.benchmark import seed_block_diagrams
+from api.benchmark import seed_blog_questions
+from api.benchmark import seed_curriculum
+from api.benchmark import seed_tags
+from api.benchmark import seed_users
+from api.benchmark import stub_services
+from api.benchmark import summarize
+
+# Run in this order, the scenarios that write after those that only read
+SCENARIOS = (
+    'list_filter', 'search', 'catalog', 'autosave', 'remix_storm',
+    'token_refresh',
+)
+
+# Rows seeded at --scale 1
+VOLUMES = {
+    'users': 1000,
+    'block_diagrams': 20000,
+    'tags': 500,
+    'courses': 10,
+    'lessons_per_course': 8,
+    'blog_questions': 5,
+}
+
+# Results compared with the baseline: (key, lower is better, checked for
+# regressions). p99 and throughput (the inverse of the mean) are too noisy
+# over a few hundred requests to fail on.
+COMPARED = (
+    ('p50', True, True),
+    ('p95', True, True),
+    ('p99', True, False),
+    ('queries', True, True),
+    ('throughput', False, False),
+)
+
+
+class QueryCounter:
+    """Count database queries (a connection execute wrapper)."""
+
+    def __init__(self):
+        """Start counting from zero."""
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Count the query."""
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def git_commit():
+    """Get the commit being benchmarked, if the code is in git."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=str(settings.ROOT_DIR),
+            capture_output=True, check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold):
+    """
+    Compare results with a baseline.
+
+    Returns lines describing the change in each scenario, and the
+    regressions: timings worse by more than the threshold (a fraction), or
+    any increase in queries, which do not vary between runs.
+    """
+    lines = []
+    regressions = []
+    for name, stats in results['scenarios'].items():
+        old_stats = baseline['scenarios'].get(name)
+        if old_stats is None:
+            lines.append(f'{name:<14} not in the baseline')
+            continue
+
+        changes = []
+        for key, lower_is_better, checked in COMPARED:
+            old, new = old_stats[key], stats[key]
+            change = (new - old) / old if old else 0
+            worse = change if lower_is_better else -change
+            regressed = checked and (
+                new > old if key == 'queries' else worse > threshold)
+            if regressed:
+                regressions.append(f'{name} {key} {old} -> {new}')
+            changes.append(
+                f'{key}={old}->{new} ({change:+.0%})'
+                f'{" REGRESSION" if regressed else ""}')
+        lines.append(f'{name:<14} ' + ' '.join(changes))
+
+    return lines, regressions
+
+
+class Command(BaseCommand):
+    """
+    Seed a throwaway database and time repeatable API scenarios.
+
+    The data is generated from --seed, at realistic volumes multiplied by
+    --scale, and each scenario's requests are drawn from its own random
+    stream, so two runs make the same requests. The external services are
+    replaced by a local stub answering after --service-latency seconds.
+
+    Requests are made in process, one at a time, after --warmup requests
+    that are not measured. Each scenario reports its latency percentiles in
+    milliseconds, queries per request and throughput in requests a second,
+    as JSON written to --output (or printed). With --compare, the results
+    are checked against a previous run's JSON and the command fails if any
+    scenario regressed beyond --threshold.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            choices=SCENARIOS)
+        parser.add_argument('--scale', type=float, default=1)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--service-latency', type=float, default=0)
+        parser.add_argument('--output')
+        parser.add_argument('--compare')
+        parser.add_argument('--threshold', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+
+        volumes = {
+            name: max(1, round(volume * options['scale']))
+            if name in ('users', 'block_diagrams', 'tags') else volume
+            for name, volume in VOLUMES.items()
+        }
+        results = {
+            'commit': git_commit(),
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'options': {
+                key: options[key] for key in (
+                    'scale', 'requests', 'warmup', 'seed', 'service_latency')
+            },
+            'volumes': volumes,
+            'scenarios': {},
+        }
+
+        with ExitStack() as stack:
+            stack.enter_context(benchmark_database())
+            service_url = stack.enter_context(
+                stub_services(options['service_latency']))
+            stack.enter_context(override_settings(
+                PROFANITY_CHECK_SERVICE_HOST=service_url,
+                SUBSCRIPTION_SERVICE_HOST=service_url,
+                # Report views over their query budgets without failing
+                QUERY_BUDGET_EXCEEDED='log',
+                # Keep the throttles' cost, but let the scripted users go
+                # faster than real ones
+                REST_FRAMEWORK={
+                    **settings.REST_FRAMEWORK,
+                    'DEFAULT_THROTTLE_RATES': {
+                        scope: '100000/s' for scope in
+                        settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+                    },
+                },
+            ))
+            cache.clear()
+            self._seed(volumes, options['seed'])
+
+            for name in SCENARIOS:
+                if options['scenarios'] and name not in options['scenarios']:
+                    continue
+                rand = random.Random(f'{options["seed"]}-{name}')
+                request = getattr(self, f'_{name}')(rand)
+                stats = self._run(request, options)
+                results['scenarios'][name] = stats
+                self.stderr.write(f'{name:<14} ' + ' '.join(
+                    f'{key}={value}' for key, value in stats.items()))
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            lines, regressions = compare(
+                baseline, results, options['threshold'])
+            self.stderr.write(
+                f'Compared with {baseline["commit"]}:\n' + '\n'.join(lines))
+            if regressions:
+                raise CommandError(
+                    'Regressed: ' + ', '.join(regressions))
+
+    def _seed(self, volumes, seed):
+        """Generate the data the scenarios use."""
+        self.stderr.write('Seeding ' + ', '.join(
+            f'{volume} {name}' for name, volume in volumes.items()))
+        self.users = seed_users(volumes['users'])
+        self.tags = seed_tags(volumes['tags'])
+        blog_questions = seed_blog_questions(volumes['blog_questions'])
+        self.block_diagrams = seed_block_diagrams(
+            volumes['block_diagrams'], self.users, content=blockly_xml,
+            seed=seed, tags=self.tags)
+        self.lessons = seed_curriculum(
+            volumes['courses'], volumes['lessons_per_course'],
+            blog_questions, seed=seed)
+        self.clients = {}
+
+    def _client(self, user):
+        """Get an API client authenticated as the user, a paying one."""
+        if user not in self.clients:
+            self.clients[user] = authenticated_client(user)
+        return self.clients[user]
+
+    def _run(self, request, options):
+        """Make the scenario's requests, measuring all but the warmup."""
+        durations = []
+        queries = []
+        errors = 0
+        total = options['warmup'] + options['requests']
+        for number in range(total):
+            counter = QueryCounter()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(counter))
+                start = time.perf_counter()
+                response = request(number)
+                duration = time.perf_counter() - start
+
+            if number < options['warmup']:
+                continue
+            durations.append(duration)
+            queries.append(counter.count)
+            if response.status_code >= 400:
+                errors += 1
+
+        stats = summarize(durations)
+        stats['errors'] = errors
+        stats['queries'] = round(sum(queries) / len(queries), 2)
+        stats['queries_max'] = max(queries)
+        stats['throughput'] = round(len(durations) / sum(durations), 1)
+        return stats
+
+    def _list_filter(self, rand):
+        """List block diagrams with the filters the browse page offers."""
+        url = reverse('api:v1:blockdiagram-list')
+        popular_tags = [tag.name for tag in self.tags[:20]]
+
+        def request(_):
+            params = rand.choice((
+                # Paging through everything
+                {'page': rand.randint(1, 3)},
+                {'ordering': rand.choice(('-block_count', 'max_depth')),
+                 'page': rand.randint(1, 3)},
+                {'tag': rand.choice(popular_tags)},
+                {'block_type': rand.choice(('controls_if', 'motor_stop'))},
+                {'block_count__gte': rand.choice((10, 20, 50))},
+                {'user': rand.choice(self.users).pk},
+            ))
+            params['size'] = rand.choice((15, 50))
+            return self._client(rand.choice(self.users)).get(url, params)
+
+        return request
+
+    def _search(self, rand):
+        """Search block diagrams by name and owner."""
+        url = reverse('api:v1:blockdiagram-list')
+
+        def request(_):
+            term = rand.choice((
+                rand.choice(ADJECTIVES), rand.choice(NOUNS),
+                f'{rand.choice(ADJECTIVES)} {rand.choice(NOUNS)}',
+                rand.choice(self.users).username,
+            ))
+            params = {'search': term}
+            if rand.random() < 0.5:
+                params['rank'] = 'true'
+            return self._client(rand.choice(self.users)).get(url, params)
+
+        return request
+
+    def _catalog(self, rand):
+        """Browse the courses and lessons."""
+        courses_url = reverse('api:v1:course-list')
+        lessons_url = reverse('api:v1:lesson-list')
+
+        def request(number):
+            client = self._client(rand.choice(self.users))
+            if number % 2:
+                return client.get(lessons_url, {'size': 50})
+            return client.get(courses_url)
+
+        return request
+
+    def _autosave(self, rand):
+        """Save edits to programs, as the editor does while students work."""
+        # A class of students, each with a program open
+        students = rand.sample(self.users, min(30, len(self.users)))
+        programs = {}
+        for bd in self.block_diagrams:
+            if bd.user in students and bd.user not in programs:
+                programs[bd.user] = [bd, rand.randint(5, 40)]
+
+        def request(_):
+            program = programs[rand.choice(students)]
+            bd = program[0]
+            # Programs grow as they are edited
+            program[1] = min(300, program[1] + rand.randint(0, 2))
+            return self._client(bd.user).patch(
+                reverse('api:v1:blockdiagram-detail', kwargs={'pk': bd.pk}) +
+                '?autosave=true',
+                {'content': blockly_xml(rand, program[1])}, format='json')
+
+        return request
+
+    def _remix_storm(self, rand):
+        """Remix one lesson, as a class starting it together does."""
+        lesson = rand.choice(self.lessons)
+        url = reverse(
+            'api:v1:blockdiagram-remix', kwargs={'pk': lesson.reference_id})
+        students = rand.sample(self.users, len(self.users))
+
+        def request(number):
+            return self._client(students[number % len(students)]).post(url)
+
+        return request
+
+    def _token_refresh(self, rand):
+        """Refresh access tokens, checking the subscription each time."""
+        url = reverse('api:api-token-refresh')
+        client = APIClient()
+
+        def request(_):
+            token = RefreshToken.for_user(rand.choice(self.users))
+            return client.post(url, {'refresh': str(token)}, format='json')
+
+        return request
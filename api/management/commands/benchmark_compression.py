@@ -0,0 +1,82 @@
+"""Benchmark compressing API responses in each encoding."""
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+
+from api.benchmark import authenticated_client
+from api.benchmark import benchmark_database
+from api.benchmark import blockly_xml
+from api.benchmark import seed_block_diagrams
+from api.benchmark import seed_blog_questions
+from api.benchmark import seed_curriculum
+from api.benchmark import seed_tags
+from api.benchmark import seed_users
+from api.benchmark import time_calls
+from rovercode_web import compression
+
+
+class Command(BaseCommand):
+    """
+    Time compressing typical API responses against the bytes it saves.
+
+    Each response is compressed in each installed encoding, at the level
+    used for every response and at the one used for cached responses (see
+    rovercode_web.compression), and read back from the cache. The bytes
+    saved per millisecond of compression say which is worth its CPU.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        with benchmark_database(keepdb=options['keepdb']), \
+                override_settings(QUERY_BUDGET_EXCEEDED='log'):
+            users = seed_users(10)
+            tags = seed_tags(200)
+            seed_block_diagrams(
+                50, users, content=blockly_xml, seed=options['seed'],
+                tags=tags)
+            seed_curriculum(
+                5, 8, seed_blog_questions(5), seed=options['seed'])
+            client = authenticated_client(users[0])
+            responses = {
+                'block diagram page': client.get(
+                    reverse('api:v1:blockdiagram-list'), {'size': 15}),
+                'course catalog': client.get(reverse('api:v1:course-list')),
+                'tag list': client.get(reverse('api:v1:tag-list')),
+            }
+
+        cache.clear()
+        for name, response in responses.items():
+            self._time_compress(name, response.content, options)
+
+    def _time_compress(self, name, content, options):
+        """Time compressing the content in each encoding."""
+        self.stdout.write(f'{name} ({len(content)} bytes):')
+        for encoding in compression.get_encodings():
+            for cached in (False, True):
+                compressed = compression.compress(content, encoding, cached)
+                duration = time_calls(
+                    lambda: compression.compress(content, encoding, cached),
+                    options['repeat'])['p50']
+                saved = len(content) - len(compressed)
+                level = compression.ENCODINGS[encoding][2 if cached else 1]
+                self.stdout.write(
+                    f'  {encoding:<4} level={level:<2} '
+                    f'bytes={len(compressed)} '
+                    f'ratio={len(content) / len(compressed):.1f} '
+                    f'p50={duration:.3f}ms '
+                    f'saved/ms={saved / max(duration, 0.001):.0f}')
+
+            compression.get_compressed(content, encoding)
+            duration = time_calls(
+                lambda: compression.get_compressed(content, encoding),
+                options['repeat'])['p50']
+            self.stdout.write(f'  {encoding:<4} cached   p50={duration:.3f}ms')
@@ -0,0 +1,73 @@
+"""Benchmark API requests with and without persistent connections."""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from api.benchmark import authenticated_client
+from api.benchmark import benchmark_database
+from api.benchmark import seed_block_diagrams
+from api.benchmark import seed_users
+from api.benchmark import time_calls
+from rovercode_web.db import check_idle_connections
+from rovercode_web.db import mark_connections_used
+
+
+class Command(BaseCommand):
+    """
+    Time small API requests with CONN_MAX_AGE at 0 and at the configured age.
+
+    The test client does not close connections between requests, so each
+    request is followed by the same close_old_connections() call the request
+    handler makes, and preceded by the connection health check.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--max-age', type=int,
+            default=settings.DATABASE_CONN_MAX_AGE or 60)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        with benchmark_database(keepdb=options['keepdb']):
+            users = seed_users(10)
+            seed_block_diagrams(100, users)
+            client = authenticated_client(users[0])
+            url = reverse('api:v1:blockdiagram-list') + '?size=5'
+
+            def request():
+                check_idle_connections()
+                response = client.get(url)
+                assert response.status_code == 200, response.content
+                mark_connections_used()
+                close_old_connections()
+
+            connection_created.connect(count_connection)
+            try:
+                for max_age in (0, options['max_age']):
+                    connections['default'].close()
+                    connections['default'].settings_dict['CONN_MAX_AGE'] = (
+                        max_age)
+                    opened.clear()
+                    stats = time_calls(request, options['requests'])
+                    rate = 1000 / stats['mean']
+                    self.stdout.write(
+                        f'CONN_MAX_AGE={max_age:<4} '
+                        f'{rate:8.1f} req/s '
+                        f'connections={len(opened)} ' +
+                        ' '.join(f'{key}={value}'
+                                 for key, value in stats.items()))
+            finally:
+                connection_created.disconnect(count_connection)
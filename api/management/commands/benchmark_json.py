@@ -0,0 +1,117 @@
+"""Benchmark the JSON renderer and parser against DRF's."""
+import io
+import random
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import parsers
+from rest_framework import renderers
+
+from api import parsers as api_parsers
+from api import renderers as api_renderers
+from api.benchmark import authenticated_client
+from api.benchmark import benchmark_database
+from api.benchmark import blockly_xml
+from api.benchmark import seed_block_diagrams
+from api.benchmark import seed_blog_questions
+from api.benchmark import seed_curriculum
+from api.benchmark import seed_tags
+from api.benchmark import seed_users
+from api.benchmark import time_calls
+
+RENDERERS = (
+    ('drf', renderers.JSONRenderer()),
+    ('orjson', api_renderers.JSONRenderer()),
+)
+PARSERS = (
+    ('drf', parsers.JSONParser()),
+    ('orjson', api_parsers.JSONParser()),
+)
+
+
+class Command(BaseCommand):
+    """
+    Time rendering block diagram pages and parsing saves as JSON.
+
+    The pages are those the API returns for --size block diagrams of
+    realistic Blockly XML, and the course catalog of --courses courses of
+    --lessons lessons each. The saves are the bodies the editor sends.
+    Each is encoded by DRF's renderer and by ours, which must give the same
+    bytes, and decoded by both parsers.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument('--size', type=int, action='append',
+                            dest='sizes')
+        parser.add_argument('--courses', type=int, default=20)
+        parser.add_argument('--lessons', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        if api_renderers.orjson is None:
+            raise CommandError('orjson is not installed')
+
+        sizes = options['sizes'] or [15, 50]
+        with benchmark_database(keepdb=options['keepdb']), \
+                override_settings(QUERY_BUDGET_EXCEEDED='log'):
+            users = seed_users(10)
+            seed_block_diagrams(
+                max(sizes), users, content=blockly_xml, seed=options['seed'],
+                tags=seed_tags(50))
+            client = authenticated_client(users[0])
+            for size in sizes:
+                response = client.get(
+                    reverse('api:v1:blockdiagram-list'), {'size': size})
+                self._time_render(f'page of {size}', response.data, options)
+
+            seed_curriculum(
+                options['courses'], options['lessons'],
+                seed_blog_questions(5), seed=options['seed'])
+            response = client.get(
+                reverse('api:v1:course-list'), {'size': options['courses']})
+            self._time_render('course catalog', response.data, options)
+
+        rand = random.Random(options['seed'])
+        for block_count in (20, 300):
+            body = renderers.JSONRenderer().render(
+                {'content': blockly_xml(rand, block_count)})
+            self._time_parse(f'save of {block_count} blocks', body, options)
+
+    def _time_render(self, name, data, options):
+        """Time rendering the data with each renderer."""
+        rendered = {
+            label: renderer.render(data) for label, renderer in RENDERERS}
+        if rendered['drf'] != rendered['orjson']:
+            raise CommandError(f'The renderers differ on the {name}')
+
+        results = {}
+        for label, renderer in RENDERERS:
+            results[label] = time_calls(
+                lambda renderer=renderer: renderer.render(data),
+                options['repeat'])['p50']
+        self._write('render', name, len(rendered['drf']), results)
+
+    def _time_parse(self, name, body, options):
+        """Time parsing the body with each parser."""
+        results = {}
+        for label, parser in PARSERS:
+            results[label] = time_calls(
+                lambda parser=parser: parser.parse(io.BytesIO(body)),
+                options['repeat'])['p50']
+        self._write('parse', name, len(body), results)
+
+    def _write(self, action, name, length, results):
+        """Write the median times and the speedup."""
+        self.stdout.write(
+            f'{action} {name} ({length} bytes): ' + ' '.join(
+                f'{label} p50={duration:.3f}ms'
+                for label, duration in results.items())
+            + f' speedup={results["drf"] / results["orjson"]:.1f}x')
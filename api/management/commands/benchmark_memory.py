@@ -0,0 +1,119 @@
+"""Benchmark gunicorn worker memory with and without preloading."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from api.benchmark import access_token
+from api.benchmark import benchmark_database
+from api.benchmark import gunicorn
+from api.benchmark import seed_block_diagrams
+from api.benchmark import seed_users
+from config.gunicorn import MIB
+from config.gunicorn import memory_usage
+
+
+def child_pids(pid):
+    """Find the processes started by a process."""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as file:
+                # The command name in brackets may contain spaces
+                fields = file.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+
+    return children
+
+
+def settled_usage(process, workers, timeout=60):
+    """Measure the workers once they have all started and stopped growing."""
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        pids = child_pids(process.pid)
+        usage = {pid: memory_usage(pid) for pid in pids}
+        if len(pids) == workers and usage == last:
+            return usage
+        last = usage
+        time.sleep(1)
+
+    raise RuntimeError('gunicorn workers did not settle')
+
+
+class Command(BaseCommand):
+    """
+    Compare the memory of gunicorn workers with and without preloading.
+
+    Each worker is measured once it has started, and again after serving
+    --requests API requests. pss shares each page out between the processes
+    using it, so the total pss is the memory the workers really take.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        with benchmark_database(keepdb=options['keepdb']):
+            users = seed_users(10)
+            seed_block_diagrams(100, users)
+            token = access_token(users[0])
+
+            for preload in ('false', 'true'):
+                environ = dict(
+                    os.environ,
+                    GUNICORN_PRELOAD=preload,
+                    GUNICORN_WORKERS=str(options['workers']),
+                    GUNICORN_WORKER_CLASS='sync',
+                )
+                with gunicorn(environ, '--log-level', 'warning') as (
+                        process, url):
+                    before = settled_usage(process, options['workers'])
+                    self._load(url, token, options)
+                    after = settled_usage(process, options['workers'])
+                    master = memory_usage(process.pid)
+
+                self._report(f'preload={preload} started', before, master)
+                self._report(f'preload={preload} loaded ', after, master)
+
+    @staticmethod
+    def _load(url, token, options):
+        """Spread API requests across the workers."""
+        url += reverse('api:v1:blockdiagram-list') + '?size=10'
+
+        def request(_):
+            response = requests.get(
+                url, headers={'Authorization': f'JWT {token}'})
+            assert response.status_code == 200, response.content
+
+        with ThreadPoolExecutor(options['workers'] * 2) as executor:
+            list(executor.map(request, range(options['requests'])))
+
+    def _report(self, label, usage, master):
+        """Write the per-worker averages and the totals."""
+        def average(name):
+            values = [worker.get(name, 0) for worker in usage.values()]
+            return sum(values) / len(values) / MIB
+
+        def total(name):
+            values = [worker.get(name, 0) for worker in usage.values()]
+            return (sum(values) + master.get(name, 0)) / MIB
+
+        self.stdout.write(
+            f'{label} per worker: rss={average("rss"):.1f}MiB '
+            f'pss={average("pss"):.1f}MiB uss={average("uss"):.1f}MiB  '
+            f'total pss with master={total("pss"):.1f}MiB')
@@ -0,0 +1,113 @@
+"""Benchmark the overhead of the request metrics."""
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import override_settings
+from django.test import RequestFactory
+from django.urls import resolve
+from django.urls import reverse
+
+from api.benchmark import authenticated_client
+from api.benchmark import benchmark_database
+from api.benchmark import seed_block_diagrams
+from api.benchmark import seed_users
+from api.benchmark import time_calls
+from rovercode_web.metrics import PerformanceMiddleware
+from rovercode_web.metrics import timing
+
+MIDDLEWARE = 'rovercode_web.metrics.PerformanceMiddleware'
+
+
+class Command(BaseCommand):
+    """
+    Time API requests with and without the performance middleware.
+
+    The two are timed in alternating rounds, so drift in the machine's speed
+    affects both the same. Serializer timing is left in place in both, as it
+    is a no-op outside the middleware.
+
+    As the difference is small next to the noise in whole requests, the
+    middleware is also timed around a view that only makes --queries
+    queries and serializes --size objects.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--size', type=int, default=20)
+        parser.add_argument('--queries', type=int, default=5)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        with benchmark_database(keepdb=options['keepdb']):
+            users = seed_users(10)
+            seed_block_diagrams(1000, users)
+            url = reverse('api:v1:blockdiagram-list')
+            params = {'size': options['size']}
+
+            clients = {}
+            for enabled in (False, True):
+                middleware = [
+                    name for name in settings.MIDDLEWARE
+                    if enabled or name != MIDDLEWARE
+                ]
+                with override_settings(MIDDLEWARE=middleware):
+                    client = authenticated_client(users[0])
+                    # Load the middleware under these settings
+                    client.get(url, params)
+                clients[enabled] = client
+
+            durations = {False: [], True: []}
+            for _ in range(options['rounds']):
+                for enabled, client in clients.items():
+                    def request(client=client, enabled=enabled):
+                        response = client.get(url, params)
+                        assert response.status_code == 200, response.content
+                        assert enabled == response.has_header(
+                            'Server-Timing')
+
+                    stats = time_calls(request, options['requests'])
+                    durations[enabled].append(stats['mean'])
+
+            # Milliseconds per request in each round
+            for enabled in (False, True):
+                self.stdout.write(
+                    f'middleware={"on " if enabled else "off"} '
+                    f'mean={statistics.mean(durations[enabled]):.3f}ms '
+                    f'best round={min(durations[enabled]):.3f}ms')
+
+            overhead = min(durations[True]) - min(durations[False])
+            self.stdout.write(
+                f'overhead={overhead * 1000:.0f}us per request '
+                f'({overhead / min(durations[False]):.1%})')
+
+            self._time_middleware(options)
+
+    def _time_middleware(self, options):
+        """Time the middleware around a minimal view."""
+        def view(request):
+            with connection.cursor() as cursor:
+                for _ in range(options['queries']):
+                    cursor.execute('SELECT 1')
+            for _ in range(options['size']):
+                with timing('serializer'):
+                    pass
+            return HttpResponse()
+
+        request = RequestFactory().get('/metrics/')
+        request.resolver_match = resolve('/metrics/')
+        middleware = PerformanceMiddleware(view)
+        repeat = options['requests'] * options['rounds']
+        bare = time_calls(lambda: view(request), repeat)['p50']
+        timed = time_calls(lambda: middleware(request), repeat)['p50']
+        self.stdout.write(
+            f'view alone p50={bare * 1000:.0f}us, with middleware '
+            f'p50={timed * 1000:.0f}us: '
+            f'overhead={(timed - bare) * 1000:.0f}us per request')
@@ -0,0 +1,67 @@
+"""Benchmark block diagram search."""
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.benchmark import authenticated_client
+from api.benchmark import benchmark_database
+from api.benchmark import seed_block_diagrams
+from api.benchmark import seed_users
+from api.benchmark import time_calls
+from api.views import BlockDiagramViewSet
+from mission_control.filters import BlockDiagramSearchFilter
+from mission_control.models import BlockDiagram
+
+DEFAULT_TERMS = ('line', 'zippy rover', 'student42', 'no such program')
+
+
+class Command(BaseCommand):
+    """Seed a throwaway database and time the search endpoint."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--term', action='append', dest='terms')
+        parser.add_argument('--rank', action='store_true')
+        parser.add_argument('--explain', action='store_true')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        with benchmark_database(keepdb=options['keepdb']):
+            self.stdout.write(f'Seeding {options["rows"]} block diagrams')
+            users = seed_users(options['users'])
+            seed_block_diagrams(options['rows'], users)
+            client = authenticated_client(users[0])
+
+            for term in options['terms'] or DEFAULT_TERMS:
+                params = {'search': term}
+                if options['rank']:
+                    params['rank'] = 'true'
+
+                def search(params=params):
+                    response = client.get(
+                        reverse('api:v1:blockdiagram-list'), params)
+                    assert response.status_code == 200, response.content
+
+                stats = time_calls(search, options['repeat'])
+                self.stdout.write('{:<20} {}'.format(
+                    repr(term),
+                    ' '.join(f'{key}={value}' for key, value in stats.items()),
+                ))
+
+                if options['explain']:
+                    self._explain(term)
+
+    def _explain(self, term):
+        """Show the plan for the search query."""
+        request = Request(APIRequestFactory().get('/', {'search': term}))
+        queryset = BlockDiagramSearchFilter().filter_queryset(
+            request, BlockDiagram.objects.all(), BlockDiagramViewSet)
+        for line in queryset.explain(analyze=True).splitlines():
+            self.stdout.write('    ' + line)
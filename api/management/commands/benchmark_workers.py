@@ -0,0 +1,117 @@
+"""Load test gunicorn worker classes against slow external services."""
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+import requests
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from api.benchmark import access_token
+from api.benchmark import benchmark_database
+from api.benchmark import gunicorn
+from api.benchmark import seed_blog_questions
+from api.benchmark import seed_users
+from api.benchmark import stub_services
+from api.benchmark import summarize
+
+# Modules each worker class needs, beyond gunicorn itself
+WORKER_MODULES = {
+    'gevent': ('gevent', 'psycogreen'),
+}
+
+
+class Command(BaseCommand):
+    """
+    Create block diagrams concurrently through gunicorn.
+
+    Each create waits on the profanity check, which is played by a local
+    service that answers after --latency seconds. Sync workers handle one
+    request at a time, so they are pinned while they wait; gevent (and
+    gthread) workers serve other requests in the meantime.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument(
+            '--worker-class', action='append', dest='worker_classes')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--worker-connections', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--latency', type=float, default=0.2)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        with benchmark_database(keepdb=options['keepdb']):
+            users = seed_users(options['concurrency'])
+            tokens = [access_token(user) for user in users]
+            seed_blog_questions()
+            with stub_services(options['latency']) as service_url:
+                environ = dict(
+                    os.environ,
+                    PROFANITY_CHECK_SERVICE_HOST=service_url,
+                    SUBSCRIPTION_SERVICE_HOST=service_url,
+                )
+                for worker_class in (options['worker_classes'] or
+                                     ('sync', 'gevent')):
+                    self._run(worker_class, tokens, environ, options)
+
+    def _run(self, worker_class, tokens, environ, options):
+        """Load test one worker class."""
+        for module in WORKER_MODULES.get(worker_class, ()):
+            try:
+                import_module(module)
+            except ImportError:
+                self.stdout.write(f'{worker_class:<8} skipped, {module} '
+                                  'is not installed')
+                return
+
+        environ = dict(environ, GUNICORN_WORKER_CLASS=worker_class)
+        if worker_class == 'gevent':
+            # As in compose/django/start.sh
+            environ.setdefault('DATABASE_CONN_MAX_AGE', '0')
+
+        numbers = itertools.count()
+        errors = []
+
+        args = [
+            '-w', str(options['workers']), '-k', worker_class,
+            '--worker-connections', str(options['worker_connections']),
+            '--log-level', 'warning',
+        ]
+        if worker_class == 'gthread':
+            args += ['--threads', str(options['worker_connections'])]
+
+        with gunicorn(environ, *args) as (_, url):
+            url += reverse('api:v1:blockdiagram-list')
+
+            def create(_):
+                number = next(numbers)
+                start = time.perf_counter()
+                response = requests.post(url, json={
+                    'name': f'{worker_class} {number}',
+                    'content': '<xml></xml>',
+                }, headers={
+                    'Authorization': f'JWT {tokens[number % len(tokens)]}',
+                })
+                if response.status_code != 201:
+                    errors.append(response.status_code)
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                durations = list(
+                    executor.map(create, range(options['requests'])))
+            elapsed = time.perf_counter() - start
+
+        stats = summarize(durations)
+        self.stdout.write(
+            f'{worker_class:<8} {len(durations) / elapsed:8.1f} req/s '
+            f'errors={len(errors)} ' +
+            ' '.join(f'{key}={value}' for key, value in stats.items()))
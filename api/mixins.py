@@ -0,0 +1,160 @@
+"""API view mixins."""
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.db import connections
+from django.db import transaction
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from curriculum import cache as catalog_cache
+from rovercode_web import db
+from rovercode_web import profiling
+from rovercode_web.cache import count
+from rovercode_web.compression import cache_compressed
+
+
+class SafeMethodsNonAtomicMixin:
+    """
+    Run safe methods without the ATOMIC_REQUESTS transaction.
+
+    Reads skip the BEGIN and COMMIT round trips. Under read committed each
+    statement takes its own snapshot anyway, so the transaction bought
+    them nothing. Other methods are still run in a transaction on every
+    database with ATOMIC_REQUESTS.
+    """
+
+    @staticmethod
+    def _atomic_request_databases():
+        """Get the databases with ATOMIC_REQUESTS."""
+        return {
+            alias for alias in connections
+            if connections[alias].settings_dict['ATOMIC_REQUESTS']
+        }
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        """Opt the view out of the transactions added by the handler."""
+        view = super().as_view(*args, **kwargs)
+        view._non_atomic_requests = cls._atomic_request_databases()
+        return view
+
+    def dispatch(self, request, *args, **kwargs):
+        """Dispatch the request, in transactions unless it is safe."""
+        aliases = self._atomic_request_databases()
+        if request.method in SAFE_METHODS:
+            # Inside an outer transaction (e.g. in tests) a savepoint still
+            # confines the rollback of a failed request to the request
+            aliases = {
+                alias for alias in aliases
+                if connections[alias].in_atomic_block
+            }
+
+        with ExitStack() as stack:
+            for alias in sorted(aliases):
+                stack.enter_context(transaction.atomic(using=alias))
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """
+    Read from the replicas in safe requests.
+
+    Users who wrote recently keep reading from the primary for a while so
+    they see their own changes, e.g. an editor reload after an autosave.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        """Start reading from the replicas once the user is known."""
+        super().initial(request, *args, **kwargs)
+        if (request.method in SAFE_METHODS and
+                not db.is_stuck_to_primary(request.user)):
+            self._replica_reads = db.start_replica_reads()
+
+    def dispatch(self, request, *args, **kwargs):
+        """Dispatch the request, remembering when the user wrote."""
+        self._replica_reads = None
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_reads is not None:
+                db.stop_replica_reads(self._replica_reads)
+
+        if (request.method not in SAFE_METHODS and
+                response.status_code < 400 and
+                self.request.user.is_authenticated):
+            db.stick_to_primary(self.request.user)
+
+        return response
+
+
+class CatalogCacheMixin:
+    """
+    Serve catalog responses from the cache with a per-user overlay.
+
+    The shared part of the response is serialized as seen by a user with no
+    remixes and cached under the current catalog version. Each response then
+    overlays the requesting user's remixes, fetched in a single query. The
+    compressed bytes are cached too for responses without remixes, which
+    are the same for every user. Those with remixes are compressed as any
+    response is, rather than each filling the cache at the slower levels.
+    """
+
+    def get_serializer_context(self):
+        """Serialize the shared part of the catalog."""
+        context = super().get_serializer_context()
+        context['remixes'] = {}
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """List the catalog."""
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve from the catalog."""
+        return self._cached(super().retrieve, request, *args, **kwargs)
+
+    @staticmethod
+    def _cached(handler, request, *args, **kwargs):
+        """Get the shared response from the cache or the handler."""
+        version = catalog_cache.get_catalog_version()
+        key = catalog_cache.get_catalog_key(version, request)
+        data = cache.get(key) if version is not None else None
+        if data is None:
+            count(catalog_cache.CATALOG_MISSES_KEY)
+            # Cached under the version, so read at least as new as it
+            with db.primary_reads():
+                response = handler(request, *args, **kwargs)
+            cache.set(key, response.data, catalog_cache.CATALOG_TIMEOUT)
+            status = 'miss'
+        else:
+            count(catalog_cache.CATALOG_HITS_KEY)
+            response = Response(data)
+            status = 'hit'
+
+        response['X-Catalog-Cache'] = status
+        if catalog_cache.apply_remixes(
+                response.data, catalog_cache.get_remixes(request.user)):
+            return response
+        return cache_compressed(response)
+
+
+class ProfilingMixin:
+    """
+    Profile requests that ask for it, or a sample of them.
+
+    See rovercode_web.profiling.should_profile. The id of the profile is
+    sent back in the X-Profile-Id header.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        """Profile the request if selected."""
+        view_name = type(self).__name__
+        if not profiling.should_profile(request, view_name):
+            return super().dispatch(request, *args, **kwargs)
+
+        with profiling.profile(request, view_name) as profile_id:
+            response = super().dispatch(request, *args, **kwargs)
+        if profile_id:
+            response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,34 @@
+"""API parsers."""
+import io
+
+from django.conf import settings
+from rest_framework import parsers
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class JSONParser(parsers.JSONParser):
+    """
+    Parse JSON with orjson, falling back to DRF's parser.
+
+    orjson only reads UTF-8, so other encodings go to DRF's parser, as does
+    anything orjson refuses (e.g. integers beyond 64 bits), so the same
+    documents are accepted and the errors are DRF's.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the JSON request body."""
+        encoding = (parser_context or {}).get(
+            'encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(
+                io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,111 @@
+"""API renderers."""
+import gc
+import math
+from itertools import compress
+
+from rest_framework import renderers
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# orjson writes the line and paragraph separators as they are, whereas DRF
+# escapes them so the JSON is also valid JavaScript
+SEPARATOR_ESCAPES = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+# Floats at least this large, or this small but not zero, are written with
+# an exponent, which orjson spells differently (1e16 rather than 1e+16)
+EXPONENT_ABOVE = 1e16
+EXPONENT_BELOW = 1e-4
+
+
+class ContainerTypes(dict):
+    """Whether each type is one whose items orjson writes."""
+
+    def __missing__(self, kind):
+        """Look up a type not seen before."""
+        self[kind] = issubclass(kind, (dict, list, tuple))
+        return self[kind]
+
+
+CONTAINER_TYPES = ContainerTypes()
+
+
+def has_unusual_floats(data):
+    """
+    Determine if the data holds floats orjson writes differently from DRF.
+
+    These are NaN and the infinities, which orjson writes as null where DRF
+    refuses them, and floats written with an exponent. The data is walked a
+    level at a time without a Python loop over the values: the next level
+    is what the containers refer to, as the garbage collector sees it.
+    """
+    level = [data]
+    while level:
+        kinds = list(map(type, level))
+        if float in kinds:
+            for value in level:
+                if type(value) is float and (
+                        not math.isfinite(value)
+                        or abs(value) >= EXPONENT_ABOVE
+                        or 0 < abs(value) < EXPONENT_BELOW):
+                    return True
+        level = gc.get_referents(
+            *compress(level, map(CONTAINER_TYPES.__getitem__, kinds)))
+    return False
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    Render JSON with orjson, falling back to DRF's renderer.
+
+    The bytes are the same as DRF's compact, unicode output: objects orjson
+    does not know (decimals, lazy strings, querysets...) go through DRF's
+    encoder, and datetimes in UTC end in 'Z'. DRF's renderer is used when
+    orjson is not installed, for any indent but 2 (as the browsable API asks
+    for), for data orjson cannot encode, such as integers beyond 64 bits,
+    and for data holding floats orjson would write differently (see
+    has_unusual_floats), so NaN is refused under STRICT_JSON as before. The
+    floats are looked for once orjson has written the data, so data it
+    cannot write is never walked.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render the data into JSON bytes."""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact or indent not in (None, 2)):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+
+        option = (
+            orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+            | orjson.OPT_PASSTHROUGH_DATACLASS)
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        encoder = self.encoder_class()
+
+        def default(obj):
+            """Encode what orjson does not know as DRF does."""
+            value = encoder.default(obj)
+            if has_unusual_floats(value):
+                raise ValueError('Rendered by DRF')
+            return value
+
+        try:
+            ret = orjson.dumps(data, default=default, option=option)
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        if has_unusual_floats(data):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+
+        if b'\xe2\x80' in ret:
+            for separator, escape in SEPARATOR_ESCAPES:
+                ret = ret.replace(separator, escape)
+        return ret
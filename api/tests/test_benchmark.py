@@ -0,0 +1,149 @@
+"""API test benchmark commands."""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import TransactionTestCase
+
+from api.management.commands import benchmark_api
+
+COMMANDS = (
+    'api', 'compression', 'connections', 'json', 'memory', 'metrics',
+    'search', 'workers',
+)
+
+
+@contextmanager
+def in_test_database(*args, **kwargs):
+    """Run the benchmark in the test database, already set up."""
+    yield
+
+
+class TestBenchmarks(TransactionTestCase):
+    """Smoke tests the benchmark commands at a tiny scale."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        cache.clear()
+        self.patchers = [
+            patch(f'api.management.commands.benchmark_{name}.'
+                  'benchmark_database', in_test_database)
+            for name in COMMANDS
+        ]
+        self.patchers.append(patch('requests.post'))
+        for patcher in self.patchers:
+            patcher.start()
+        self.patchers[-1].target.post.return_value.status_code = 404
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def benchmark(self, name, *args):
+        """Run a benchmark command, returning its output."""
+        out = StringIO()
+        call_command(f'benchmark_{name}', *args, stdout=out, stderr=out)
+        return out.getvalue()
+
+    def test_api(self):
+        """Test the API scenarios run and compare with a baseline."""
+        baseline = {'commit': 'baseline', 'scenarios': {'catalog': {
+            'p50': 1e6, 'p95': 1e6, 'p99': 1e6, 'queries': 100,
+            'throughput': 1}}}
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            compare = os.path.join(directory, 'baseline.json')
+            with open(compare, 'w') as file:
+                json.dump(baseline, file)
+            log = self.benchmark(
+                'api', '--scale', '0.001', '--requests', '2', '--warmup', '1',
+                '--output', output, '--compare', compare)
+            with open(output) as file:
+                results = json.load(file)
+
+        self.assertEqual(
+            set(benchmark_api.SCENARIOS), set(results['scenarios']))
+        self.assertIn('Compared with baseline', log)
+        self.assertIn('search         not in the baseline', log)
+
+    def test_api_regression(self):
+        """Test regressions against the baseline are reported."""
+        baseline = {'scenarios': {
+            'catalog': {
+                'p50': 1, 'p95': 1, 'p99': 1, 'queries': 0, 'throughput': 1},
+        }}
+        results = {'scenarios': {
+            'catalog': {
+                'p50': 2, 'p95': 1, 'p99': 1, 'queries': 1, 'throughput': 1},
+            'search': {},
+        }}
+        lines, regressions = benchmark_api.compare(baseline, results, 0.2)
+        self.assertEqual(
+            ['catalog p50 1 -> 2', 'catalog queries 0 -> 1'], regressions)
+        self.assertIn('search         not in the baseline', lines)
+
+    def test_compression(self):
+        """Test compressing each response is timed."""
+        output = self.benchmark('compression', '--repeat', '1')
+        self.assertIn('course catalog', output)
+        self.assertIn('gzip cached', output)
+
+    def test_connections(self):
+        """Test requests are timed with and without persistent connections."""
+        max_age = connections['default'].settings_dict['CONN_MAX_AGE']
+        try:
+            output = self.benchmark(
+                'connections', '--requests', '2', '--max-age', '60')
+        finally:
+            connections['default'].settings_dict['CONN_MAX_AGE'] = max_age
+        self.assertIn('CONN_MAX_AGE=0', output)
+        self.assertIn('CONN_MAX_AGE=60', output)
+
+    def test_json(self):
+        """Test rendering and parsing are timed."""
+        output = self.benchmark(
+            'json', '--size', '2', '--courses', '2', '--lessons', '2',
+            '--repeat', '1')
+        self.assertIn('page of 2', output)
+        self.assertIn('course catalog', output)
+
+        with patch('api.renderers.orjson', None):
+            with self.assertRaises(CommandError):
+                self.benchmark('json')
+
+    def test_memory(self):
+        """Test the memory of gunicorn workers is measured."""
+        output = self.benchmark('memory', '--workers', '1', '--requests', '1')
+        self.assertIn('preload=false', output)
+        self.assertIn('preload=true', output)
+
+    def test_metrics(self):
+        """Test the cost of the metrics is timed."""
+        output = self.benchmark(
+            'metrics', '--requests', '2', '--rounds', '1', '--size', '1',
+            '--queries', '1')
+        self.assertTrue(output)
+
+    def test_search(self):
+        """Test searching is timed, and explained."""
+        output = self.benchmark(
+            'search', '--rows', '10', '--users', '2', '--repeat', '1',
+            '--term', 'robot', '--rank', '--explain')
+        self.assertIn('robot', output)
+
+    def test_workers(self):
+        """Test creating block diagrams through gunicorn is timed."""
+        output = self.benchmark(
+            'workers', '--worker-class', 'sync', '--workers', '1',
+            '--concurrency', '1', '--requests', '2', '--latency', '0')
+        self.assertIn('sync', output)
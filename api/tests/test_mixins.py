@@ -0,0 +1,221 @@
+"""API test view mixins."""
+from contextlib import ExitStack
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.db import connections
+from django.db import DatabaseError
+from django.test import override_settings
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from mission_control import autocomplete
+from mission_control.models import BlockDiagram
+from mission_control.models import BlogQuestion
+from rovercode_web import db
+from rovercode_web.users.models import User
+
+
+@override_settings(SUPPORT_CONTACT='support@example.com')
+@override_settings(DEFAULT_BLOG_QUESTION_ID=1)
+class TestSafeMethodsNonAtomicMixin(TransactionTestCase):
+    """Tests running safe methods outside of transactions."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+
+        User.objects.create_user(
+            username='support', email='support@example.com')
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password')
+        token = AccessToken.for_user(self.user)
+        token['tier'] = 2
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        BlogQuestion.objects.update_or_create(
+            id=1, defaults={'question': 'Question'})
+
+        # Whether each query ran in a transaction
+        self.atomic = []
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def _record(self, execute, sql, params, many, context):
+        """Record whether the query runs in a transaction."""
+        self.atomic.append(connection.in_atomic_block)
+        return execute(sql, params, many, context)
+
+    def test_safe_method(self):
+        """Test reading runs every query in autocommit."""
+        BlockDiagram.objects.create(
+            user=self.user, name='test', content='<xml></xml>')
+        with connection.execute_wrapper(self._record):
+            response = self.client.get(reverse('api:v1:blockdiagram-list'))
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(self.atomic)
+        self.assertNotIn(True, self.atomic)
+
+    def test_unsafe_method(self):
+        """Test writing still runs in a single transaction."""
+        with connection.execute_wrapper(self._record):
+            response = self.client.post(
+                reverse('api:v1:blockdiagram-list'),
+                {'name': 'test', 'content': '<xml></xml>'})
+
+        self.assertEqual(201, response.status_code)
+        self.assertTrue(self.atomic)
+        self.assertNotIn(False, self.atomic)
+
+    def test_unsafe_method_rollback(self):
+        """Test a failed write leaves nothing behind."""
+        with patch(
+                'mission_control.serializers.BlockDiagramBlogQuestion'
+                '.objects.create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(
+                    reverse('api:v1:blockdiagram-list'),
+                    {'name': 'test', 'content': '<xml></xml>'})
+
+        self.assertFalse(BlockDiagram.objects.exists())
+
+
+@override_settings(SUPPORT_CONTACT='support@example.com')
+@override_settings(DEFAULT_BLOG_QUESTION_ID=1)
+@override_settings(DATABASE_REPLICAS=['replica'])
+class TestReplicaReadMixin(TransactionTestCase):
+    """Tests reading from the replicas."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        cache.clear()
+        db._replica_health.clear()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+
+        User.objects.create_user(
+            username='support', email='support@example.com')
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password')
+        token = AccessToken.for_user(self.user)
+        token['tier'] = 2
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        BlogQuestion.objects.update_or_create(
+            id=1, defaults={'question': 'Question'})
+        BlockDiagram.objects.create(
+            user=self.user, name='test', content='<xml></xml>')
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def _queries(self, url):
+        """Get the url, returning the database and SQL of each query."""
+        queries = []
+        with ExitStack() as stack:
+            for alias in ('default', 'replica'):
+                def record(execute, sql, params, many, context, alias=alias):
+                    queries.append((alias, sql))
+                    return execute(sql, params, many, context)
+                stack.enter_context(connections[alias].execute_wrapper(record))
+
+            response = self.client.get(url)
+
+        self.assertEqual(200, response.status_code)
+        return queries
+
+    def _list(self):
+        """List the block diagrams, returning the databases queried."""
+        return {
+            alias for alias, _ in self._queries(
+                reverse('api:v1:blockdiagram-list'))}
+
+    def _tables(self, url, alias):
+        """Get the url, returning the tables read from the database."""
+        return {
+            table
+            for queried, sql in self._queries(url) if queried == alias
+            for table in ('curriculum_course', 'mission_control_tag')
+            if f'"{table}"' in sql}
+
+    def test_replica_reads(self):
+        """Test safe requests read from the replica."""
+        self.assertIn('replica', self._list())
+        self.assertEqual(0, db.get_replica_lag('replica'))
+
+    def test_sticky(self):
+        """Test users read their own writes from the primary."""
+        response = self.client.post(
+            reverse('api:v1:blockdiagram-list'),
+            {'name': 'test', 'content': '<xml></xml>'})
+        self.assertEqual(201, response.status_code)
+
+        self.assertEqual({'default'}, self._list())
+
+        cache.clear()
+        self.assertIn('replica', self._list())
+
+    @patch('rovercode_web.db.get_replica_lag', return_value=60)
+    def test_lagging(self, _):
+        """Test lagging replicas are skipped."""
+        self.assertEqual({'default'}, self._list())
+
+    def test_unreachable(self):
+        """Test unreachable replicas are skipped until checked again."""
+        with patch.object(
+                connections['replica'], 'cursor', side_effect=DatabaseError):
+            self.assertIsNone(db.get_replica_lag('replica'))
+            self.assertEqual({'default'}, self._list())
+
+        self.assertEqual({'default'}, self._list())
+        with patch.object(db, 'LAG_CHECK_INTERVAL', -1):
+            self.assertIn('replica', self._list())
+
+    def test_versioned_caches(self):
+        """Test caches tied to a version are filled from the primary."""
+        # The remixes overlaid on the catalog may still come from a replica
+        url = reverse('api:v1:course-list')
+        self.assertEqual({'curriculum_course'}, self._tables(url, 'default'))
+        self.assertEqual(set(), self._tables(url, 'replica'))
+
+        url = reverse('api:v1:tag-list')
+        self.assertEqual({'mission_control_tag'}, self._tables(url, 'default'))
+        self.assertEqual(set(), self._tables(url, 'replica'))
+
+        with patch.object(autocomplete, '_current', (None, None, 0)):
+            url = reverse('api:v1:tag-autocomplete')
+            self.assertEqual(
+                {'mission_control_tag'}, self._tables(url, 'default'))
+
+    def test_router(self):
+        """Test objects read from a replica are written to the primary."""
+        with db.replica_reads():
+            block_diagram = BlockDiagram.objects.get()
+        self.assertEqual('replica', block_diagram._state.db)
+
+        block_diagram.name = 'renamed'
+        block_diagram.save()
+        self.assertEqual('default', block_diagram._state.db)
+        self.assertTrue(
+            BlockDiagram.objects.filter(name='renamed').exists())
+
+        router = db.ReplicaRouter()
+        self.assertTrue(router.allow_relation(block_diagram, self.user))
+        self.assertTrue(router.allow_migrate('default', 'mission_control'))
+        self.assertFalse(router.allow_migrate('replica', 'mission_control'))
@@ -0,0 +1,169 @@
+"""API test renderers and parsers."""
+import datetime
+import io
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytz
+from django.utils.translation import gettext_lazy
+from rest_framework import parsers
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.serializer_helpers import ReturnDict
+from rest_framework.utils.serializer_helpers import ReturnList
+from test_plus.test import TestCase
+
+from api.parsers import JSONParser
+from api.renderers import JSONRenderer
+from api.renderers import has_unusual_floats
+from mission_control.models import Tag
+
+UTC_TIME = datetime.datetime(2021, 3, 5, 3, 33, 0, 123456, tzinfo=pytz.utc)
+
+DATA = OrderedDict([
+    ('utc', UTC_TIME),
+    ('london', pytz.timezone('Europe/London').localize(
+        datetime.datetime(2021, 1, 5, 3, 33))),
+    ('offset', UTC_TIME.astimezone(pytz.timezone('America/Chicago'))),
+    ('naive', datetime.datetime(2021, 3, 5, 3, 33)),
+    ('date', datetime.date(2021, 3, 5)),
+    ('time', datetime.time(3, 33, 0, 5)),
+    ('timedelta', datetime.timedelta(days=1, seconds=5)),
+    ('decimal', Decimal('1.10')),
+    ('lazy', gettext_lazy('This field is required.')),
+    ('uuid', uuid.UUID('12345678123456781234567812345678')),
+    ('bytes', b'bytes'),
+    ('unicode', 'Rover \u00e9\u2603\u2028\u2029</script>'),
+    ('numbers', [0, -1, 2 ** 63 - 1, 1.5, 0.1, True, False, None]),
+    ('nested', {'list': [], 'dict': {}, 'tuple': (1, 2), 1: 'int key'}),
+])
+
+
+class TestJSONRenderer(TestCase):
+    """Tests rendering JSON."""
+
+    def assertSameAsDRF(self, data, accepted_media_type=None,
+                        renderer_context=None):
+        """Check the JSON is the same as DRF's."""
+        self.assertEqual(
+            renderers.JSONRenderer().render(
+                data, accepted_media_type, renderer_context),
+            JSONRenderer().render(
+                data, accepted_media_type, renderer_context))
+
+    def test_same_as_drf(self):
+        """Test rendering the same bytes as DRF."""
+        self.assertSameAsDRF(DATA)
+        self.assertSameAsDRF([DATA, 'text', 1])
+        self.assertSameAsDRF(None)
+        self.assertEqual(
+            b'"2021-03-05T03:33:00.123456Z"', JSONRenderer().render(UTC_TIME))
+
+    def test_querysets(self):
+        """Test rendering querysets through DRF's encoder."""
+        Tag.objects.create(name='tag')
+        self.assertSameAsDRF({'tags': Tag.objects.values('name')})
+
+    def test_indent(self):
+        """Test indenting as DRF does."""
+        self.assertSameAsDRF(DATA, 'application/json; indent=2')
+        self.assertSameAsDRF(DATA, 'application/json; indent=4')
+        self.assertSameAsDRF(DATA, renderer_context={'indent': 4})
+
+    def test_too_big_for_orjson(self):
+        """Test integers beyond 64 bits."""
+        self.assertSameAsDRF({'big': 2 ** 64})
+
+    def test_floats(self):
+        """Test floats with exponents are written as DRF writes them."""
+        for value in (1e16, -1.5e300, 1e-5, 2e-300):
+            self.assertSameAsDRF({'float': value})
+            self.assertSameAsDRF({'values': Tag.objects.none(), 'x': [value]})
+        Tag.objects.create(name='tag')
+        with patch.object(
+                renderers.JSONRenderer.encoder_class, 'default',
+                return_value=[{'float': 1e16}]):
+            self.assertEqual(
+                b'{"tags":[{"float":1e+16}]}',
+                JSONRenderer().render({'tags': object()}))
+
+    def test_unusual_floats(self):
+        """Test floats are found however deep, and only in the data."""
+        self.assertFalse(has_unusual_floats(DATA))
+        serializer = Mock(data={'float': 1e16})
+        self.assertFalse(has_unusual_floats(ReturnList(
+            [ReturnDict({'float': 1.5}, serializer=serializer)],
+            serializer=serializer)))
+        for value in (1e16, -1e16, 1e-5, float('nan'), float('inf')):
+            self.assertTrue(has_unusual_floats(
+                [OrderedDict([('nested', {'tuple': (1, [value])})])]))
+            self.assertTrue(has_unusual_floats({value: 'key'}))
+
+        with patch.object(renderers.JSONRenderer, 'render') as render:
+            JSONRenderer().render(DATA)
+        self.assertFalse(render.called)
+
+    def test_not_finite(self):
+        """Test NaN and infinities are refused, as DRF does."""
+        for value in (float('nan'), float('inf'), -float('inf')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'numbers': [1.5, value]})
+
+    def test_cannot_render(self):
+        """Test data neither can render fails as DRF does."""
+        with self.assertRaises(TypeError):
+            JSONRenderer().render({'object': object()})
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(UTC_TIME.timetz())
+
+    def test_without_orjson(self):
+        """Test falling back to DRF's renderer."""
+        with patch('api.renderers.orjson', None):
+            self.assertSameAsDRF(DATA)
+
+
+class TestJSONParser(TestCase):
+    """Tests parsing JSON."""
+
+    def parse(self, body, parser_context=None):
+        """Parse the body with both parsers, checking they agree."""
+        results = []
+        for parser in (parsers.JSONParser(), JSONParser()):
+            try:
+                results.append(
+                    parser.parse(io.BytesIO(body), None, parser_context))
+            except ParseError as exc:
+                results.append(str(exc))
+        self.assertEqual(results[0], results[1])
+        return results[1]
+
+    def test_parse(self):
+        """Test parsing the same data as DRF."""
+        self.assertEqual(
+            {'name': 'Rover é', 'count': [1, 1.5, None, True]},
+            self.parse('{"name": "Rover é", "count": [1, 1.5, null, '
+                       'true]}'.encode()))
+        self.assertEqual(
+            {'big': 2 ** 64}, self.parse(b'{"big": 18446744073709551616}'))
+
+    def test_invalid(self):
+        """Test failing as DRF does."""
+        self.assertTrue(self.parse(b'{"name": ').startswith(
+            'JSON parse error - '))
+        self.parse(b'{"number": NaN}')
+        self.parse(b'\xff')
+
+    def test_other_encodings(self):
+        """Test parsing other encodings with DRF's parser."""
+        self.assertEqual({'name': 'é'}, self.parse(
+            '{"name": "é"}'.encode('latin-1'),
+            {'encoding': 'latin-1'}))
+
+    def test_without_orjson(self):
+        """Test falling back to DRF's parser."""
+        with patch('api.parsers.orjson', None):
+            self.assertEqual(
+                {'name': 'rover'}, self.parse(b'{"name": "rover"}'))
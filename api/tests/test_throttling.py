@@ -0,0 +1,183 @@
+"""API test throttling."""
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_save
+from django.test import override_settings
+from django.urls import reverse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework.test import APIRequestFactory
+from test_plus.test import TestCase
+
+from api import throttling
+from api.throttling import LocalBuckets
+from api.throttling import TokenBucketThrottle
+from mission_control.models import BlockDiagram
+from rovercode_web.metrics import REGISTRY
+from rovercode_web.metrics import THROTTLES
+
+
+def throttle_rates(**rates):
+    """Override the throttle rates."""
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class TestLocalBuckets(TestCase):
+    """Tests the token buckets kept in the process."""
+
+    def test_take(self):
+        """Test a burst is allowed, then the rate."""
+        buckets = LocalBuckets()
+        with patch('time.monotonic', return_value=100):
+            self.assertEqual((True, 0), buckets.take('key', 0.5, 2))
+            self.assertEqual((True, 0), buckets.take('key', 0.5, 2))
+            self.assertEqual((False, 2), buckets.take('key', 0.5, 2))
+            self.assertEqual((True, 0), buckets.take('other', 0.5, 2))
+        with patch('time.monotonic', return_value=101):
+            self.assertEqual((False, 1), buckets.take('key', 0.5, 2))
+        with patch('time.monotonic', return_value=102):
+            self.assertEqual((True, 0), buckets.take('key', 0.5, 2))
+
+    @patch('api.throttling.LOCAL_BUCKETS_MAX', 2)
+    def test_prune(self):
+        """Test full buckets are dropped once there are too many."""
+        buckets = LocalBuckets()
+        with patch('time.monotonic', return_value=100):
+            buckets.take('slow', 0.001, 2)
+            buckets.take('fast', 1, 2)
+        with patch('time.monotonic', return_value=101):
+            buckets.take('new', 1, 2)
+        self.assertEqual({'slow', 'new'}, set(buckets._buckets))
+
+        buckets.clear()
+        self.assertEqual({}, buckets._buckets)
+
+
+class TestTake(TestCase):
+    """Tests taking tokens from Redis or locally."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        throttling._redis.clear()
+        throttling._redis_failed = None
+        throttling.LOCAL_BUCKETS.clear()
+
+    def tearDown(self):
+        """Tear down the tests."""
+        throttling._redis.clear()
+        throttling._redis_failed = None
+
+    def test_not_redis(self):
+        """Test the buckets are local without a Redis cache."""
+        with patch('time.monotonic', return_value=100):
+            self.assertEqual((True, 0, 'local'), throttling.take('key', 1, 1))
+            self.assertEqual((False, 1, 'local'), throttling.take(
+                'key', 1, 1))
+        self.assertEqual({'script': None}, throttling._redis)
+
+    @patch('api.throttling.get_redis_connection')
+    def test_redis(self, get_redis_connection):
+        """Test the buckets are kept in Redis, while it can be reached."""
+        script = get_redis_connection.return_value.register_script.return_value
+        script.return_value = [0, b'1.5']
+        with patch('time.time', return_value=1000):
+            self.assertEqual((False, 1.5, 'redis'), throttling.take(
+                'key', 0.5, 2))
+        script.assert_called_once_with(
+            keys=[cache.make_key('key')], args=[0.5, 2, 1000])
+        get_redis_connection.return_value.register_script.assert_called_with(
+            throttling.TOKEN_BUCKET_SCRIPT)
+
+        script.side_effect = RedisConnectionError
+        with patch('time.monotonic', return_value=100):
+            with self.assertLogs('api.throttling'):
+                self.assertEqual((True, 0, 'local'), throttling.take(
+                    'key', 0.5, 2))
+        with patch('time.monotonic', return_value=105):
+            self.assertEqual((True, 0, 'local'), throttling.take(
+                'key', 0.5, 2))
+        self.assertEqual(2, script.call_count)
+
+        script.side_effect = None
+        script.return_value = [1, b'0']
+        with patch('time.monotonic', return_value=110):
+            self.assertEqual((True, 0, 'redis'), throttling.take(
+                'key', 0.5, 2))
+        self.assertIsNone(throttling._redis_failed)
+
+
+class TestTokenBucketThrottle(TestCase):
+    """Tests throttling the block diagram actions."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        post_save.disconnect(
+            sender=settings.AUTH_USER_MODEL, dispatch_uid='new_user')
+        throttling.LOCAL_BUCKETS.clear()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+        self.user = self.make_user()
+        self.bd = BlockDiagram.objects.create(
+            user=self.user, name='Program', content='<xml></xml>')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user, token={'tier': 1})
+        self.url = reverse(
+            'api:v1:blockdiagram-detail', kwargs={'pk': self.bd.pk})
+
+    def tearDown(self):
+        """Tear down the tests."""
+        self.patcher.stop()
+
+    def save(self):
+        """Save the block diagram, as the editor does."""
+        return self.client.patch(
+            self.url, {'content': '<xml></xml>'}, format='json')
+
+    def test_throttled(self):
+        """Test saving too often is throttled, and reading is not."""
+        labels = ('autosave', 'throttled', 'local')
+        throttled = REGISTRY.counters[(THROTTLES, labels)]
+        with throttle_rates(autosave='2/min'):
+            self.assertEqual(200, self.save().status_code)
+            self.assertEqual(200, self.save().status_code)
+            response = self.save()
+            self.assertEqual(429, response.status_code)
+            self.assertEqual('30', response['Retry-After'])
+            self.assertEqual(200, self.client.get(self.url).status_code)
+        self.assertEqual(
+            throttled + 1, REGISTRY.counters[(THROTTLES, labels)])
+
+    def test_not_throttled(self):
+        """Test scopes without a rate are not throttled."""
+        with throttle_rates(autosave=None):
+            for _ in range(3):
+                self.assertEqual(200, self.save().status_code)
+
+    def test_no_rate(self):
+        """Test scopes must be in the settings."""
+        with throttle_rates():
+            with self.assertRaises(ImproperlyConfigured):
+                self.save()
+
+    def test_anonymous(self):
+        """Test anonymous requests are throttled by address."""
+        request = Request(APIRequestFactory().post('/'))
+        request.user = AnonymousUser()
+        view = MagicMock(action='report', throttle_scopes={'report': 'report'})
+        with throttle_rates(report='1/hour'), \
+                patch('time.monotonic', return_value=100):
+            throttle = TokenBucketThrottle()
+            self.assertTrue(throttle.allow_request(request, view))
+            self.assertFalse(throttle.allow_request(request, view))
+        self.assertEqual(3600, throttle.wait())
+        self.assertEqual(
+            'throttle:report:127.0.0.1',
+            throttle.get_cache_key(request, view))
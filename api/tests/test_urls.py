@@ -3,6 +3,8 @@ from django.urls import reverse, resolve
 
 from test_plus.test import TestCase
 
+from api.urls import router
+
 
 class TestApiURLs(TestCase):
     """Tests the urls."""
@@ -18,3 +20,15 @@ class TestApiURLs(TestCase):
         self.assertEqual(
             resolve('/api/v1/block-diagrams/').view_name,
             'api:v1:blockdiagram-list')
+
+    def test_query_budgets(self):
+        """Every API action has a query budget."""
+        for _, viewset, _ in router.registry:
+            actions = {
+                action
+                for route in router.get_routes(viewset)
+                for action in router.get_method_map(
+                    viewset, route.mapping).values()
+            }
+            self.assertEqual(
+                actions, set(viewset.query_budgets), viewset.__name__)
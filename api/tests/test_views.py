@@ -4,14 +4,19 @@ from unittest.mock import patch
 from test_plus.test import TestCase
 
 import json
+import tempfile
+import requests
 import responses
 from zenpy.lib.api import TicketApi
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
 from django.db.models.signals import post_save
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 
@@ -19,11 +24,13 @@ from curriculum.models import Course
 from curriculum.models import Lesson
 from curriculum.models import ProgressState
 from curriculum.models import State
+from mission_control import autosave
 from mission_control.models import BlockDiagram
 from mission_control.models import BlockDiagramBlogQuestion
 from mission_control.models import BlogAnswer
 from mission_control.models import BlogQuestion
 from mission_control.models import Tag
+from rovercode_web.query_budget import assert_constant_queries
 
 
 class BaseAuthenticatedTestCase(TestCase):
@@ -89,6 +96,38 @@ class TestBlockDiagramViewSet(BaseAuthenticatedTestCase):
         super().tearDown()
         self.patcher.stop()
 
+    def test_bd_list_queries(self):
+        """Test listing block diagrams makes as many queries for any page."""
+        self.authenticate()
+        tag = Tag.objects.create(name='robots')
+        admin_tag = Tag.objects.create(name='featured')
+
+        def grow(count):
+            for _ in range(count):
+                user = self.make_user(
+                    f'user{get_user_model().objects.count()}')
+                bd = BlockDiagram.objects.create(
+                    user=user,
+                    name='test',
+                    content='<xml></xml>',
+                    state=State.objects.create(
+                        progress=ProgressState.IN_PROGRESS),
+                )
+                bd.owner_tags.add(tag)
+                bd.admin_tags.add(admin_tag)
+                question = BlockDiagramBlogQuestion.objects.create(
+                    block_diagram=bd,
+                    blog_question=self.default_question,
+                    sequence_number=1,
+                )
+                BlogAnswer.objects.create(
+                    block_diagram_blog_question=question, answer='Answer')
+
+        assert_constant_queries(
+            lambda: self.client.get(
+                reverse('api:v1:blockdiagram-list'), {'size': 100}),
+            grow)
+
     def test_bd(self):
         """Test the block diagram API view displays the correct items."""
         self.authenticate()
@@ -328,6 +367,50 @@ class TestBlockDiagramViewSet(BaseAuthenticatedTestCase):
         self.assertEqual(BlockDiagram.objects.last().user.id, user.id)
         self.assertEqual(BlockDiagram.objects.last().name, 'test1')
 
+    def test_bd_autosave(self):
+        """Test autosaves are buffered and read until the next save."""
+        cache.clear()
+        self.authenticate()
+        bd = BlockDiagram.objects.create(
+            user=self.admin, name='test', content='<xml></xml>')
+        url = reverse('api:v1:blockdiagram-detail', kwargs={'pk': bd.pk})
+        content = '<xml><block type="motor_stop"></block></xml>'
+
+        response = self.client.patch(
+            f'{url}?autosave=true', {'content': content}, format='json')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(content, response.json()['content'])
+        bd.refresh_from_db()
+        self.assertEqual('<xml></xml>', bd.content)
+
+        self.assertEqual(content, self.get(url).json()['content'])
+        response = self.get(
+            reverse('api:v1:blockdiagram-list'), data={'metrics': 'true'})
+        self.assertEqual(content, response.json()['results'][0]['content'])
+        self.assertEqual(1, response.json()['results'][0]['block_count'])
+
+        # Saving anything else writes the autosaved content too
+        response = self.client.patch(url, {'name': 'new'}, format='json')
+        self.assertEqual(200, response.status_code)
+        bd.refresh_from_db()
+        self.assertEqual('new', bd.name)
+        self.assertEqual(content, bd.content)
+        self.assertEqual(1, bd.block_count)
+
+    def test_bd_autosave_other_fields(self):
+        """Test autosaves changing more than the content are saved."""
+        self.authenticate()
+        bd = BlockDiagram.objects.create(
+            user=self.admin, name='test', content='<xml></xml>')
+        response = self.client.patch(
+            reverse('api:v1:blockdiagram-detail', kwargs={'pk': bd.pk}) +
+            '?autosave=1', {'content': '<xml/>', 'name': 'new'},
+            format='json')
+        self.assertEqual(200, response.status_code)
+        bd.refresh_from_db()
+        self.assertEqual('<xml/>', bd.content)
+        self.assertEqual('new', bd.name)
+
     def test_bd_delete_as_valid_user(self):
         """Test deleting block diagram as owner."""
         self.authenticate()
@@ -601,6 +684,146 @@ class TestBlockDiagramViewSet(BaseAuthenticatedTestCase):
         self.assertEqual(1, response.json()['total_pages'])
         self.assertEqual(0, len(response.json()['results']))
 
+    def test_bd_block_type_filter(self):
+        """Test the block diagram API view filters on block types."""
+        self.authenticate()
+        bd1 = BlockDiagram.objects.create(
+            user=self.admin,
+            name='test1',
+            content='<xml><block type="motor_start"></block></xml>'
+        )
+        BlockDiagram.objects.create(
+            user=self.admin,
+            name='test2',
+            content=(
+                '<xml><block type="sensor_read"></block>'
+                '<block type="motor_start"></block></xml>'
+            )
+        )
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') + '?block_type=motor_start')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(response.json()['results']))
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') +
+            '?block_type=motor_start,sensor_read')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()['results']))
+        self.assertEqual(response.json()['results'][0]['name'], 'test2')
+        self.assertNotIn('block_types', response.json()['results'][0])
+
+        BlockDiagram.objects.filter(id=bd1.id).update(block_types=[])
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') + '?block_type=motor_start')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()['results']))
+
+    def test_bd_metrics(self):
+        """Test the block diagram API view exposes the content metrics."""
+        self.authenticate()
+        BlockDiagram.objects.create(
+            user=self.admin,
+            name='small',
+            content='<xml><block type="motor_start"></block></xml>'
+        )
+        BlockDiagram.objects.create(
+            user=self.admin,
+            name='large',
+            content=(
+                '<xml><block type="controls_repeat_ext">'
+                '<statement name="DO"><block type="motor_start">'
+                '<next><block type="motor_stop"></block></next>'
+                '</block></statement>'
+                '</block></xml>'
+            )
+        )
+
+        response = self.get(reverse('api:v1:blockdiagram-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('block_count', response.json()['results'][0])
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') +
+            '?metrics=true&ordering=-block_count')
+        self.assertEqual(200, response.status_code)
+        results = response.json()['results']
+        self.assertEqual(['large', 'small'], [bd['name'] for bd in results])
+        self.assertEqual(3, results[0]['block_count'])
+        self.assertEqual(3, results[0]['block_type_count'])
+        self.assertEqual(2, results[0]['max_depth'])
+        self.assertEqual(1, results[1]['max_depth'])
+        self.assertLess(results[1]['content_size'], results[0]['content_size'])
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') + '?max_depth__gte=2')
+        self.assertEqual(200, response.status_code)
+        results = response.json()['results']
+        self.assertEqual(['large'], [bd['name'] for bd in results])
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') + '?block_count__lte=2')
+        self.assertEqual(200, response.status_code)
+        results = response.json()['results']
+        self.assertEqual(['small'], [bd['name'] for bd in results])
+
+    def test_bd_search(self):
+        """Test the block diagram API view searches name and user."""
+        self.authenticate()
+        user1 = self.make_user('rover-fan')
+        bd1 = BlockDiagram.objects.create(
+            user=self.admin,
+            name='Line Follower',
+            content='<xml></xml>'
+        )
+        bd2 = BlockDiagram.objects.create(
+            user=user1,
+            name='Dance',
+            content='<xml></xml>'
+        )
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') + '?search=follow')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()['results']))
+        self.assertEqual(response.json()['results'][0]['id'], bd1.id)
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') + '?search=ROVER')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()['results']))
+        self.assertEqual(response.json()['results'][0]['id'], bd2.id)
+
+    def test_bd_search_rank(self):
+        """Test the block diagram API view ranks search results."""
+        self.authenticate()
+        bd1 = BlockDiagram.objects.create(
+            user=self.admin,
+            name='A line drawing',
+            content='<xml></xml>'
+        )
+        bd2 = BlockDiagram.objects.create(
+            user=self.admin,
+            name='B line follower',
+            description='Follows the line',
+            content='<xml></xml>'
+        )
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') + '?search=line')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            [bd1.id, bd2.id],
+            [bd['id'] for bd in response.json()['results']])
+
+        response = self.get(
+            reverse('api:v1:blockdiagram-list') + '?search=line&rank=true')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            [bd2.id, bd1.id],
+            [bd['id'] for bd in response.json()['results']])
+
     def test_profanity_check(self):
         """Test that email is sent when profanity detected."""
         self.mock_post.return_value.status_code = 200
@@ -641,6 +864,24 @@ class TestBlockDiagramViewSet(BaseAuthenticatedTestCase):
         self.assertTrue(mock_logger.error.called)
         self.assertEqual(404, mock_logger.error.call_args[0][1])
 
+    @patch('mission_control.signals.handlers.LOGGER')
+    def test_profanity_check_timeout(self, mock_logger):
+        """Test that a slow profanity check does not hold up saving."""
+        self.mock_post.side_effect = requests.exceptions.Timeout
+        self.authenticate()
+        data = {
+            'name': 'profane-word',
+            'content': '<xml></xml>',
+        }
+        response = self.client.post(reverse('api:v1:blockdiagram-list'), data)
+        self.assertEqual(201, response.status_code)
+
+        self.assertEqual(0, len(mail.outbox))
+        self.assertTrue(mock_logger.error.called)
+        self.assertEqual(
+            settings.EXTERNAL_SERVICE_TIMEOUT,
+            self.mock_post.call_args[1]['timeout'])
+
     def test_profanity_check_flag(self):
         """Test that program is flagged correctly."""
         profane_response = {
@@ -714,6 +955,20 @@ class TestBlockDiagramViewSet(BaseAuthenticatedTestCase):
         self.assertIsNone(response.json()['lesson'])
         self.assertIsNone(response.json()['state'])
 
+    def test_remix_autosaved(self):
+        """Test remixing a block diagram copies its autosaved content."""
+        cache.clear()
+        self.authenticate()
+        bd = BlockDiagram.objects.create(
+            user=self.make_user(), name='test', content='<xml></xml>')
+        autosave.buffer(bd, '<xml/>')
+        response = self.post(
+            reverse('api:v1:blockdiagram-remix', kwargs={'pk': bd.id}))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('<xml/>', response.json()['content'])
+        remix = BlockDiagram.objects.get(pk=response.json()['id'])
+        self.assertEqual('<xml/>', remix.content)
+
     def test_remix_over_limit(self):
         """Test disallow remixing a block diagram when over limit."""
         BlockDiagram.objects.create(
@@ -945,6 +1200,54 @@ class TestBlockDiagramViewSet(BaseAuthenticatedTestCase):
             reverse('api:v1:blockdiagram-detail', kwargs={'pk': bd.id}))
         self.assertEqual(404, response.status_code)
 
+    def test_batch(self):
+        """Test getting block diagrams at once, in the order asked for."""
+        reference = BlockDiagram.objects.create(
+            user=self.support, name='reference', content='<xml></xml>')
+        Lesson.objects.create(
+            course=Course.objects.create(name='Course1'),
+            sequence_number=1,
+            reference=reference,
+            tier=2,
+        )
+        user = self.make_user()
+        first = BlockDiagram.objects.create(
+            user=user, name='first', content='<xml></xml>')
+        second = BlockDiagram.objects.create(
+            user=self.admin, name='second', content='<xml></xml>')
+        cache.clear()
+        autosave.buffer(second, '<xml/>')
+
+        self.authenticate(tier=1)
+        url = reverse('api:v1:blockdiagram-batch')
+        ids = [second.id, 0, reference.id, first.id, second.id]
+        # The view's query budget holds for any number of ids
+        response = self.get(url, data={'ids': ','.join(map(str, ids))})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            ['second', 'first'],
+            [bd['name'] for bd in response.json()['results']])
+        self.assertEqual('<xml/>', response.json()['results'][0]['content'])
+        self.assertEqual([0], response.json()['missing'])
+        self.assertEqual([reference.id], response.json()['forbidden'])
+
+        self.authenticate(tier=2)
+        response = self.get(url, data={'ids': f'{reference.id}'})
+        self.assertEqual(
+            ['reference'], [bd['name'] for bd in response.json()['results']])
+        self.assertEqual([], response.json()['forbidden'])
+
+    @patch('api.views.BlockDiagramViewSet.batch_limit', 2)
+    def test_batch_invalid(self):
+        """Test the ids must be a short enough list of numbers."""
+        self.authenticate()
+        url = reverse('api:v1:blockdiagram-batch')
+        for ids in ('', ' , ', '1,x', '1,2,3'):
+            response = self.get(url, data={'ids': ids})
+            self.assertEqual(400, response.status_code)
+            self.assertIn('ids', response.json())
+        self.assertEqual(400, self.get(url).status_code)
+
 
 class TestUserViewSet(BaseAuthenticatedTestCase):
     """Tests the user API view."""
@@ -1043,6 +1346,98 @@ class TestUserViewSet(BaseAuthenticatedTestCase):
         self.assertEqual(403, response.status_code)
 
 
+class TestTagViewSet(BaseAuthenticatedTestCase):
+    """Tests the tag API view."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+        cache.clear()
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def test_tag_list_queries(self):
+        """Test listing tags makes as many queries however many there are."""
+        self.authenticate()
+
+        def grow(count):
+            for _ in range(count):
+                Tag.objects.create(name=f'tag{Tag.objects.count()}')
+
+        assert_constant_queries(
+            lambda: self.client.get(reverse('api:v1:tag-list')), grow)
+
+    def test_tag_list_etag(self):
+        """Test the tag list can be revalidated with its ETag."""
+        Tag.objects.create(name='first')
+        self.authenticate()
+
+        response = self.client.get(reverse('api:v1:tag-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([{
+            'name': 'first',
+            'admin_count': 0,
+            'owner_count': 0,
+            'usage_count': 0,
+        }], response.json())
+        etag = response['ETag']
+
+        response = self.client.get(
+            reverse('api:v1:tag-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        Tag.objects.create(name='second')
+        response = self.client.get(
+            reverse('api:v1:tag-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(response.json()))
+        self.assertNotEqual(etag, response['ETag'])
+        etag = response['ETag']
+
+        bd = BlockDiagram.objects.create(
+            user=self.admin, name='test', content='<xml></xml>')
+        bd.owner_tags.add(Tag.objects.get(name='second'))
+        response = self.client.get(
+            reverse('api:v1:tag-list'), {'ordering': '-usage_count'},
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            ['second', 'first'], [tag['name'] for tag in response.json()])
+        self.assertEqual(1, response.json()[0]['usage_count'])
+
+    def test_tag_autocomplete(self):
+        """Test completing tag names by the most used."""
+        tags = [
+            Tag.objects.create(name=name)
+            for name in ('line', 'light', 'lights', 'maze')
+        ]
+        for number in range(3):
+            bd = BlockDiagram.objects.create(
+                user=self.admin, name=f'test{number}', content='<xml></xml>')
+            bd.owner_tags.set(tags[number:])
+        self.authenticate()
+
+        response = self.client.get(
+            reverse('api:v1:tag-autocomplete'), {'q': 'Li', 'limit': 2})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            [{'name': 'lights'}, {'name': 'light'}], response.json())
+
+        response = self.client.get(reverse('api:v1:tag-autocomplete'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(4, len(response.json()))
+
+        response = self.client.get(
+            reverse('api:v1:tag-autocomplete'), {'limit': 'all'})
+        self.assertEqual(400, response.status_code)
+
+
 class TestCourseViewSet(BaseAuthenticatedTestCase):
     """Tests the course API view."""
 
@@ -1052,6 +1447,7 @@ class TestCourseViewSet(BaseAuthenticatedTestCase):
         self.patcher = patch('requests.post')
         self.mock_post = self.patcher.start()
         self.mock_post.return_value.status_code = 404
+        cache.clear()
 
     def tearDown(self):
         """Tear down the tests."""
@@ -1140,3 +1536,227 @@ class TestCourseViewSet(BaseAuthenticatedTestCase):
             },
             'tier': 2,
         })
+
+    def _create_lessons(self, name='Course1'):
+        """Create a course with two lessons."""
+        user = self.make_user(f'{name} author')
+        course = Course.objects.create(name=name)
+        lessons = [
+            Lesson.objects.create(
+                course=course,
+                sequence_number=number,
+                reference=BlockDiagram.objects.create(
+                    user=user,
+                    name=f'lesson{number}',
+                    content='<xml></xml>'
+                ),
+            )
+            for number in range(2)
+        ]
+        return course, lessons
+
+    def _grow_courses(self, count):
+        """Add courses of two lessons, one of which the user remixed."""
+        for _ in range(count):
+            course, lessons = self._create_lessons(
+                f'Course{Course.objects.count()}')
+            BlockDiagram.objects.create(
+                user=self.admin,
+                name=f'remix{lessons[0].pk}',
+                content='<xml></xml>',
+                lesson=lessons[0],
+                state=State.objects.create(
+                    progress=ProgressState.IN_PROGRESS),
+            )
+
+    def test_course_list_queries(self):
+        """Test listing courses makes as many queries however many."""
+        self.authenticate()
+        assert_constant_queries(
+            lambda: self.client.get(
+                reverse('api:v1:course-list'), {'size': 100}),
+            self._grow_courses)
+
+    def test_lesson_list_queries(self):
+        """Test listing lessons makes as many queries however many."""
+        self.authenticate()
+        assert_constant_queries(
+            lambda: self.client.get(
+                reverse('api:v1:lesson-list'), {'size': 100}),
+            self._grow_courses)
+
+    def test_course_list_cache(self):
+        """Test the course list is cached with a per user overlay."""
+        course, lessons = self._create_lessons()
+        other = self.make_user('other')
+        remix = BlockDiagram.objects.create(
+            user=other,
+            name='remix',
+            content='<xml></xml>',
+            lesson=lessons[1],
+            state=State.objects.create(progress=ProgressState.IN_PROGRESS),
+        )
+
+        self.authenticate()
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('miss', response['X-Catalog-Cache'])
+        self.assertEqual(
+            [False, False],
+            [lesson['active_bd_owned']
+             for lesson in response.json()['results'][0]['lessons']])
+
+        self.authenticate('other')
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('hit', response['X-Catalog-Cache'])
+        lesson = response.json()['results'][0]['lessons'][1]
+        self.assertEqual(remix.pk, lesson['active_bd'])
+        self.assertTrue(lesson['active_bd_owned'])
+        self.assertEqual({'progress': 'IN_PROGRESS'}, lesson['state'])
+
+        # Saving a block diagram that is not a reference keeps the cache,
+        # and tells so without querying the lessons
+        with CaptureQueriesContext(connection) as queries:
+            remix.save()
+        self.assertFalse(any(
+            'curriculum_lesson' in query['sql'] for query in queries))
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertEqual('hit', response['X-Catalog-Cache'])
+
+        # As does changing a reference's content, which is not shown
+        reference = lessons[0].reference
+        reference.content = '<xml><block/></xml>'
+        reference.save(update_fields=['content'])
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertEqual('hit', response['X-Catalog-Cache'])
+
+        reference.description = 'Updated'
+        reference.save()
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertEqual('miss', response['X-Catalog-Cache'])
+        self.assertEqual(
+            'Updated',
+            response.json()['results'][0]['lessons'][0]['description'])
+
+        Course.objects.create(name='Course2')
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertEqual('miss', response['X-Catalog-Cache'])
+        self.assertEqual(2, len(response.json()['results']))
+
+        course.delete()
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertEqual('miss', response['X-Catalog-Cache'])
+        self.assertEqual(1, len(response.json()['results']))
+
+    def test_lesson_retrieve_cache(self):
+        """Test retrieving a lesson is cached with a per user overlay."""
+        _, lessons = self._create_lessons()
+        remix = BlockDiagram.objects.create(
+            user=self.admin,
+            name='remix',
+            content='<xml></xml>',
+            lesson=lessons[0],
+        )
+
+        self.authenticate()
+        url = reverse('api:v1:lesson-detail', kwargs={'pk': lessons[0].pk})
+        for status in ('miss', 'hit'):
+            response = self.client.get(url)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(status, response['X-Catalog-Cache'])
+            self.assertEqual(remix.pk, response.json()['active_bd'])
+
+        lessons[0].goals = 'Updated'
+        lessons[0].save()
+        response = self.client.get(url)
+        self.assertEqual('miss', response['X-Catalog-Cache'])
+        self.assertEqual('Updated', response.json()['goals'])
+
+    def test_cache_stats(self):
+        """Test getting the catalog cache counters."""
+        self.authenticate()
+        response = self.client.get(reverse('api:v1:course-cache-stats'))
+        self.assertEqual(403, response.status_code)
+
+        self.admin.is_staff = True
+        self.admin.save()
+        for _ in range(3):
+            self.client.get(reverse('api:v1:course-list'))
+
+        response = self.client.get(reverse('api:v1:course-cache-stats'))
+        self.assertEqual(200, response.status_code)
+        self.assertDictEqual({'hits': 2, 'misses': 1}, response.json())
+
+
+class TestProfileViewSet(BaseAuthenticatedTestCase):
+    """Tests the request profiles API view."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        settings_override = override_settings(
+            PROFILER_DIR=temporary.name, PROFILER_TOKEN='secret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_profile(self):
+        """Test profiling a request and downloading the profile."""
+        self.authenticate()
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        response = self.client.get(
+            reverse('api:v1:course-list'), HTTP_X_PROFILE='wrong')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+
+        response = self.client.get(
+            reverse('api:v1:course-list'), HTTP_X_PROFILE='secret')
+        self.assertEqual(200, response.status_code)
+        profile_id = response['X-Profile-Id']
+
+        response = self.client.get(reverse('api:v1:profile-list'))
+        self.assertEqual(403, response.status_code)
+
+        self.admin.is_staff = True
+        self.admin.save()
+        response = self.client.get(reverse('api:v1:profile-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()))
+        self.assertEqual(profile_id, response.json()[0]['id'])
+        self.assertEqual('CourseViewSet', response.json()[0]['view'])
+        self.assertNotIn('samples', response.json()[0])
+
+        response = self.client.get(
+            reverse('api:v1:profile-detail', kwargs={'pk': profile_id}))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('sampled', response.json()['profiles'][0]['type'])
+
+        response = self.client.get(
+            reverse('api:v1:profile-collapsed', kwargs={'pk': profile_id}))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/plain; charset=utf-8', response['Content-Type'])
+
+        response = self.client.get(
+            reverse('api:v1:profile-detail', kwargs={'pk': '0' * 32}))
+        self.assertEqual(404, response.status_code)
+
+    @override_settings(PROFILER_SAMPLE_RATES={'CourseViewSet': 1})
+    def test_sample_rate(self):
+        """Test profiling a sample of the requests to a view."""
+        self.authenticate()
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertTrue(response.has_header('X-Profile-Id'))
+        response = self.client.get(reverse('api:v1:lesson-list'))
+        self.assertFalse(response.has_header('X-Profile-Id'))
+
+    @override_settings(PROFILER_MAX_ACTIVE=0)
+    def test_too_many_active(self):
+        """Test requests are not profiled when too many already are."""
+        self.authenticate()
+        response = self.client.get(
+            reverse('api:v1:lesson-list'), HTTP_X_PROFILE='secret')
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(response.has_header('X-Profile-Id'))
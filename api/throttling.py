@@ -0,0 +1,203 @@
+"""API throttling."""
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from rovercode_web.metrics import REGISTRY
+from rovercode_web.metrics import THROTTLES
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds to keep to the local buckets after Redis could not be reached
+REDIS_RETRY_INTERVAL = 10
+
+# Most local buckets kept before the full ones are dropped
+LOCAL_BUCKETS_MAX = 10000
+
+# Take a token from the bucket at KEYS[1], refilled at ARGV[1] tokens a
+# second up to ARGV[2] tokens, at the time ARGV[3]. Returns whether a token
+# was taken and, if not, the seconds until there is one. The bucket expires
+# once it would be full again.
+TOKEN_BUCKET_SCRIPT = '''
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'updated', now)
+local refill = math.ceil((capacity - tokens) / rate * 1000)
+redis.call('PEXPIRE', KEYS[1], math.max(1, refill))
+return {allowed, tostring(wait)}
+'''
+
+# Redis connection and registered script, once Redis is known to be there
+_redis = {}
+
+# When Redis last could not be reached
+_redis_failed = None
+
+
+def _get_script():
+    """Get the token bucket script, or None if the cache is not Redis."""
+    if 'script' not in _redis:
+        try:
+            connection = get_redis_connection('default')
+        except NotImplementedError:
+            # Not a django-redis cache, e.g. in development
+            connection = None
+        _redis['script'] = (
+            connection and connection.register_script(TOKEN_BUCKET_SCRIPT))
+    return _redis['script']
+
+
+def _take_from_redis(key, rate, capacity):
+    """Take a token from a bucket in Redis, or return None if unreachable."""
+    global _redis_failed  # pylint: disable=global-statement
+    script = _get_script()
+    if script is None:
+        return None
+    if (_redis_failed is not None and
+            time.monotonic() - _redis_failed < REDIS_RETRY_INTERVAL):
+        return None
+
+    try:
+        # Prefixed and versioned as the cache's own keys are
+        allowed, wait = script(
+            keys=[cache.make_key(key)], args=[rate, capacity, time.time()])
+    except RedisError:
+        LOGGER.exception('Could not reach Redis, throttling locally')
+        _redis_failed = time.monotonic()
+        return None
+    _redis_failed = None
+    return bool(allowed), float(wait)
+
+
+class LocalBuckets:
+    """
+    Token buckets in this process, for when Redis cannot be reached.
+
+    Each process allows the full rate, so the limits are looser than with
+    Redis, but a flood from one client is still held back.
+    """
+
+    def __init__(self):
+        """Start with no buckets."""
+        self._lock = threading.Lock()
+        # Key: (tokens, when they were counted, rate, capacity)
+        self._buckets = {}
+
+    def _prune(self, now):
+        """Drop the buckets that have filled up again."""
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[2] < bucket[3]
+        }
+
+    def take(self, key, rate, capacity):
+        """Take a token, returning whether there was one and the wait."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) >= LOCAL_BUCKETS_MAX:
+                self._prune(now)
+            tokens, updated, _, _ = self._buckets.get(
+                key, (capacity, now, rate, capacity))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, rate, capacity)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        """Drop all the buckets."""
+        with self._lock:
+            self._buckets.clear()
+
+
+LOCAL_BUCKETS = LocalBuckets()
+
+
+def take(key, rate, capacity):
+    """
+    Take a token from a bucket, kept in Redis if it can be reached.
+
+    Returns whether there was one, the seconds until there is one and where
+    the bucket was kept.
+    """
+    result = _take_from_redis(key, rate, capacity)
+    if result is not None:
+        return result + ('redis', )
+    return LOCAL_BUCKETS.take(key, rate, capacity) + ('local', )
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Throttle the view's actions by token buckets, one for each user.
+
+    The view names the scope of each action it throttles in
+    `throttle_scopes`, and DEFAULT_THROTTLE_RATES gives each scope a rate
+    of "<requests>/<period>". Up to that many requests may be made at
+    once, and the bucket then refills at that rate. Throttled requests get
+    a Retry-After header for when the next token is due.
+    """
+
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        """Wait for the view to know the scope."""
+        self.retry_after = None
+
+    def get_rate(self):
+        """Get the scope's rate, as settings are now."""
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(
+                f'No default throttle rate set for {self.scope!r} scope')
+
+    def get_cache_key(self, request, view):
+        """Get the key of the user's bucket for the scope."""
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        """Take a token for the request, if the action is throttled."""
+        self.scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None))
+        if self.scope is None:
+            return True
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        allowed, self.retry_after, store = take(
+            self.get_cache_key(request, view),
+            self.num_requests / self.duration, self.num_requests)
+        REGISTRY.inc(THROTTLES, (
+            self.scope, 'allowed' if allowed else 'throttled', store))
+        return allowed
+
+    def wait(self):
+        """Get the seconds until the request would be allowed."""
+        return self.retry_after
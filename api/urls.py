@@ -19,6 +19,7 @@ router.register(
     r'block-diagrams', views.BlockDiagramViewSet, basename='blockdiagram')
 router.register(r'courses', views.CourseViewSet)
 router.register(r'lessons', views.LessonViewSet)
+router.register(r'profiles', views.ProfileViewSet, basename='profile')
 router.register(r'tags', views.TagViewSet)
 router.register(r'users', views.UserViewSet)
 
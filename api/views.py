@@ -5,30 +5,58 @@ import logging
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import BooleanField
+from django.db.models import Case
+from django.db.models import Prefetch
 from django.db.models import Q
+from django.db.models import Value
+from django.db.models import When
+from django.http import HttpResponse
 from django.http import HttpResponseForbidden
 from django.http import JsonResponse
 from django.template import loader
+from django.utils.cache import get_conditional_response
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, serializers, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from zenpy import Zenpy
 from zenpy.lib.api_objects import Ticket
 from zenpy.lib.api_objects import User as ZendeskUser
 
+from api.mixins import CatalogCacheMixin
+from api.mixins import ProfilingMixin
+from api.mixins import ReplicaReadMixin
+from api.mixins import SafeMethodsNonAtomicMixin
+from api.throttling import TokenBucketThrottle
+from curriculum.cache import get_stats as get_catalog_cache_stats
 from curriculum.models import Course
 from curriculum.models import Lesson
 from curriculum.models import ProgressState
 from curriculum.models import State
 from curriculum.serializers import CourseSerializer
 from curriculum.serializers import LessonSerializer
+from mission_control import autosave
+from mission_control import live
+from mission_control.autocomplete import get_tag_index
+from mission_control.autocomplete import TAGS_USAGE_VERSION_KEY
+from mission_control.autocomplete import TAGS_VERSION_KEY
 from mission_control.filters import BlockDiagramFilter
+from mission_control.filters import BlockDiagramSearchFilter
 from mission_control.models import BlockDiagram
+from mission_control.models import BlockDiagramBlogQuestion
 from mission_control.models import Tag
 from mission_control.serializers import BlockDiagramSerializer
 from mission_control.serializers import TagSerializer
 from mission_control.serializers import UserGuideSerializer
+from rovercode_web.cache import get_version
+from rovercode_web.compression import cache_compressed
+from rovercode_web import db
+from rovercode_web import profiling
+from rovercode_web.metrics import timing
 
 User = get_user_model()
 
@@ -37,10 +65,12 @@ ZENDESK = Zenpy(**{
     'email': settings.ZENDESK_EMAIL,
     'token': settings.ZENDESK_TOKEN,
     'subdomain': settings.ZENDESK_SUBDOMAIN,
+    'timeout': settings.EXTERNAL_SERVICE_TIMEOUT,
 })
 
 
-class BlockDiagramViewSet(viewsets.ModelViewSet):
+class BlockDiagramViewSet(ProfilingMixin, ReplicaReadMixin,
+                          SafeMethodsNonAtomicMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows block diagrams to be viewed or edited.
 
@@ -61,14 +91,51 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
 
     update:
         Update a block diagram.
+
+    batch:
+        Return the block diagrams with the comma-separated `ids`, at most
+        `batch_limit`, in that order. Ids that do not exist are listed in
+        `missing` and those above the user's tier in `forbidden`.
     """
 
     serializer_class = BlockDiagramSerializer
     permission_classes = (permissions.IsAuthenticated, )
+    filter_backends = (
+        DjangoFilterBackend, OrderingFilter, BlockDiagramSearchFilter)
     filterset_class = BlockDiagramFilter
-    ordering_fields = ('user', 'name')
+    ordering_fields = (
+        'user',
+        'name',
+        'block_count',
+        'block_type_count',
+        'max_depth',
+        'content_size',
+    )
     ordering = ('name',)
     search_fields = ('name', 'user__username')
+    # The most queries each action may make, see rovercode_web.query_budget.
+    # Creating and updating also cost a few queries per owner tag.
+    query_budgets = {
+        'list': 7,
+        'retrieve': 4,
+        'create': 26,
+        'update': 20,
+        'partial_update': 20,
+        'destroy': 8,
+        'remix': 13,
+        'report': 7,
+        'batch': 4,
+    }
+    throttle_classes = (TokenBucketThrottle, )
+    # The throttle scope of each action, see api.throttling
+    throttle_scopes = {
+        'create': 'autosave',
+        'update': 'autosave',
+        'partial_update': 'autosave',
+        'remix': 'remix',
+        'report': 'report',
+    }
+    batch_limit = 50
 
     @staticmethod
     def _find_unique_name(name, user):
@@ -95,25 +162,64 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
 
         return False
 
+    @staticmethod
+    def _with_related(bds):
+        """Fetch what the serializer needs together, not for each one."""
+        return bds.select_related(
+            'user', 'state', 'reference_of',
+        ).prefetch_related(
+            'admin_tags',
+            'owner_tags',
+            Prefetch(
+                'blog_questions',
+                queryset=BlockDiagramBlogQuestion.objects.select_related(
+                    'blog_question', 'blog_answer')),
+        )
+
+    @staticmethod
+    def _readable(claims):
+        """Get the condition of the block diagrams the user's tier can read."""
+        return (
+            Q(reference_of__tier__lte=claims.get('tier', 1)) |
+            Q(reference_of=None)
+        )
+
+    @staticmethod
+    def _is_autosave(request):
+        """Determine if the request is an editor autosave of the content."""
+        requested = request.query_params.get('autosave', '').lower()
+        return requested in ('1', 'true') and list(request.data) == ['content']
+
+    def get_object(self):
+        """Get the block diagram, with its newest autosaved content."""
+        bd = super().get_object()
+        autosave.overlay([bd])
+        return bd
+
+    def paginate_queryset(self, queryset):
+        """Get the page, with the newest autosaved content."""
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            autosave.overlay(page)
+        return page
+
     def get_queryset(self):
         """Return the objects available for the operation."""
         if self.action in ['update', 'partial_update', 'destroy']:
             return BlockDiagram.objects.filter(user=self.request.user)
+
+        bds = self._with_related(BlockDiagram.objects.all())
         if self.action == 'list':
             support = User.objects.get(email=settings.SUPPORT_CONTACT)
 
-            bds = BlockDiagram.objects.filter(reference_of=None)
+            bds = bds.filter(reference_of=None)
 
             if self.request.user == support:
                 return bds
 
             return bds.exclude(user=support)
 
-        claims = self.request.auth
-        return BlockDiagram.objects.filter(
-            Q(reference_of__tier__lte=claims.get('tier', 1)) |
-            Q(reference_of=None)
-        )
+        return bds.filter(self._readable(self.request.auth))
 
     def perform_create(self, serializer):
         """Perform the create operation."""
@@ -125,6 +231,65 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
         user = self.request.user
         serializer.save(user=user)
 
+    def perform_update(self, serializer):
+        """Save the block diagram, including any autosaved content."""
+        super().perform_update(serializer)
+        bd = serializer.instance
+        if bd.autosave_version is not None:
+            autosave.mark_flushed(bd.pk, bd.autosave_version)
+        if 'content' in serializer.validated_data:
+            live.notify(bd)
+
+    def partial_update(self, request, *args, **kwargs):
+        """
+        Update the block diagram.
+
+        With ?autosave=true, requests changing only the content are buffered
+        and written to the database later, see mission_control.autosave.
+        """
+        if not self._is_autosave(request):
+            return super().partial_update(request, *args, **kwargs)
+
+        bd = self.get_object()
+        serializer = self.get_serializer(bd, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        autosave.buffer(bd, serializer.validated_data['content'])
+        live.notify(bd)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['GET'])
+    def batch(self, request):
+        """Retrieve several block diagrams at once."""
+        requested = request.query_params.get('ids', '').split(',')
+        try:
+            ids = [int(pk) for pk in requested if pk.strip()]
+        except ValueError:
+            raise serializers.ValidationError(
+                {'ids': 'Must be numbers separated by commas'})
+        ids = list(dict.fromkeys(ids))
+        if not 0 < len(ids) <= self.batch_limit:
+            raise serializers.ValidationError(
+                {'ids': f'Must be 1 to {self.batch_limit} ids'})
+
+        # One query tells the readable block diagrams from the forbidden
+        bds = self._with_related(BlockDiagram.objects.filter(
+            pk__in=ids)).annotate(readable=Case(
+                When(self._readable(request.auth), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ))
+        found = {bd.pk: bd for bd in bds}
+        readable = [
+            found[pk] for pk in ids if pk in found and found[pk].readable]
+        autosave.overlay(readable)
+
+        return Response({
+            'results': self.get_serializer(readable, many=True).data,
+            'missing': [pk for pk in ids if pk not in found],
+            'forbidden': [
+                pk for pk in ids if pk in found and not found[pk].readable],
+        })
+
     @staticmethod
     @action(detail=True, methods=['POST'])
     def remix(request, **kwargs):
@@ -134,10 +299,13 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
                 'You are over the limit of programs allowed.',
             )
 
-        bd = get_object_or_404(BlockDiagram, pk=kwargs.get('pk'))
+        bd = get_object_or_404(
+            BlockDiagram.objects.select_related('reference_of'),
+            pk=kwargs.get('pk'))
+        autosave.overlay([bd])
 
         user = request.user
-        if bd.user == user:
+        if bd.user_id == user.pk:
             raise serializers.ValidationError(
                 'You are not allowed to remix your own program.',
             )
@@ -150,7 +318,7 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
             # Source is not a lesson reference
             pass
 
-        blog_questions = bd.blog_questions.all()
+        blog_questions = list(bd.blog_questions.all())
 
         bd.pk = None
         bd.user = user
@@ -162,7 +330,7 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
         for q in blog_questions:
             q.pk = None
             q.block_diagram = bd
-            q.save()
+        BlockDiagramBlogQuestion.objects.bulk_create(blog_questions)
 
         SUMO_LOGGER.info(json.dumps({
             'event': 'remix',
@@ -171,6 +339,8 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
             'newProgramId': bd.id,
         }))
 
+        bd = BlockDiagramViewSet._with_related(
+            BlockDiagram.objects.filter(pk=bd.pk)).get()
         return Response(
             BlockDiagramSerializer(bd).data, status.HTTP_200_OK)
 
@@ -179,6 +349,7 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
     def report(request, **kwargs):
         """Report issues with block diagram."""
         bd = get_object_or_404(BlockDiagram, pk=kwargs.get('pk'))
+        autosave.overlay([bd])
         description = request.data.get('description')
 
         user = request.user
@@ -202,15 +373,17 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
             'description': description,
         })
 
-        ZENDESK.tickets.create(
-            Ticket(
-                subject='Program Issue Reported',
-                description=body,
-                type='problem',
-                tags=['program'],
-                requester=ZendeskUser(name=user.username, email=user.email),
+        with timing('http'):
+            ZENDESK.tickets.create(
+                Ticket(
+                    subject='Program Issue Reported',
+                    description=body,
+                    type='problem',
+                    tags=['program'],
+                    requester=ZendeskUser(
+                        name=user.username, email=user.email),
+                )
             )
-        )
 
         SUMO_LOGGER.info(json.dumps({
             'event': 'report',
@@ -222,7 +395,8 @@ class BlockDiagramViewSet(viewsets.ModelViewSet):
         return Response(status.HTTP_200_OK)
 
 
-class UserViewSet(mixins.UpdateModelMixin, viewsets.GenericViewSet):
+class UserViewSet(ReplicaReadMixin, SafeMethodsNonAtomicMixin,
+                  mixins.UpdateModelMixin, viewsets.GenericViewSet):
     """
     API endpoint that allows user to be modified.
 
@@ -237,6 +411,7 @@ class UserViewSet(mixins.UpdateModelMixin, viewsets.GenericViewSet):
     serializer_class = UserGuideSerializer
     permission_classes = (permissions.IsAuthenticated, )
     filter_backends = []
+    query_budgets = {'update': 4, 'partial_update': 4, 'stats': 2}
 
     def perform_update(self, serializer):
         """Perform the update operation."""
@@ -262,7 +437,8 @@ class UserViewSet(mixins.UpdateModelMixin, viewsets.GenericViewSet):
         return JsonResponse(stats)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, SafeMethodsNonAtomicMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows tags to be viewed.
 
@@ -271,18 +447,53 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
 
     list:
         Return all tags.
+
+    autocomplete:
+        Return the most used tags starting with `q`, at most `limit`.
     """
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.IsAuthenticated, )
-    ordering_fields = ('name',)
+    ordering_fields = ('name', 'admin_count', 'owner_count', 'usage_count')
     ordering = ('name',)
     search_fields = ('name',)
     pagination_class = None
+    autocomplete_limit = 10
+    query_budgets = {'list': 1, 'retrieve': 1, 'autocomplete': 1}
+
+    def list(self, request, *args, **kwargs):
+        """List the tags, or confirm the client's copy is still current."""
+        etag = '"{}-{}"'.format(
+            get_version(TAGS_VERSION_KEY), get_version(TAGS_USAGE_VERSION_KEY))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            # Clients keep the body under the ETag, so read the tags at
+            # least as new as the versions in it
+            with db.primary_reads():
+                response = cache_compressed(
+                    super().list(request, *args, **kwargs))
+        response['ETag'] = etag
+        return response
+
+    @action(detail=False, methods=['GET'])
+    def autocomplete(self, request):
+        """Complete a tag name from the in-memory prefix index."""
+        try:
+            limit = int(request.query_params.get(
+                'limit', self.autocomplete_limit))
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'Must be a number'})
+        limit = max(0, limit)
+
+        names = get_tag_index().search(
+            request.query_params.get('q', ''), limit)
+        return Response([{'name': name} for name in names])
 
 
-class CourseViewSet(viewsets.ReadOnlyModelViewSet):
+class CourseViewSet(ProfilingMixin, ReplicaReadMixin,
+                    SafeMethodsNonAtomicMixin, CatalogCacheMixin,
+                    viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows courses to be viewed.
 
@@ -291,17 +502,34 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
 
     list:
         Return all courses.
+
+    cache_stats:
+        Return the catalog cache hit and miss counters.
     """
 
-    queryset = Course.objects.all()
+    queryset = Course.objects.prefetch_related(Prefetch(
+        'lessons',
+        queryset=Lesson.objects.select_related('reference').order_by(
+            'sequence_number', 'pk'),
+    ))
     serializer_class = CourseSerializer
     permission_classes = (permissions.IsAuthenticated, )
     ordering_fields = ('name',)
     ordering = ('name',)
     search_fields = ('name',)
+    query_budgets = {'list': 4, 'retrieve': 4, 'cache_stats': 1}
+
+    @staticmethod
+    @action(detail=False, methods=['GET'], url_path='cache-stats',
+            permission_classes=[permissions.IsAdminUser])
+    def cache_stats(request):
+        """Get the catalog cache counters."""
+        return Response(get_catalog_cache_stats())
 
 
-class LessonViewSet(viewsets.ReadOnlyModelViewSet):
+class LessonViewSet(ProfilingMixin, ReplicaReadMixin,
+                    SafeMethodsNonAtomicMixin, CatalogCacheMixin,
+                    viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows lessons to be viewed.
 
@@ -312,9 +540,54 @@ class LessonViewSet(viewsets.ReadOnlyModelViewSet):
         Return all lessons.
     """
 
-    queryset = Lesson.objects.all()
+    queryset = Lesson.objects.select_related('course', 'reference')
     serializer_class = LessonSerializer
     permission_classes = (permissions.IsAuthenticated, )
     ordering_fields = ('reference', 'course')
     ordering = ('reference',)
     search_fields = ('reference__name', 'course__name')
+    query_budgets = {'list': 3, 'retrieve': 3}
+
+
+class ProfileViewSet(ReplicaReadMixin, SafeMethodsNonAtomicMixin,
+                     viewsets.ViewSet):
+    """
+    API endpoint that allows request profiles to be downloaded.
+
+    list:
+        Return the stored profiles, newest first, without their samples.
+
+    retrieve:
+        Return a profile in the speedscope format.
+
+    collapsed:
+        Return a profile as collapsed stacks, for flamegraph.pl.
+    """
+
+    permission_classes = (permissions.IsAdminUser, )
+    lookup_value_regex = '[0-9a-f]{32}'
+    query_budgets = {'list': 1, 'retrieve': 1, 'collapsed': 1}
+
+    @staticmethod
+    def list(request):
+        """List the profiles."""
+        return Response(profiling.list_profiles())
+
+    @staticmethod
+    def _get_profile(pk):
+        """Get a profile or raise a 404."""
+        data = profiling.get_profile(pk)
+        if data is None:
+            raise NotFound
+        return data
+
+    def retrieve(self, request, pk=None):
+        """Get a profile as speedscope JSON."""
+        return Response(profiling.to_speedscope(self._get_profile(pk)))
+
+    @action(detail=True, methods=['GET'])
+    def collapsed(self, request, pk=None):
+        """Get a profile as collapsed stacks."""
+        return HttpResponse(
+            profiling.to_collapsed(self._get_profile(pk)),
+            content_type='text/plain; charset=utf-8')
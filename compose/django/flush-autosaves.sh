@@ -0,0 +1,15 @@
+#!/bin/sh
+# Usage: flush-autosaves.sh
+#
+# Writes the autosaves buffered in Redis to the database (see
+# mission_control.autosave). It runs as its own service, so one loop runs
+# however many django containers there are, and is restarted if it dies.
+# flush_autosaves also holds a lock while flushing, so a second copy only
+# skips its turn.
+
+# Write any autosaves a previous run left in Redis, then keep writing those
+# that are due
+python /app/manage.py flush_autosaves --all
+while sleep "${AUTOSAVE_FLUSH_INTERVAL:-60}"; do
+    python /app/manage.py flush_autosaves
+done
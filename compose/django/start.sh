@@ -1,6 +1,26 @@
 #!/bin/sh
 # Usage: start.sh <port number>
+#
+# Workers are sized and configured in config/gunicorn.py.
+#
+# GUNICORN_WORKER_CLASS=gevent serves many requests per worker, so requests
+# waiting on the database or an external service do not pin a worker. Each
+# greenlet gets its own database connection, so persistent connections are
+# turned off unless DATABASE_CONN_MAX_AGE is set explicitly. gthread, with
+# GUNICORN_THREADS, does the same with threads where gevent is unavailable.
+
+GUNICORN_WORKER_CLASS=${GUNICORN_WORKER_CLASS:-sync}
+export GUNICORN_WORKER_CLASS
+if [ "$GUNICORN_WORKER_CLASS" = "gevent" ]; then
+    DATABASE_CONN_MAX_AGE=${DATABASE_CONN_MAX_AGE:-0}
+    export DATABASE_CONN_MAX_AGE
+fi
 
 python /app/manage.py migrate
 python /app/manage.py collectstatic --noinput
-/usr/local/bin/gunicorn config.wsgi -w 4 -b 0.0.0.0:$1 --chdir=/app
+
+# Autosaves are written by the autosave-flusher service, see
+# compose/django/flush-autosaves.sh
+
+/usr/local/bin/gunicorn config.wsgi -c /app/config/gunicorn.py \
+    -b 0.0.0.0:$1 --chdir=/app
@@ -0,0 +1,32 @@
+"""
+ASGI config for Rovercode Web project.
+
+This module contains the ASGI application used by Channels and by ASGI
+servers such as daphne or uvicorn. It should expose a module-level variable
+named ``application``, which the ``ASGI_APPLICATION`` setting points to.
+
+Requests are handed to Django in a thread pool, so a request waiting on the
+database or an external service does not hold up the event loop.
+
+Websockets at /ws/block-diagrams/<id>/?token=<JWT> follow and edit block
+diagrams live, see mission_control.consumers.
+
+"""
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+django.setup()
+
+from channels.http import AsgiHandler  # noqa
+from channels.routing import ProtocolTypeRouter  # noqa
+from channels.routing import URLRouter  # noqa
+
+from mission_control.routing import websocket_urlpatterns  # noqa
+from rovercode_web.users.middleware import JWTAuthMiddleware  # noqa
+
+application = ProtocolTypeRouter({
+    'http': AsgiHandler,
+    'websocket': JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+})
@@ -0,0 +1,198 @@
+"""
+Gunicorn config for Rovercode Web project.
+
+Used by compose/django/start.sh with ``gunicorn -c config/gunicorn.py``.
+Unless set in the environment, the number of workers and threads is sized
+from the CPUs and memory available to the container:
+
+- GUNICORN_WORKER_CLASS: sync (default), gthread or gevent
+- GUNICORN_WORKERS: 2 x CPUs + 1 (CPUs + 1 for gevent), capped so that the
+  workers fit in the available memory
+- GUNICORN_WORKER_MEMORY_MB: the memory to budget for each worker (150)
+- GUNICORN_THREADS: 4 for gthread, otherwise 1
+- GUNICORN_WORKER_CONNECTIONS: greenlets per gevent worker (100)
+- GUNICORN_PRELOAD: import the application once in the master, so workers
+  share the imported modules copy-on-write. On by default, except for
+  gevent, which has to patch the standard library before it is imported.
+- GUNICORN_MAX_REQUESTS, GUNICORN_MAX_REQUESTS_JITTER: recycle each worker
+  after 1000 to 1100 requests, so slow leaks and fragmentation cannot build
+  up, without all the workers restarting at once
+
+Each worker logs its memory use when it starts and when it exits. The
+request metrics in METRICS_DIR are cleared when gunicorn starts.
+
+"""
+import gc
+import glob
+import math
+import os
+import sys
+
+MIB = 1024 * 1024
+
+# Memory the master, with the preloaded application, needs of its own
+MASTER_MEMORY = 100 * MIB
+
+
+def _read(path):
+    """Read a small file, or None if it is not there."""
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_count():
+    """Count the CPUs available, including any container CPU quota."""
+    if hasattr(os, 'sched_getaffinity'):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count() or 1
+
+    # cgroup v2, then v1
+    quota = _read('/sys/fs/cgroup/cpu.max')
+    if quota:
+        quota, period = quota.split()
+    else:
+        quota = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        period = _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota and period and quota not in ('max', '-1'):
+        count = min(count, math.ceil(int(quota) / int(period)))
+
+    return max(1, count)
+
+
+def available_memory():
+    """Find the bytes of memory available, including any container limit."""
+    available = None
+    for line in (_read('/proc/meminfo') or '').splitlines():
+        if line.startswith('MemAvailable:'):
+            available = int(line.split()[1]) * 1024
+
+    # cgroup v2, then v1. An unlimited v1 group reports a huge number.
+    limit = (_read('/sys/fs/cgroup/memory.max') or
+             _read('/sys/fs/cgroup/memory/memory.limit_in_bytes'))
+    if limit and limit != 'max':
+        usage = (_read('/sys/fs/cgroup/memory.current') or
+                 _read('/sys/fs/cgroup/memory/memory.usage_in_bytes') or 0)
+        container = int(limit) - int(usage)
+        available = container if available is None else min(
+            available, container)
+
+    return available
+
+
+def worker_count(worker_class, cpus, memory, worker_memory):
+    """Size the workers for the CPUs, within the memory."""
+    if worker_class == 'gevent':
+        count = cpus + 1
+    else:
+        count = 2 * cpus + 1
+
+    if memory is not None:
+        count = min(count, (memory - MASTER_MEMORY) // worker_memory)
+
+    return max(1, count)
+
+
+def memory_usage(pid='self'):
+    """
+    Measure the memory of a process, in bytes.
+
+    rss counts every page the process has mapped, pss splits shared pages
+    between the processes sharing them, and uss counts the pages only this
+    process has (what killing it would free).
+    """
+    usage = {}
+    for line in (_read(f'/proc/{pid}/smaps_rollup') or '').splitlines():
+        name, _, value = line.partition(':')
+        if name in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+            usage[name] = int(value.split()[0]) * 1024
+
+    if not usage:
+        # Kernels before 4.14 only report the resident set
+        for line in (_read(f'/proc/{pid}/status') or '').splitlines():
+            if line.startswith('VmRSS:'):
+                return {'rss': int(line.split()[1]) * 1024}
+        return {}
+
+    return {
+        'rss': usage['Rss'],
+        'pss': usage['Pss'],
+        'uss': usage['Private_Clean'] + usage['Private_Dirty'],
+    }
+
+
+def format_memory(usage):
+    """Format memory usage in MiB."""
+    return ' '.join(
+        f'{name}={value / MIB:.1f}MiB' for name, value in usage.items())
+
+
+def _env_int(name, default):
+    """Read an integer from the environment."""
+    return int(os.environ.get(name) or default)
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'sync'
+workers = _env_int('GUNICORN_WORKERS', worker_count(
+    worker_class, cpu_count(), available_memory(),
+    _env_int('GUNICORN_WORKER_MEMORY_MB', 150) * MIB))
+threads = _env_int(
+    'GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1)
+worker_connections = _env_int('GUNICORN_WORKER_CONNECTIONS', 100)
+preload_app = os.environ.get(
+    'GUNICORN_PRELOAD', str(worker_class != 'gevent')).lower() in (
+        '1', 'true', 'yes', 'on')
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int(
+    'GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+
+def on_starting(server):
+    """Start the request metrics from zero."""
+    directory = os.environ.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)
+
+
+def when_ready(server):
+    """Get the preloaded master ready to fork the workers."""
+    if 'django.db' in sys.modules:
+        # Import the views up front too, rather than in every worker
+        from django.urls import get_resolver
+        get_resolver().url_patterns  # pylint: disable=expression-not-assigned
+
+        # Workers must not share a database connection made while loading
+        from django.db import connections
+        connections.close_all()
+
+    # Keep the objects loaded so far out of garbage collection, which would
+    # otherwise write to (and so copy) every shared page they are on
+    gc.freeze()
+
+    server.log.info(
+        'Master %s ready, %s %s workers x %s threads, preload=%s: %s',
+        os.getpid(), server.cfg.workers, server.cfg.worker_class_str,
+        server.cfg.threads, server.cfg.preload_app,
+        format_memory(memory_usage()))
+
+
+def post_worker_init(worker):
+    """Log the memory of a new worker."""
+    worker.log.info(
+        'Worker %s started: %s', worker.pid, format_memory(memory_usage()))
+
+
+def worker_exit(server, worker):
+    """Log the memory of a worker as it exits, e.g. when it is recycled."""
+    if 'rovercode_web.metrics' in sys.modules:
+        # Keep the requests since the last flush
+        sys.modules['rovercode_web.metrics'].flush()
+
+    server.log.info(
+        'Worker %s exiting after %s requests: %s', worker.pid, worker.nr,
+        format_memory(memory_usage()))
@@ -10,6 +10,8 @@ https://docs.djangoproject.com/en/dev/ref/settings/
 """
 from __future__ import absolute_import, unicode_literals
 import datetime
+import os
+import tempfile
 
 import environ
 from urllib.parse import urlparse
@@ -68,7 +70,10 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 # MIDDLEWARE CONFIGURATION
 # ------------------------------------------------------------------------------
 MIDDLEWARE = (
+    'rovercode_web.metrics.PerformanceMiddleware',
+    'rovercode_web.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'rovercode_web.db.ConnectionHealthCheckMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -118,10 +123,37 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default='postgres:///rovercode_web'),
 }
 DATABASES['default']['ATOMIC_REQUESTS'] = True
+# Seconds to keep a database connection open for reuse by later requests,
+# 0 to close it after every request
+DATABASE_CONN_MAX_AGE = env.int('DATABASE_CONN_MAX_AGE', default=60)
+DATABASES['default']['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+# Seconds a kept connection can sit idle before it is checked before reuse
+DATABASE_CONN_HEALTH_CHECK_IDLE = env.int(
+    'DATABASE_CONN_HEALTH_CHECK_IDLE', default=30)
 
 if env.bool('POSTGRES_USE_AWS_SSL', False):
     DATABASES['default']['OPTIONS'] = {'sslrootcert': 'rds-ca-2015-root.crt', 'sslmode': 'require'}
 
+# Read replicas, as a comma separated list of database URLs. Safe API
+# requests read from them (see rovercode_web.db.ReplicaRouter).
+DATABASE_REPLICAS = []
+REPLICA_URLS = env.list('DATABASE_REPLICA_URLS', default=[])
+for number, url in enumerate(filter(None, REPLICA_URLS)):
+    alias = f'replica{number + 1}'
+    DATABASES[alias] = env.db_url_config(url)
+    DATABASES[alias]['OPTIONS'] = DATABASES['default'].get('OPTIONS', {})
+    DATABASES[alias]['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['rovercode_web.db.ReplicaRouter']
+# Seconds a user keeps reading from the primary after writing, so they see
+# their own changes
+DATABASE_REPLICA_STICKY_SECONDS = env.int(
+    'DATABASE_REPLICA_STICKY_SECONDS', default=10)
+# Replicas lagging more seconds than this are not read from
+DATABASE_REPLICA_MAX_LAG = env.float('DATABASE_REPLICA_MAX_LAG', default=5)
+
 
 # GENERAL CONFIGURATION
 # ------------------------------------------------------------------------------
@@ -221,6 +253,17 @@ redis_url = urlparse(env('REDIS_URL', default='redis://redis:6379'))
 REDIS_HOST = redis_url.hostname
 REDIS_PORT = redis_url.port
 
+# Live editing sessions on every ASGI worker follow a block diagram through
+# a group in Redis, see mission_control.live
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [(REDIS_HOST, REDIS_PORT)],
+        },
+    },
+}
+
 # PASSWORD VALIDATION
 # https://docs.djangoproject.com/en/dev/ref/settings/#auth-password-validators
 # ------------------------------------------------------------------------------
@@ -280,7 +323,7 @@ ADMIN_URL = r'^admin/'
 # ------------------------------------------------------------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rovercode_web.users.authentication.JWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -289,6 +332,22 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'mission_control.pagination.CustomPagination',
     'PAGE_SIZE': 15,
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Requests each user may make at once in the scopes of
+    # api.throttling.TokenBucketThrottle, and the rate they are let back at
+    'DEFAULT_THROTTLE_RATES': {
+        'autosave': env('THROTTLE_RATE_AUTOSAVE', default='60/min'),
+        'remix': env('THROTTLE_RATE_REMIX', default='20/min'),
+        'report': env('THROTTLE_RATE_REPORT', default='10/hour'),
+    },
 }
 
 # SOCIAL ACCOUNT CONFIGURATION
@@ -313,6 +372,46 @@ SUBSCRIPTION_SERVICE_HOST = env('SUBSCRIPTION_SERVICE_HOST', default='http://loc
 ZENDESK_EMAIL = env('ZENDESK_EMAIL', default='support@example.com')
 ZENDESK_TOKEN = env('ZENDESK_TOKEN', default='abcdefg1234567')
 ZENDESK_SUBDOMAIN = env('ZENDESK_SUBDOMAIN', default='domain.zendesk.com')
+# Seconds to wait on the profanity check and subscription services, so a
+# slow service holds up a request (or greenlet) for a bounded time
+EXTERNAL_SERVICE_TIMEOUT = env.float('EXTERNAL_SERVICE_TIMEOUT', default=5)
+
+# METRICS CONFIGURATION
+# ------------------------------------------------------------------------------
+# Bearer token for scraping /metrics/, which is off without one
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+# Directory the server processes share their metrics through, so any one of
+# them can export the totals. Without it each process exports its own.
+METRICS_DIR = env('METRICS_DIR', default='')
+# Seconds between each process storing its metrics in METRICS_DIR
+METRICS_FLUSH_INTERVAL = env.int('METRICS_FLUSH_INTERVAL', default=10)
+# Send the timings of each request in a Server-Timing header
+METRICS_SERVER_TIMING = env.bool('METRICS_SERVER_TIMING', default=True)
+
+# PROFILER CONFIGURATION
+# ------------------------------------------------------------------------------
+# Requests to profiled views are profiled when the X-Profile header holds
+# this token (off when empty)...
+PROFILER_TOKEN = env('PROFILER_TOKEN', default='')
+# ...and at random at these rates, e.g. BlockDiagramViewSet=0.01
+PROFILER_SAMPLE_RATES = env.dict(
+    'PROFILER_SAMPLE_RATES', cast={'value': float}, default={})
+# Seconds between stack samples
+PROFILER_INTERVAL = env.float('PROFILER_INTERVAL', default=0.005)
+# The most requests profiled at once, in each process
+PROFILER_MAX_ACTIVE = env.int('PROFILER_MAX_ACTIVE', default=2)
+# Where the most recent PROFILER_BUFFER_SIZE profiles are kept
+PROFILER_DIR = env(
+    'PROFILER_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'rovercode-profiles'))
+PROFILER_BUFFER_SIZE = env.int('PROFILER_BUFFER_SIZE', default=100)
+
+# QUERY BUDGET CONFIGURATION
+# ------------------------------------------------------------------------------
+# What the query budget middleware, installed in the test and local settings,
+# does when a view makes more queries than its query_budgets allow: 'raise'
+# or 'log'
+QUERY_BUDGET_EXCEEDED = env('QUERY_BUDGET_EXCEEDED', default='log')
 
 # JWT CONFIGURATION
 # ------------------------------------------------------------------------------
@@ -327,6 +426,31 @@ SIMPLE_JWT = {
     ),
 }
 
+# Refresh tokens are revoked in the cache when they are rotated. Each process
+# also remembers those it revoked in a Bloom filter with this capacity and
+# error rate, see rovercode_web.users.revocation.
+REVOKED_TOKENS_CAPACITY = env.int('REVOKED_TOKENS_CAPACITY', default=100000)
+REVOKED_TOKENS_ERROR_RATE = 0.001
+
+# Editor autosaves are buffered in the cache and written to the database
+# once the oldest unwritten one is this many seconds old, see
+# mission_control.autosave. Buffers are kept in the cache for a day.
+AUTOSAVE_FLUSH_INTERVAL = env.int('AUTOSAVE_FLUSH_INTERVAL', default=60)
+AUTOSAVE_BUFFER_TIMEOUT = 24 * 60 * 60
+
+# Responses of these types and at least this many bytes are compressed, see
+# rovercode_web.compression. Compressed catalog and tag responses are kept
+# in the cache for a day.
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', default=1024)
+COMPRESSION_CONTENT_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+COMPRESSION_CACHE_TIMEOUT = 24 * 60 * 60
+
 REST_AUTH_SERIALIZERS = {
     'JWT_TOKEN_CLAIMS_SERIALIZER': 'rovercode_web.users.utils.JwtObtainPairSerializer',
 }
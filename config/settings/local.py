@@ -48,6 +48,9 @@ CACHES = {
 MIDDLEWARE += ('debug_toolbar.middleware.DebugToolbarMiddleware',)
 INSTALLED_APPS += ('debug_toolbar', )
 
+# Warn about views that go over their query budgets
+MIDDLEWARE += ('rovercode_web.query_budget.QueryBudgetMiddleware',)
+
 INTERNAL_IPS = ['127.0.0.1', '10.0.2.2', ]
 # tricks to have debug toolbar when developing with docker
 if os.environ.get('USE_DOCKER') == 'yes':
@@ -135,6 +135,7 @@ TEMPLATES[0]['OPTIONS']['loaders'] = [
 # Use the Heroku-style specification
 # Raises ImproperlyConfigured exception if DATABASE_URL not in os.environ
 DATABASES['default'] = env.db('DATABASE_URL')
+DATABASES['default']['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
 
 # CACHING
 # ------------------------------------------------------------------------------
@@ -19,6 +19,10 @@ TEMPLATES[0]['OPTIONS']['debug'] = False
 # Note: This key only used for development and testing.
 SECRET_KEY = env('DJANGO_SECRET_KEY', default='CHANGEME!!!')
 
+# Hosts allowed when the test settings are served by a real server, e.g. in
+# the benchmark_workers load test
+ALLOWED_HOSTS = env.list('DJANGO_ALLOWED_HOSTS', default=[])
+
 # Mail settings
 # ------------------------------------------------------------------------------
 EMAIL_HOST = 'localhost'
@@ -28,6 +32,16 @@ EMAIL_PORT = 1025
 # for unit testing purposes
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
+# DATABASE CONFIGURATION
+# ------------------------------------------------------------------------------
+# Close connections when done with them, as the websocket consumers' worker
+# threads would otherwise keep theirs open past the end of the tests
+DATABASES['default']['CONN_MAX_AGE'] = 0
+# A replica mirroring the test database, read from when a test overrides
+# DATABASE_REPLICAS
+DATABASES['replica'] = dict(
+    DATABASES['default'], ATOMIC_REQUESTS=False, TEST={'MIRROR': 'default'})
+
 # CACHING
 # ------------------------------------------------------------------------------
 # Speed advantages of in-memory caching without having to run Memcached
@@ -38,10 +52,21 @@ CACHES = {
     }
 }
 
+# Live editing sessions in the test process only
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
 # TESTING
 # ------------------------------------------------------------------------------
 TEST_RUNNER = 'django.test.runner.DiscoverRunner'
 
+# Fail views that go over their query budgets
+MIDDLEWARE += ('rovercode_web.query_budget.QueryBudgetMiddleware',)
+QUERY_BUDGET_EXCEEDED = env('QUERY_BUDGET_EXCEEDED', default='raise')
+
 
 # PASSWORD HASHING
 # ------------------------------------------------------------------------------
@@ -9,6 +9,8 @@ from django.views import defaults as default_views
 
 from rest_framework.documentation import include_docs_urls
 
+from rovercode_web.views import metrics
+
 
 urlpatterns = [
     # User management
@@ -24,6 +26,7 @@ urlpatterns = [
     url(r'^docs/', include_docs_urls(
         title='Rovercode API',
         description='API for the rovercode web service.')),
+    url(r'^metrics/$', metrics, name='metrics'),
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -23,6 +23,12 @@ from django.core.wsgi import get_wsgi_application
 # os.environ["DJANGO_SETTINGS_MODULE"] = "config.settings.production"
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
 
+# gevent workers monkey patch the standard library, but psycopg2 talks to the
+# database in C. Make it cooperate so a query yields to the other greenlets.
+if os.environ.get("GUNICORN_WORKER_CLASS") == "gevent":
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
 # This application object is used by any WSGI server configured to use this
 # file. This includes Django's development server, if the WSGI_APPLICATION
 # setting points here.
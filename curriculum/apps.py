@@ -6,3 +6,7 @@ class CurriculumConfig(AppConfig):
     """Configuration for the Curriculum app."""
 
     name = 'curriculum'
+
+    def ready(self):
+        """Run operations required after app is loaded."""
+        import curriculum.signals.handlers  # noqa
@@ -0,0 +1,106 @@
+"""Curriculum catalog cache."""
+import hashlib
+
+from django.core.cache import cache
+
+from mission_control.models import BlockDiagram
+from rovercode_web import db
+from rovercode_web.cache import get_counts
+from rovercode_web.cache import get_version
+from rovercode_web.cache import invalidate_version
+from .models import Lesson
+from .serializers import StateSerializer
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_HITS_KEY = 'catalog:hits'
+CATALOG_MISSES_KEY = 'catalog:misses'
+# Primary keys of the lessons' reference block diagrams at a catalog version
+REFERENCES_KEY = 'catalog:{}:references'
+CATALOG_TIMEOUT = 24 * 60 * 60
+
+
+def get_catalog_version():
+    """Get the current version of the catalog."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog():
+    """Invalidate the cached catalog."""
+    invalidate_version(CATALOG_VERSION_KEY)
+
+
+def get_reference_pks():
+    """
+    Get the primary keys of the block diagrams lessons reference.
+
+    They are cached under the catalog version, which any change to a lesson
+    moves on, so saving a block diagram can tell if it is a reference
+    without a query.
+    """
+    version = get_catalog_version()
+    key = REFERENCES_KEY.format(version)
+    pks = cache.get(key) if version is not None else None
+    if pks is None:
+        # Cached under the version, so read at least as new as it
+        with db.primary_reads():
+            pks = set(Lesson.objects.exclude(reference=None).values_list(
+                'reference_id', flat=True))
+        cache.set(key, pks, CATALOG_TIMEOUT)
+    return pks
+
+
+def get_catalog_key(version, request):
+    """Get the cache key for the shared catalog response to the request."""
+    url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    return f'catalog:{version}:{url}'
+
+
+def get_stats():
+    """Get the catalog cache counters."""
+    hits, misses = get_counts(CATALOG_HITS_KEY, CATALOG_MISSES_KEY)
+    return {'hits': hits, 'misses': misses}
+
+
+def get_remixes(user):
+    """
+    Get the most recent remix of each lesson by the user.
+
+    Only the fields apply_remixes reads are loaded, not the content.
+    """
+    # Later block diagrams replace earlier ones, like `.last()`
+    return {
+        bd.lesson_id: bd for bd in BlockDiagram.objects.filter(
+            user=user, lesson__isnull=False,
+        ).select_related('state').only(
+            'pk', 'lesson', 'state__progress').order_by('pk')
+    }
+
+
+def _iter_lessons(data):
+    """Find the serialized lessons in a catalog response."""
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_lessons(item)
+    elif isinstance(data, dict):
+        if 'active_bd' in data:
+            yield data
+        for key in ('results', 'lessons'):
+            if key in data:
+                yield from _iter_lessons(data[key])
+
+
+def apply_remixes(data, remixes):
+    """
+    Overlay the user's remixes on a shared catalog response.
+
+    Returns whether the response had any lesson the user remixed.
+    """
+    remixed = False
+    for lesson in _iter_lessons(data):
+        remix = remixes.get(lesson['id'])
+        if remix is not None:
+            remixed = True
+            lesson['active_bd'] = remix.pk
+            lesson['active_bd_owned'] = True
+            lesson['state'] = StateSerializer(remix.state).data
+    return remixed
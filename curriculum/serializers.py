@@ -1,6 +1,9 @@
 """Curriculum serializers."""
 from rest_framework import serializers
 
+from rovercode_web.metrics import TimedSerializerMixin
+from rovercode_web.serializers import FlatListSerializer
+
 from .models import Course
 from .models import Lesson
 from .models import State
@@ -19,7 +22,7 @@ class StateSerializer(serializers.ModelSerializer):
         fields = ('progress', )
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Lesson model serializer."""
 
     course = serializers.StringRelatedField(read_only=True)
@@ -39,9 +42,15 @@ class LessonSerializer(serializers.ModelSerializer):
 
         model = Lesson
         fields = '__all__'
+        list_serializer_class = FlatListSerializer
 
     def _get_remix_bd(self, obj):
         """Get the remix block diagram if it exists."""
+        # The catalog cache serializes the shared part with no remixes
+        remixes = self.context.get('remixes')
+        if remixes is not None:
+            return remixes.get(obj.pk)
+
         user = self.context['request'].user
 
         return obj.block_diagrams.filter(user=user).last()
@@ -67,7 +76,7 @@ class LessonSerializer(serializers.ModelSerializer):
         return StateSerializer(bd.state).data
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Course model serializer."""
 
     lessons = LessonSerializer(read_only=True, many=True)
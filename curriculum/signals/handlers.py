@@ -0,0 +1,32 @@
+"""Curriculum signal handlers."""
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from curriculum.cache import get_reference_pks
+from curriculum.cache import invalidate_catalog
+from curriculum.models import Course
+from curriculum.models import Lesson
+from mission_control.models import BlockDiagram
+
+# The fields of a reference block diagram shown in the catalog
+CATALOG_FIELDS = {'name', 'description'}
+
+
+@receiver(post_save, sender=Course, dispatch_uid='course_saved')
+@receiver(post_delete, sender=Course, dispatch_uid='course_deleted')
+@receiver(post_save, sender=Lesson, dispatch_uid='lesson_saved')
+@receiver(post_delete, sender=Lesson, dispatch_uid='lesson_deleted')
+def invalidate_catalog_changed(sender, **kwargs):
+    """Invalidate the catalog when a course or lesson changes."""
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=BlockDiagram, dispatch_uid='reference_saved')
+def invalidate_catalog_reference(sender, instance, update_fields=None,
+                                 **kwargs):
+    """Invalidate the catalog when a lesson's reference changes."""
+    if update_fields is not None and not CATALOG_FIELDS & set(update_fields):
+        return
+    if instance.pk in get_reference_pks():
+        invalidate_catalog()
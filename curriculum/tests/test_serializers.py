@@ -0,0 +1,73 @@
+"""Curriculum test serializers."""
+from unittest.mock import patch
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from test_plus.test import TestCase
+
+from curriculum.cache import apply_remixes
+from curriculum.cache import get_remixes
+from curriculum.models import Course
+from curriculum.models import Lesson
+from curriculum.models import ProgressState
+from curriculum.models import State
+from curriculum.serializers import CourseSerializer
+from mission_control.models import BlockDiagram
+
+
+class TestCourseSerializer(TestCase):
+    """Tests the course serializer."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def test_remix_overlay(self):
+        """Test the cached catalog overlay matches serializing per user."""
+        user = self.make_user()
+        course = Course.objects.create(name='Test')
+        lessons = [
+            Lesson.objects.create(
+                course=course,
+                sequence_number=number,
+                reference=BlockDiagram.objects.create(
+                    user=user, name=f'lesson{number}', content='<xml></xml>'),
+            )
+            for number in range(3)
+        ]
+        student = self.make_user('student')
+        for name, lesson, state in (
+                ('first', lessons[0], None),
+                ('second', lessons[0], ProgressState.COMPLETE),
+                ('third', lessons[1], ProgressState.IN_PROGRESS)):
+            BlockDiagram.objects.create(
+                user=student,
+                name=name,
+                content='<xml></xml>',
+                lesson=lesson,
+                state=state and State.objects.create(progress=state),
+            )
+        request = Request(APIRequestFactory().get('/'))
+        request.user = student
+
+        expected = CourseSerializer(
+            course, context={'request': request}).data
+        shared = CourseSerializer(
+            course, context={'request': request, 'remixes': {}}).data
+        self.assertNotEqual(expected, shared)
+
+        remixes = get_remixes(student)
+        self.assertIn('content', remixes[lessons[0].pk].get_deferred_fields())
+        with self.assertNumQueries(0):
+            self.assertTrue(apply_remixes(shared, remixes))
+        self.assertEqual(expected, shared)
+        self.assertEqual(
+            {'progress': 'COMPLETE'}, shared['lessons'][0]['state'])
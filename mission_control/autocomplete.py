@@ -0,0 +1,99 @@
+"""Tag name autocomplete."""
+import bisect
+import heapq
+import threading
+import time
+
+from rovercode_web.cache import get_version
+from rovercode_web.cache import invalidate_version
+from rovercode_web.db import primary_reads
+from .models import Tag
+
+TAGS_VERSION_KEY = 'tags:version'
+TAGS_USAGE_VERSION_KEY = 'tags:usage:version'
+
+# Usage counts change with every tagged save, so instead of rebuilding on
+# each change the ranking is refreshed at most this often (in seconds)
+USAGE_REFRESH_INTERVAL = 5 * 60
+
+
+class TagIndex:
+    """
+    Sorted index of tag names for prefix lookups.
+
+    Short prefixes match a large part of the index, so their results are
+    ranked up front. Longer prefixes are found by bisecting the sorted names
+    and ranking the few matches.
+    """
+
+    ranked_prefix_length = 2
+
+    def __init__(self, usage_counts, max_limit=50):
+        """Build the index from a mapping of tag names to usage counts."""
+        self.usage_counts = usage_counts
+        self.max_limit = max_limit
+        self.keys = sorted(
+            (name.casefold(), name) for name in usage_counts)
+        self.ranked = {}
+        for key, name in sorted(self.keys, key=self._rank):
+            for length in range(self.ranked_prefix_length + 1):
+                names = self.ranked.setdefault(key[:length], [])
+                if len(names) < max_limit:
+                    names.append(name)
+
+    def _rank(self, key):
+        """Order tags by the most used, then by name."""
+        return (-self.usage_counts[key[1]], key[0])
+
+    def search(self, prefix, limit):
+        """Find the most used tags starting with the prefix."""
+        prefix = prefix.casefold()
+        limit = min(limit, self.max_limit)
+        if len(prefix) <= self.ranked_prefix_length:
+            return self.ranked.get(prefix, [])[:limit]
+
+        start = bisect.bisect_left(self.keys, (prefix,))
+        end = bisect.bisect_left(self.keys, (prefix + '\U0010ffff',), start)
+        return [
+            name for _, name in heapq.nsmallest(
+                limit, self.keys[start:end], key=self._rank)
+        ]
+
+
+def get_usage_counts():
+    """Get the number of block diagrams using each tag."""
+    return dict(Tag.objects.values_list('name', 'usage_count'))
+
+
+_lock = threading.Lock()
+# The tag index of this process, the version it was built from and when
+_current = (None, None, 0)
+
+
+def get_tag_index():
+    """Get the tag index, rebuilding it if the tags changed."""
+    global _current  # pylint: disable=global-statement
+    version = get_version(TAGS_VERSION_KEY)
+    index, index_version, built = _current
+    if (index is None or index_version != version or
+            time.monotonic() - built > USAGE_REFRESH_INTERVAL):
+        with _lock:
+            # Another thread may have rebuilt it while this one waited
+            if _current[0] is index:
+                # Built under the version, so read at least as new as it
+                with primary_reads():
+                    counts = get_usage_counts()
+                _current = (TagIndex(counts), version, time.monotonic())
+            index = _current[0]
+
+    return index
+
+
+def invalidate_tag_index():
+    """Have every process rebuild its tag index."""
+    invalidate_version(TAGS_VERSION_KEY)
+
+
+def invalidate_tag_usage():
+    """Record that the tag usage counts changed."""
+    invalidate_version(TAGS_USAGE_VERSION_KEY)
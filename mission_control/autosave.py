@@ -0,0 +1,259 @@
+"""
+Write-behind buffer of the block diagram content autosaved by the editor.
+
+Autosaves go to the cache and are written to the database once the oldest
+unwritten one is AUTOSAVE_FLUSH_INTERVAL seconds old, by the next autosave
+or the flush_autosaves command. Each autosave gets a version, and the
+latest version written to the database is recorded, so the buffered
+content is only read over the database's while it is newer.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from curriculum.cache import get_reference_pks
+from curriculum.cache import invalidate_catalog
+from .models import BlockDiagram
+from .models import CONTENT_INDEX_FIELDS
+
+# Latest content autosaved for a block diagram, with its index
+BUFFER_KEY = 'autosave:{}'
+# Latest version of a block diagram written to the database
+FLUSHED_KEY = 'autosave:{}:flushed'
+# Latest version given to an autosave
+VERSION_KEY = 'autosave:version'
+# Block diagram autosaved at each version, for finding the buffers
+JOURNAL_KEY = 'autosave:journal:{}'
+# Where flushing the due buffers got to in the journal
+FLUSH_STATE_KEY = 'autosave:flush-state'
+# Held while flushing the due buffers
+FLUSH_LOCK_KEY = 'autosave:flush-lock'
+
+# Seconds a flush may hold the lock, in case it dies holding it
+FLUSH_LOCK_TIMEOUT = 10 * 60
+
+# Fields stored in the buffer
+FIELDS = ('content', 'revision') + CONTENT_INDEX_FIELDS
+
+# Journal entries read at once
+JOURNAL_CHUNK_SIZE = 1000
+
+LOGGER = logging.getLogger(__name__)
+
+# Record the version ARGV[1] at KEYS[1], expiring in ARGV[2] seconds, unless
+# a later version is recorded there
+FLUSHED_SCRIPT = '''
+local flushed = tonumber(redis.call('GET', KEYS[1]))
+if flushed == nil or flushed < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+'''
+
+# Registered flushed script, once Redis is known to be there
+_redis = {}
+
+# Held while recording a flushed version in a cache other than Redis
+_flushed_lock = threading.Lock()
+
+
+def _next_version():
+    """Get a new autosave version."""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        return cache.incr(VERSION_KEY)
+
+
+def get_pending(pks):
+    """Get the buffers not yet written to the database, by primary key."""
+    keys = {}
+    for pk in pks:
+        keys[BUFFER_KEY.format(pk)] = keys[FLUSHED_KEY.format(pk)] = pk
+    values = cache.get_many(keys)
+
+    pending = {}
+    for pk in pks:
+        buffered = values.get(BUFFER_KEY.format(pk))
+        flushed = values.get(FLUSHED_KEY.format(pk), 0)
+        if buffered is not None and buffered['version'] > flushed:
+            pending[pk] = buffered
+    return pending
+
+
+def _apply(bd, buffered):
+    """Read the buffered content over the block diagram's."""
+    for field in FIELDS:
+        setattr(bd, field, buffered[field])
+    # The index was built from the buffered content
+    bd._indexed_content = bd.content
+    bd.autosave_version = buffered['version']
+
+
+def overlay(bds):
+    """Read the newest autosaved content over the block diagrams'."""
+    pending = get_pending([bd.pk for bd in bds])
+    for bd in bds:
+        if bd.pk in pending:
+            _apply(bd, pending[bd.pk])
+
+
+def buffer(bd, content):
+    """
+    Autosave the content of the block diagram.
+
+    The block diagram is updated as if it had been saved. Its row is locked
+    while the revision is bumped, as mission_control.live does for edits,
+    so the two never give out the same revision. Returns whether the
+    buffered content was written to the database.
+    """
+    with transaction.atomic():
+        revision = BlockDiagram.objects.select_for_update().values_list(
+            'revision', flat=True).get(pk=bd.pk)
+        return _buffer(bd, content, revision)
+
+
+def _buffer(bd, content, revision):
+    """Autosave the content, locked at the revision in the database."""
+    version = _next_version()
+    previous = get_pending([bd.pk]).get(bd.pk)
+    bd.content = content
+    bd.index_content()
+    bd.revision = max(revision, previous['revision'] if previous else 0) + 1
+
+    buffered = {field: getattr(bd, field) for field in FIELDS}
+    buffered['version'] = version
+    buffered['since'] = previous['since'] if previous else time.time()
+    cache.set_many({
+        BUFFER_KEY.format(bd.pk): buffered,
+        JOURNAL_KEY.format(version): bd.pk,
+    }, settings.AUTOSAVE_BUFFER_TIMEOUT)
+    bd.autosave_version = version
+
+    if time.time() - buffered['since'] >= settings.AUTOSAVE_FLUSH_INTERVAL:
+        return flush(bd.pk)
+    return False
+
+
+def _get_flushed_script():
+    """Get the flushed script, or None if the cache is not Redis."""
+    if 'script' not in _redis:
+        try:
+            connection = get_redis_connection('default')
+        except NotImplementedError:
+            # Not a django-redis cache, e.g. in development
+            connection = None
+        _redis['script'] = (
+            connection and connection.register_script(FLUSHED_SCRIPT))
+    return _redis['script']
+
+
+def _set_flushed(pk, version):
+    """Record the version as written, unless a later one already is."""
+    key = FLUSHED_KEY.format(pk)
+    script = _get_flushed_script()
+    if script is None:
+        # E.g. the in-memory cache in development, where a lock will do
+        with _flushed_lock:
+            if cache.get(key, 0) < version:
+                cache.set(key, version, settings.AUTOSAVE_BUFFER_TIMEOUT)
+        return
+
+    try:
+        script(
+            keys=[cache.make_key(key)],
+            args=[version, settings.AUTOSAVE_BUFFER_TIMEOUT])
+    except RedisError:
+        LOGGER.exception('Could not record autosave %s as written', version)
+
+
+def mark_flushed(pk, version):
+    """
+    Record the version was written to the database, once committed.
+
+    Saves and flushes of the same block diagram may commit out of order,
+    so a version never replaces a later one.
+    """
+    transaction.on_commit(lambda: _set_flushed(pk, version))
+
+
+def flush(pk):
+    """
+    Write the buffered content, returning whether there was any.
+
+    The row is locked before the buffer is read, as buffer() and live edits
+    lock it, and the buffer is only written over an older revision, so
+    content saved since (whose flushed version may not be recorded yet) is
+    never overwritten. The update skips post_save, so the catalog is
+    invalidated here when the block diagram is a lesson's reference.
+    """
+    with transaction.atomic():
+        revision = BlockDiagram.objects.select_for_update().filter(
+            pk=pk).values_list('revision', flat=True).first()
+        buffered = get_pending([pk]).get(pk)
+        if buffered is None or revision is None:
+            return False
+        if buffered['revision'] <= revision:
+            mark_flushed(pk, buffered['version'])
+            return False
+
+        BlockDiagram.objects.filter(pk=pk).update(
+            **{field: buffered[field] for field in FIELDS})
+        mark_flushed(pk, buffered['version'])
+        if pk in get_reference_pks():
+            invalidate_catalog()
+    return True
+
+
+def flush_due(flush_all=False):
+    """
+    Write the buffers that are due, or all of them, to the database.
+
+    The journal is read from the oldest version that may still be pending.
+    Versions given out since the last call may not be in the journal yet,
+    so unless all are flushed they are left for the next call. Returns the
+    number of block diagrams written, or None if another call was already
+    flushing.
+    """
+    token = uuid.uuid4().hex
+    if not cache.add(FLUSH_LOCK_KEY, token, FLUSH_LOCK_TIMEOUT):
+        return None
+    try:
+        return _flush_due(flush_all)
+    finally:
+        if cache.get(FLUSH_LOCK_KEY) == token:
+            cache.delete(FLUSH_LOCK_KEY)
+
+
+def _flush_due(flush_all):
+    """Write the due buffers, holding the flush lock."""
+    latest = cache.get(VERSION_KEY, 0)
+    state = cache.get(FLUSH_STATE_KEY, {'start': 1, 'seen': 0})
+    stop = latest if flush_all else state['seen']
+    # Next time, read on from the versions this call may have missed, or
+    # from the oldest buffer left pending
+    start = min(stop, state['seen']) + 1
+
+    now = time.time()
+    flushed = 0
+    for chunk in range(state['start'], stop + 1, JOURNAL_CHUNK_SIZE):
+        versions = range(chunk, min(chunk + JOURNAL_CHUNK_SIZE, stop + 1))
+        journal = cache.get_many([
+            JOURNAL_KEY.format(version) for version in versions])
+        pending = get_pending(set(journal.values()))
+        for pk, buffered in pending.items():
+            if (flush_all or now - buffered['since'] >=
+                    settings.AUTOSAVE_FLUSH_INTERVAL):
+                flushed += flush(pk)
+            else:
+                start = min(start, buffered['version'])
+
+    cache.set(FLUSH_STATE_KEY, {'start': start, 'seen': latest}, None)
+    return flushed
@@ -0,0 +1,75 @@
+"""Blockly content analysis."""
+from collections import Counter
+from xml.parsers import expat
+
+
+class ContentIndex:
+    """Summary of the blocks in a Blockly XML document."""
+
+    def __init__(self, content_size=0):
+        """Create an empty index."""
+        self.block_type_counts = Counter()
+        self.block_count = 0
+        self.max_depth = 0
+        self.content_size = content_size
+        # Nesting depth of each open element
+        self._depths = [0]
+
+    @property
+    def block_types(self):
+        """The distinct block types, sorted."""
+        return sorted(self.block_type_counts)
+
+    @property
+    def block_type_count(self):
+        """The number of distinct block types."""
+        return len(self.block_type_counts)
+
+    def start_element(self, name, attributes):
+        """Handle the start of an element."""
+        # Namespaced names are reported as '<uri> <local name>'
+        local_name = name.rsplit(' ', 1)[-1]
+        depth = self._depths[-1]
+        if local_name == 'block':
+            depth += 1
+            self.block_count += 1
+            self.max_depth = max(self.max_depth, depth)
+            block_type = attributes.get('type')
+            if block_type:
+                self.block_type_counts[block_type] += 1
+        elif local_name == 'next':
+            # The next block in a stack is a sibling, not a child
+            depth -= 1
+
+        self._depths.append(depth)
+
+    def end_element(self, _):
+        """Handle the end of an element."""
+        self._depths.pop()
+
+
+def _forbid_entity_declaration(*args):
+    """Refuse documents that declare entities (e.g. 'billion laughs')."""
+    raise ValueError('Entity declarations are not allowed')
+
+
+def index_content(content):
+    """
+    Index Blockly XML content in a single streaming pass.
+
+    Blocks nested in a statement or value input are one level deeper than
+    the block containing them. Content that is not well-formed XML produces
+    an empty index.
+    """
+    content = (content or '').encode()
+    index = ContentIndex(content_size=len(content))
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.StartElementHandler = index.start_element
+    parser.EndElementHandler = index.end_element
+    parser.EntityDeclHandler = _forbid_entity_declaration
+    try:
+        parser.Parse(content, True)
+    except (expat.ExpatError, ValueError):
+        return ContentIndex(content_size=len(content))
+
+    return index
@@ -0,0 +1,104 @@
+"""Mission Control websocket consumers."""
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from . import live
+from .models import BlockDiagram
+
+
+class BlockDiagramConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Follow a block diagram live, and edit it if it is the user's.
+
+    The session is sent a snapshot of the content at its revision, then
+    each change to it. The owner's sessions send edits:
+
+        {"type": "edit", "revision": 3, "operations": [
+            {"start": 10, "end": 12, "text": "..."}]}
+
+    which are acknowledged with the new revision, or answered with the
+    current content when they were made to another revision.
+    """
+
+    group = None
+    editable = False
+
+    async def connect(self):
+        """Join the block diagram's sessions, if the user may read it."""
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        self.pk = self.scope['url_route']['kwargs']['pk']
+        try:
+            bd = await database_sync_to_async(live.get_block_diagram)(
+                self.pk, self.scope['token'].get('tier', 1))
+        except BlockDiagram.DoesNotExist:
+            await self.close()
+            return
+
+        self.group = live.group_name(self.pk)
+        self.editable = bd.user_id == user.pk
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        await self.send_json({
+            'type': 'snapshot',
+            'revision': bd.revision,
+            'content': bd.content,
+            'editable': self.editable,
+        })
+
+    async def disconnect(self, code):
+        """Leave the block diagram's sessions."""
+        if self.group is not None:
+            await self.channel_layer.group_discard(
+                self.group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        """Apply an edit from the session."""
+        if not isinstance(content, dict) or content.get('type') != 'edit':
+            await self.send_error('Only edits can be sent')
+            return
+        if not self.editable:
+            await self.send_error('Only the owner can edit the program')
+            return
+
+        operations = content.get('operations')
+        try:
+            bd = await database_sync_to_async(live.edit)(
+                self.pk, self.scope['user'], content.get('revision'),
+                operations)
+        except live.EditConflict as conflict:
+            await self.send_json({
+                'type': 'conflict',
+                'revision': conflict.revision,
+                'content': conflict.content,
+            })
+            return
+        except ValueError as error:
+            await self.send_error(str(error))
+            return
+        except BlockDiagram.DoesNotExist:
+            await self.close()
+            return
+
+        await self.send_json({'type': 'ack', 'revision': bd.revision})
+        await self.channel_layer.group_send(
+            self.group,
+            live.change_message(bd, operations, self.channel_name))
+
+    async def send_error(self, detail):
+        """Tell the session its message was not applied."""
+        await self.send_json({'type': 'error', 'detail': detail})
+
+    async def content_changed(self, message):
+        """Pass a change on to the session, unless it made it."""
+        if message['session'] == self.channel_name:
+            return
+
+        change = {'type': 'change', 'revision': message['revision']}
+        for key in ('content', 'operations'):
+            if key in message:
+                change[key] = message[key]
+        await self.send_json(change)
@@ -1,8 +1,11 @@
 """Mission Control filters."""
-from django.db.models import Q
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import SearchVector
 from django_filters.rest_framework import CharFilter
 from django_filters.rest_framework import FilterSet
 from django_filters.rest_framework import NumberFilter
+from rest_framework.filters import SearchFilter
 
 from .models import BlockDiagram
 
@@ -11,6 +14,21 @@ class BlockDiagramFilter(FilterSet):
     """Filterset for the BlockDiagram model."""
 
     admin_tags = CharFilter(method='filter_admin_tags')
+    block_count__gte = NumberFilter(
+        field_name='block_count', lookup_expr='gte')
+    block_count__lte = NumberFilter(
+        field_name='block_count', lookup_expr='lte')
+    block_type = CharFilter(method='filter_block_types')
+    block_type_count__gte = NumberFilter(
+        field_name='block_type_count', lookup_expr='gte')
+    block_type_count__lte = NumberFilter(
+        field_name='block_type_count', lookup_expr='lte')
+    content_size__gte = NumberFilter(
+        field_name='content_size', lookup_expr='gte')
+    content_size__lte = NumberFilter(
+        field_name='content_size', lookup_expr='lte')
+    max_depth__gte = NumberFilter(field_name='max_depth', lookup_expr='gte')
+    max_depth__lte = NumberFilter(field_name='max_depth', lookup_expr='lte')
     owner_tags = CharFilter(method='filter_owner_tags')
     tag = CharFilter(method='filter_tags')
     user__not = NumberFilter(field_name='user', exclude=True)
@@ -21,6 +39,15 @@ class BlockDiagramFilter(FilterSet):
         model = BlockDiagram
         fields = [
             'admin_tags',
+            'block_count__gte',
+            'block_count__lte',
+            'block_type',
+            'block_type_count__gte',
+            'block_type_count__lte',
+            'content_size__gte',
+            'content_size__lte',
+            'max_depth__gte',
+            'max_depth__lte',
             'name',
             'owner_tags',
             'tag',
@@ -32,9 +59,13 @@ class BlockDiagramFilter(FilterSet):
     def filter_tags(queryset, _, value):
         """Use all tags when filtering."""
         tags = value.split(',')
-        return queryset.filter(
-            Q(owner_tags__name__in=tags) | Q(admin_tags__name__in=tags)
-        ).distinct()
+        return queryset.filter(tag_names__overlap=tags)
+
+    @staticmethod
+    def filter_block_types(queryset, _, value):
+        """Filter on block diagrams using all of the listed block types."""
+        block_types = value.split(',')
+        return queryset.filter(block_types__contains=block_types)
 
     @staticmethod
     def filter_owner_tags(queryset, _, value):
@@ -47,3 +78,51 @@ class BlockDiagramFilter(FilterSet):
         """Filter on list of admin tags."""
         tags = value.split(',')
         return queryset.filter(admin_tags__name__in=tags)
+
+
+class BlockDiagramSearchFilter(SearchFilter):
+    """
+    Search filter for block diagrams that can use the trigram indexes.
+
+    Each search field is matched in its own subquery and the matches are
+    combined with a union. An OR across the joined tables would have to scan
+    every row instead. Passing `rank=true` orders the matches by their full
+    text rank over the name and description.
+    """
+
+    rank_param = 'rank'
+    search_config = 'english'
+
+    def filter_queryset(self, request, queryset, view):
+        """Filter and optionally rank the queryset."""
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+
+        if not search_fields or not search_terms:
+            return queryset
+
+        model = queryset.model
+        for search_term in search_terms:
+            matches = [
+                model.objects.filter(
+                    **{self.construct_search(str(search_field)): search_term}
+                ).values('pk')
+                for search_field in search_fields
+            ]
+            queryset = queryset.filter(
+                pk__in=matches[0].union(*matches[1:]))
+
+        rank = request.query_params.get(self.rank_param, '').lower()
+        if rank not in ('1', 'true'):
+            return queryset
+
+        vector = (
+            SearchVector('name', weight='A', config=self.search_config) +
+            SearchVector('description', weight='B', config=self.search_config)
+        )
+        query = SearchQuery(
+            ' '.join(search_terms), config=self.search_config)
+
+        return queryset.annotate(
+            search_rank=SearchRank(vector, query),
+        ).order_by('-search_rank', *queryset.query.order_by)
@@ -0,0 +1,140 @@
+"""
+Live editing of block diagrams.
+
+Sessions following a block diagram (see mission_control.consumers) are
+sent its content at a revision, then each change to it. The owner's
+sessions send edits made to the revision they have, as operations on the
+content, which are saved through the model and passed on to the others.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from . import autosave
+from .models import BlockDiagram
+
+try:
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+except ImportError:  # pragma: no cover
+    get_channel_layer = None
+
+# Most operations in one edit
+MAX_OPERATIONS = 100
+
+
+class EditConflict(Exception):
+    """The edit was made to another revision than the current one."""
+
+    def __init__(self, bd):
+        """Remember the current content, for the session to start over."""
+        super().__init__(f'The block diagram is at revision {bd.revision}')
+        self.revision = bd.revision
+        self.content = bd.content
+
+
+def group_name(pk):
+    """Get the channel layer group of the sessions following the diagram."""
+    return f'block-diagram-{pk}'
+
+
+def _is_low_surrogate(data, offset):
+    """Determine if the UTF-16 code unit at the offset ends a pair."""
+    unit = int.from_bytes(data[2 * offset:2 * offset + 2], 'little')
+    return 0xDC00 <= unit <= 0xDFFF
+
+
+def apply_operations(content, operations):
+    """
+    Apply the operations of an edit to the content.
+
+    Each operation replaces the text from `start` to `end` with `text`, in
+    the content left by the operations before it. Offsets count UTF-16 code
+    units, as JavaScript strings do, so characters beyond the Basic
+    Multilingual Plane (e.g. emoji) count twice. Raises ValueError if an
+    operation is malformed, out of range or splits such a character.
+    """
+    if (not isinstance(operations, list) or
+            not 0 < len(operations) <= MAX_OPERATIONS):
+        raise ValueError(
+            f'An edit is a list of 1 to {MAX_OPERATIONS} operations')
+
+    data = content.encode('utf-16-le')
+    for operation in operations:
+        try:
+            start, end, text = (
+                operation['start'], operation['end'], operation['text'])
+        except (KeyError, TypeError):
+            raise ValueError('Each operation has a start, an end and text')
+        if type(start) is not int or type(end) is not int or \
+                not isinstance(text, str):
+            raise ValueError('Each operation has a start, an end and text')
+        if not 0 <= start <= end <= len(data) // 2:
+            raise ValueError('The operation is out of range')
+        if _is_low_surrogate(data, start) or _is_low_surrogate(data, end):
+            raise ValueError('The operation splits a character')
+        try:
+            text = text.encode('utf-16-le')
+        except UnicodeEncodeError:
+            raise ValueError('The text has an unpaired surrogate')
+        data = data[:2 * start] + text + data[2 * end:]
+
+    return data.decode('utf-16-le')
+
+
+def get_block_diagram(pk, tier):
+    """Get a block diagram to follow, as the API would retrieve it."""
+    bd = BlockDiagram.objects.filter(
+        Q(reference_of__tier__lte=tier) | Q(reference_of=None)).get(pk=pk)
+    autosave.overlay([bd])
+    return bd
+
+
+def edit(pk, user, revision, operations):
+    """
+    Apply an edit made to a revision of the user's block diagram.
+
+    Returns the block diagram at its new revision. Raises EditConflict if
+    the edit was made to another revision, ValueError if it is malformed
+    and BlockDiagram.DoesNotExist if the user does not own the diagram.
+    """
+    with transaction.atomic():
+        bd = BlockDiagram.objects.select_for_update().get(pk=pk, user=user)
+        autosave.overlay([bd])
+        if bd.revision != revision:
+            raise EditConflict(bd)
+
+        bd.content = apply_operations(bd.content, operations)
+        bd.save(update_fields=['content'])
+        if bd.autosave_version is not None:
+            autosave.mark_flushed(bd.pk, bd.autosave_version)
+    return bd
+
+
+def change_message(bd, operations=None, session=None):
+    """
+    Describe a change to the sessions following the block diagram.
+
+    Changes made by live edits carry their operations, and the channel name
+    of the session that made them. Others carry the whole content.
+    """
+    message = {
+        'type': 'content.changed',
+        'revision': bd.revision,
+        'session': session,
+    }
+    if operations is None:
+        message['content'] = bd.content
+    else:
+        message['operations'] = operations
+    return message
+
+
+def notify(bd):
+    """Send the content saved outside the live sessions, once committed."""
+    layer = get_channel_layer and get_channel_layer()
+    if layer is None:
+        return
+
+    message = change_message(bd)
+    transaction.on_commit(lambda: async_to_sync(layer.group_send)(
+        group_name(bd.pk), message))
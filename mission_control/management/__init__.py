@@ -0,0 +1 @@
+"""Mission Control management."""
@@ -0,0 +1,33 @@
+"""Write the autosaved block diagram content buffered in the cache."""
+from django.core.management.base import BaseCommand
+
+from mission_control.autosave import flush_due
+
+
+class Command(BaseCommand):
+    """
+    Write the autosaves that are due to the database.
+
+    Run it every AUTOSAVE_FLUSH_INTERVAL seconds, so programs that are no
+    longer being edited are written too, as compose/django/flush-autosaves.sh
+    does. Only one run flushes at a time, the others skip their turn. With
+    --all every buffered autosave is written, e.g. after a crash or before
+    clearing the cache.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument(
+            '--all', action='store_true', dest='flush_all',
+            help='Write all the buffered autosaves, due or not.')
+
+    def handle(self, *args, **options):
+        """Flush the autosaves."""
+        flushed = flush_due(flush_all=options['flush_all'])
+        if flushed is None:
+            self.stdout.write('Another flush is running')
+        else:
+            self.stdout.write(
+                f'Wrote the autosaves of {flushed} block diagrams')
@@ -0,0 +1,35 @@
+"""Rebuild the content index and metrics of existing block diagrams."""
+from django.core.management.base import BaseCommand
+
+from mission_control.models import BlockDiagram
+from mission_control.models import CONTENT_INDEX_FIELDS
+
+
+class Command(BaseCommand):
+    """Stream over the block diagrams in chunks and re-index their content."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Re-index the block diagrams."""
+        chunk_size = options['chunk_size']
+        last_pk = 0
+        total = 0
+        while True:
+            chunk = list(
+                BlockDiagram.objects.filter(pk__gt=last_pk).order_by(
+                    'pk').only('pk', 'content')[:chunk_size])
+            if not chunk:
+                break
+
+            for block_diagram in chunk:
+                block_diagram.index_content()
+            BlockDiagram.objects.bulk_update(chunk, CONTENT_INDEX_FIELDS)
+
+            last_pk = chunk[-1].pk
+            total += len(chunk)
+            self.stdout.write(f'Indexed {total} block diagrams')
@@ -0,0 +1,54 @@
+"""Correct tag usage counts that drifted from the tag relations."""
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Func
+
+from mission_control.autocomplete import invalidate_tag_usage
+from mission_control.models import BlockDiagram
+from mission_control.models import Tag
+
+COUNT_FIELDS = ('admin_count', 'owner_count', 'usage_count')
+
+
+def count_tag_relations(through):
+    """Count the block diagrams related to each tag through a relation."""
+    return dict(through.objects.values('tag').annotate(
+        count=Count('*')).values_list('tag', 'count'))
+
+
+def count_tag_usage():
+    """Count the block diagrams using each tag name."""
+    return dict(BlockDiagram.objects.annotate(
+        tag=Func(F('tag_names'), function='unnest'),
+    ).values('tag').annotate(count=Count('pk')).values_list('tag', 'count'))
+
+
+class Command(BaseCommand):
+    """Recount the tag usage and fix the counters that differ."""
+
+    help = __doc__
+
+    def handle(self, *args, **options):
+        """Reconcile the tag counts."""
+        admin_counts = count_tag_relations(BlockDiagram.admin_tags.through)
+        owner_counts = count_tag_relations(BlockDiagram.owner_tags.through)
+        usage_counts = count_tag_usage()
+
+        corrected = []
+        for tag in Tag.objects.only('pk', 'name', *COUNT_FIELDS).iterator():
+            counts = (
+                admin_counts.get(tag.pk, 0),
+                owner_counts.get(tag.pk, 0),
+                usage_counts.get(tag.name, 0),
+            )
+            if counts != tuple(getattr(tag, field) for field in COUNT_FIELDS):
+                for field, count in zip(COUNT_FIELDS, counts):
+                    setattr(tag, field, count)
+                corrected.append(tag)
+
+        Tag.objects.bulk_update(corrected, COUNT_FIELDS, batch_size=500)
+        if corrected:
+            invalidate_tag_usage()
+
+        self.stdout.write(f'Corrected the counts of {len(corrected)} tags')
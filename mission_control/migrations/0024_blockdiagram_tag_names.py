@@ -0,0 +1,41 @@
+# Generated by Django 2.2.18 on 2026-10-19 06:49
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.fields.citext
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+def backfill_tag_names(apps, schema_editor):
+    """Combine the existing admin and owner tags of each block diagram."""
+    BlockDiagram = apps.get_model('mission_control', 'BlockDiagram')
+    tag_names = {}
+    for through in (
+            BlockDiagram.admin_tags.through, BlockDiagram.owner_tags.through):
+        rows = through.objects.values_list('blockdiagram_id', 'tag__name')
+        for block_diagram_id, name in rows.iterator():
+            tag_names.setdefault(block_diagram_id, set()).add(name)
+
+    for block_diagram_id, names in tag_names.items():
+        BlockDiagram.objects.filter(pk=block_diagram_id).update(
+            tag_names=sorted(names))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mission_control', '0023_blockdiagramblogquestion_sequence_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockdiagram',
+            name='tag_names',
+            field=django.contrib.postgres.fields.ArrayField(base_field=django.contrib.postgres.fields.citext.CICharField(max_length=30), blank=True, default=list, size=None),
+        ),
+        migrations.RunPython(backfill_tag_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='blockdiagram',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tag_names'], name='blockdiagram_tag_names_gin'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mission_control', '0024_blockdiagram_tag_names'),
+        ('users', '0003_user_show_guide'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        # The search filter uses icontains, which compares UPPER(column), so
+        # the trigram indexes are built on the same expression
+        migrations.RunSQL(
+            'CREATE INDEX blockdiagram_name_trgm '
+            'ON mission_control_blockdiagram '
+            'USING gin (UPPER(name) gin_trgm_ops);',
+            'DROP INDEX blockdiagram_name_trgm;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX user_username_trgm '
+            'ON users_user '
+            'USING gin (UPPER(username) gin_trgm_ops);',
+            'DROP INDEX user_username_trgm;',
+        ),
+    ]
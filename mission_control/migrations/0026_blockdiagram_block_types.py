@@ -0,0 +1,30 @@
+# Generated by Django 2.2.18 on 2026-10-19 06:53
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.fields.jsonb
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mission_control', '0025_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockdiagram',
+            name='block_type_counts',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='blockdiagram',
+            name='block_types',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='blockdiagram',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['block_types'], name='blockdiagram_block_types_gin'),
+        ),
+    ]
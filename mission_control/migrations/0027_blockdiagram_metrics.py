@@ -0,0 +1,33 @@
+# Generated by Django 2.2.18 on 2026-10-19 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mission_control', '0026_blockdiagram_block_types'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockdiagram',
+            name='block_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blockdiagram',
+            name='block_type_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blockdiagram',
+            name='content_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blockdiagram',
+            name='max_depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
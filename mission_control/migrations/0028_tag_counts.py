@@ -0,0 +1,51 @@
+# Generated by Django 2.2.18 on 2026-10-19 07:01
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Func
+
+
+def backfill_tag_counts(apps, schema_editor):
+    """Count the block diagrams already using each tag."""
+    BlockDiagram = apps.get_model('mission_control', 'BlockDiagram')
+    Tag = apps.get_model('mission_control', 'Tag')
+    for field, count_field in (
+            ('admin_tags', 'admin_count'), ('owner_tags', 'owner_count')):
+        through = getattr(BlockDiagram, field).through
+        counts = through.objects.values('tag').annotate(
+            count=Count('*')).values_list('tag', 'count')
+        for tag_id, count in counts:
+            Tag.objects.filter(pk=tag_id).update(**{count_field: count})
+
+    counts = BlockDiagram.objects.annotate(
+        tag=Func(F('tag_names'), function='unnest'),
+    ).values('tag').annotate(count=Count('pk')).values_list('tag', 'count')
+    for name, count in counts:
+        Tag.objects.filter(name=name).update(usage_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mission_control', '0027_blockdiagram_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='admin_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='owner_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='usage_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_tag_counts, migrations.RunPython.noop),
+    ]
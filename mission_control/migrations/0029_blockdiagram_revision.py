@@ -0,0 +1,18 @@
+# Generated by Django 2.2.18 on 2026-10-19 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mission_control', '0028_tag_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockdiagram',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
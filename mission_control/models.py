@@ -1,10 +1,25 @@
 """Mission Control models."""
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.fields import CICharField
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
+from . import blockly
+
 User = get_user_model()
 
+# Fields derived from BlockDiagram.content when it is saved
+CONTENT_INDEX_FIELDS = (
+    'block_types',
+    'block_type_counts',
+    'block_count',
+    'block_type_count',
+    'max_depth',
+    'content_size',
+)
+
 
 class BlockDiagram(models.Model):
     """Attributes to describe a single block diagram."""
@@ -23,27 +38,104 @@ class BlockDiagram(models.Model):
         related_name='block_diagrams')
     state = models.ForeignKey(
         'curriculum.State', on_delete=models.SET_NULL, blank=True, null=True)
+    # Denormalized union of admin_tags and owner_tags, kept in sync by the
+    # m2m_changed signal handlers
+    tag_names = ArrayField(
+        CICharField(max_length=30), blank=True, default=list)
+    block_types = ArrayField(models.TextField(), blank=True, default=list)
+    block_type_counts = JSONField(blank=True, default=dict)
+    block_count = models.PositiveIntegerField(default=0)
+    block_type_count = models.PositiveIntegerField(default=0)
+    max_depth = models.PositiveIntegerField(default=0)
+    # Size of the content in bytes
+    content_size = models.PositiveIntegerField(default=0)
+    # Incremented each time the content changes, so live editing sessions
+    # can tell which content their edits apply to
+    revision = models.PositiveIntegerField(default=0)
+
+    # Version of the autosaved content read over the saved content, see
+    # mission_control.autosave
+    autosave_version = None
 
     class Meta:
         """Meta class."""
 
         # Don't allow a user to use the same rover name
         unique_together = ('user', 'name',)
+        indexes = [
+            GinIndex(fields=['tag_names'], name='blockdiagram_tag_names_gin'),
+            GinIndex(
+                fields=['block_types'], name='blockdiagram_block_types_gin'),
+        ]
 
     def __str__(self):
         """Convert the model to a human readable string."""
         return str(self.name)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the content the index was built from."""
+        instance = super().from_db(db, field_names, values)
+        instance._indexed_content = instance.__dict__.get('content')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Index and count a revision of changed content, then save."""
+        content = self.__dict__.get('content')
+        if (content is not None and
+                content != self.__dict__.get('_indexed_content')):
+            self.index_content()
+            self.revision += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = (
+                    set(update_fields) | set(CONTENT_INDEX_FIELDS) |
+                    {'revision'})
+
+        super().save(*args, **kwargs)
+
     @property
     def tags(self):
         """All tags for the block diagram."""
-        return (self.admin_tags.all() | self.owner_tags.all()).distinct()
+        return Tag.objects.filter(name__in=self.tag_names)
+
+    def index_content(self):
+        """Index the blocks used in the content and measure it."""
+        index = blockly.index_content(self.content)
+        self.block_types = index.block_types
+        self.block_type_counts = dict(index.block_type_counts)
+        self.block_count = index.block_count
+        self.block_type_count = index.block_type_count
+        self.max_depth = index.max_depth
+        self.content_size = index.content_size
+        self._indexed_content = self.content
+
+    def update_tag_names(self):
+        """
+        Recompute the combined tag names from the tag relations.
+
+        Returns the names added and removed. The row stays locked until the
+        transaction ends so concurrent changes see each other's names.
+        """
+        old_names = set(BlockDiagram.objects.select_for_update().filter(
+            pk=self.pk).values_list('tag_names', flat=True).first() or [])
+        names = set(self.admin_tags.values_list('name', flat=True))
+        names.update(self.owner_tags.values_list('name', flat=True))
+        self.tag_names = sorted(names)
+        BlockDiagram.objects.filter(pk=self.pk).update(
+            tag_names=self.tag_names)
+        return names - old_names, old_names - names
 
 
 class Tag(models.Model):
     """Descriptor to add to another model."""
 
     name = CICharField(max_length=30, unique=True)
+    # Number of block diagrams using the tag, kept up to date by the signal
+    # handlers and checked by the reconcile_tag_counts command
+    admin_count = models.IntegerField(default=0)
+    owner_count = models.IntegerField(default=0)
+    usage_count = models.IntegerField(default=0, db_index=True)
 
     def __str__(self):
         """Convert the model to a human readable string."""
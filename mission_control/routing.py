@@ -0,0 +1,8 @@
+"""Mission Control websocket routes."""
+from django.urls import path
+
+from .consumers import BlockDiagramConsumer
+
+websocket_urlpatterns = [
+    path('ws/block-diagrams/<int:pk>/', BlockDiagramConsumer),
+]
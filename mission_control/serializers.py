@@ -7,6 +7,8 @@ from rest_framework import serializers
 
 from curriculum.models import Lesson
 from curriculum.serializers import StateSerializer
+from rovercode_web.metrics import TimedSerializerMixin
+from rovercode_web.serializers import FlatListSerializer
 from .fields import TagStringRelatedField
 from .models import BlockDiagram
 from .models import BlockDiagramBlogQuestion
@@ -16,6 +18,14 @@ from .models import Tag
 
 NAME_REGEX = re.compile(r'\((?P<number>\d)\)$')
 
+# Precomputed content metrics, included when requested with ?metrics=true
+METRIC_FIELDS = (
+    'block_count',
+    'block_type_count',
+    'max_depth',
+    'content_size',
+)
+
 User = get_user_model()
 
 
@@ -29,7 +39,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('username', )
 
 
-class UserGuideSerializer(serializers.ModelSerializer):
+class UserGuideSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """User model serializer."""
 
     show_guide = serializers.BooleanField()
@@ -75,7 +85,8 @@ class BlockDiagramBlogQuestionWriteSerializer(serializers.ModelSerializer):
         fields = ('id', 'answer')
 
 
-class BlockDiagramSerializer(serializers.ModelSerializer):
+class BlockDiagramSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     """Block diagram model serializer."""
 
     admin_tags = serializers.StringRelatedField(read_only=True, many=True)
@@ -96,12 +107,24 @@ class BlockDiagramSerializer(serializers.ModelSerializer):
         """Meta class."""
 
         model = BlockDiagram
-        fields = '__all__'
+        exclude = ('tag_names', 'block_types', 'block_type_counts')
+        read_only_fields = METRIC_FIELDS + ('revision', )
+        list_serializer_class = FlatListSerializer
+
+    def get_field_names(self, declared_fields, info):
+        """Only include the metrics when they are requested."""
+        field_names = super().get_field_names(declared_fields, info)
+        request = self.context.get('request')
+        metrics = request and request.query_params.get('metrics', '').lower()
+        if metrics in ('1', 'true'):
+            return field_names
+
+        return [name for name in field_names if name not in METRIC_FIELDS]
 
     @staticmethod
     def get_tags(obj):
         """All tags for the block diagram."""
-        return [str(tag) for tag in obj.tags.all()]
+        return list(obj.tag_names)
 
     @staticmethod
     def validate_blog_answers(value):
@@ -149,8 +172,8 @@ class BlockDiagramSerializer(serializers.ModelSerializer):
                 sequence_number=1,
             )
 
-        for tag in owner_tags:
-            block_diagram.owner_tags.add(tag)
+        # One add, so the tag counts are updated once for all the tags
+        block_diagram.owner_tags.add(*owner_tags)
 
         return block_diagram
 
@@ -166,11 +189,11 @@ class BlockDiagramSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Tag model serializer."""
 
     class Meta:
         """Meta class."""
 
         model = Tag
-        fields = ('name', )
+        fields = ('name', 'admin_count', 'owner_count', 'usage_count')
@@ -1,15 +1,27 @@
 """Mission Control signal handlers."""
 import logging
+from collections import Counter
 
 from django.conf import settings
 from django.core.mail import send_mail
+from django.db.models import F
+from django.db.models import Func
+from django.db.models import Value
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.template import loader
 
 import requests
 
+from mission_control.autocomplete import invalidate_tag_index
+from mission_control.autocomplete import invalidate_tag_usage
 from mission_control.models import BlockDiagram
+from mission_control.models import Tag
+from rovercode_web.metrics import timing
 
 LOGGER = logging.getLogger(__name__)
 
@@ -17,8 +29,20 @@ LOGGER = logging.getLogger(__name__)
 @receiver(pre_save, sender=BlockDiagram, dispatch_uid="update_block_diagram")
 def update_block_diagram(sender, instance, **kwargs):
     """Handle changes to BlockDiagram model."""
-    response = requests.post(
-        f'{settings.PROFANITY_CHECK_SERVICE_HOST}/censor-word/{instance.name}')
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'name' not in update_fields:
+        # The name is not being saved, so there is nothing to check
+        return
+
+    try:
+        with timing('http'):
+            response = requests.post(
+                f'{settings.PROFANITY_CHECK_SERVICE_HOST}'
+                f'/censor-word/{instance.name}',
+                timeout=settings.EXTERNAL_SERVICE_TIMEOUT)
+    except requests.exceptions.RequestException as error:
+        LOGGER.error('Error %s contacting profanity check', error)
+        return
 
     if response.status_code != 200:
         LOGGER.error(
@@ -42,3 +66,150 @@ def update_block_diagram(sender, instance, **kwargs):
         )
     elif not profane_word and instance.flagged:
         instance.flagged = False
+
+
+@receiver(pre_save, sender=BlockDiagram, dispatch_uid='reset_tag_names')
+def reset_tag_names(sender, instance, **kwargs):
+    """New block diagrams (including copies) start without tag relations."""
+    if instance.pk is None:
+        instance.tag_names = []
+
+
+# The Tag counter for each tag relation
+TAG_COUNT_FIELDS = {
+    'admin_tags': 'admin_count',
+    'owner_tags': 'owner_count',
+}
+
+
+def _add_to_tag_counts(lookup, field, deltas):
+    """Add to a tag counter, grouping the tags changed by the same amount."""
+    by_delta = {}
+    for key, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(key)
+
+    for delta, keys in by_delta.items():
+        Tag.objects.filter(**{f'{lookup}__in': keys}).update(
+            **{field: F(field) + delta})
+
+
+def _update_tags(field, instance, action, reverse, pk_set):
+    """
+    Keep tag names and counts in sync with one of the tag relations.
+
+    The instance is the block diagram, or the tag when the relation is
+    changed from the tag (reverse). The tag counts are adjusted by the
+    relations actually added or removed.
+    """
+    through = getattr(BlockDiagram, field).through
+    stash = f'_removed_{field}'
+    if action in ('pre_remove', 'pre_clear'):
+        # Only existing relations are removed, and the cleared relations are
+        # unknown once the rows are gone
+        relations = through.objects.filter(
+            **{'tag' if reverse else 'blockdiagram': instance})
+        if pk_set is not None:
+            relations = relations.filter(
+                **{'blockdiagram__in' if reverse else 'tag__in': pk_set})
+        instance.__dict__[stash] = list(
+            relations.values_list('blockdiagram_id', 'tag_id'))
+        return
+
+    if action == 'post_add':
+        delta = 1
+        if reverse:
+            changed = [(pk, instance.pk) for pk in pk_set]
+        else:
+            changed = [(instance.pk, pk) for pk in pk_set]
+    elif action in ('post_remove', 'post_clear'):
+        delta = -1
+        changed = instance.__dict__.pop(stash, [])
+    else:
+        return
+
+    if not changed:
+        return
+
+    tag_counts = Counter()
+    for _, tag_id in changed:
+        tag_counts[tag_id] += delta
+    _add_to_tag_counts('pk', TAG_COUNT_FIELDS[field], tag_counts)
+
+    if reverse:
+        block_diagrams = BlockDiagram.objects.filter(
+            pk__in={block_diagram_id for block_diagram_id, _ in changed})
+    else:
+        block_diagrams = [instance]
+
+    usage_counts = Counter()
+    for block_diagram in block_diagrams:
+        added, removed = block_diagram.update_tag_names()
+        usage_counts.update(added)
+        usage_counts.subtract(removed)
+    _add_to_tag_counts('name', 'usage_count', usage_counts)
+
+    invalidate_tag_usage()
+
+
+@receiver(
+    m2m_changed, sender=BlockDiagram.admin_tags.through,
+    dispatch_uid='update_admin_tag_names')
+def update_admin_tag_names(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """Handle changes to BlockDiagram.admin_tags."""
+    _update_tags('admin_tags', instance, action, reverse, pk_set)
+
+
+@receiver(
+    m2m_changed, sender=BlockDiagram.owner_tags.through,
+    dispatch_uid='update_owner_tag_names')
+def update_owner_tag_names(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """Handle changes to BlockDiagram.owner_tags."""
+    _update_tags('owner_tags', instance, action, reverse, pk_set)
+
+
+@receiver(
+    pre_delete, sender=BlockDiagram, dispatch_uid='uncount_block_diagram')
+def uncount_block_diagram(sender, instance, **kwargs):
+    """Stop counting a deleted block diagram's tags."""
+    # The relations are deleted without m2m_changed signals
+    admin = Tag.objects.filter(admin_block_diagrams=instance)
+    owner = Tag.objects.filter(owner_block_diagrams=instance)
+    if (admin | owner).update(usage_count=F('usage_count') - 1):
+        admin.update(admin_count=F('admin_count') - 1)
+        owner.update(owner_count=F('owner_count') - 1)
+        invalidate_tag_usage()
+
+
+@receiver(pre_save, sender=Tag, dispatch_uid='rename_tag')
+def rename_tag(sender, instance, **kwargs):
+    """Rename the tag in the combined tag names of its block diagrams."""
+    if instance.pk is None:
+        return
+
+    old_name = Tag.objects.filter(pk=instance.pk).values_list(
+        'name', flat=True).first()
+    if old_name is None or old_name == instance.name:
+        return
+
+    BlockDiagram.objects.filter(tag_names__contains=[old_name]).update(
+        tag_names=Func(
+            F('tag_names'), Value(old_name), Value(instance.name),
+            function='array_replace'))
+
+
+@receiver(pre_delete, sender=Tag, dispatch_uid='delete_tag')
+def delete_tag(sender, instance, **kwargs):
+    """Remove the tag from the combined tag names of its block diagrams."""
+    BlockDiagram.objects.filter(tag_names__contains=[instance.name]).update(
+        tag_names=Func(
+            F('tag_names'), Value(instance.name), function='array_remove'))
+
+
+@receiver(post_save, sender=Tag, dispatch_uid='tag_saved')
+@receiver(post_delete, sender=Tag, dispatch_uid='tag_deleted')
+def invalidate_tags(sender, **kwargs):
+    """Have the tag autocomplete index rebuilt when tags change."""
+    invalidate_tag_index()
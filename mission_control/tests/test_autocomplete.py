@@ -0,0 +1,85 @@
+"""Mission Control test tag autocomplete."""
+from unittest.mock import patch
+
+from django.core.cache import cache
+from test_plus.test import TestCase
+
+from mission_control import autocomplete
+from mission_control.autocomplete import get_tag_index
+from mission_control.autocomplete import TagIndex
+from mission_control.models import BlockDiagram
+from mission_control.models import Tag
+
+
+class TestTagIndex(TestCase):
+    """Tests the tag index."""
+
+    def test_search(self):
+        """Test finding the most used tags by prefix."""
+        index = TagIndex({
+            'Line': 2,
+            'light': 5,
+            'lights': 5,
+            'maze': 9,
+            'Lidar': 0,
+        })
+        self.assertEqual(['light', 'lights'], index.search('li', 2))
+        self.assertEqual(
+            ['light', 'lights', 'Line', 'Lidar'], index.search('LI', 10))
+        self.assertEqual(['Line'], index.search('line', 10))
+        self.assertEqual(['maze', 'light'], index.search('', 2))
+        self.assertEqual([], index.search('x', 10))
+        self.assertEqual([], index.search('lines', 10))
+
+    def test_max_limit(self):
+        """Test the number of results is limited."""
+        index = TagIndex({f'tag{number}': number for number in range(5)}, 3)
+        self.assertEqual(['tag4', 'tag3', 'tag2'], index.search('', 10))
+        self.assertEqual(['tag4', 'tag3', 'tag2'], index.search('tag', 10))
+
+
+class TestGetTagIndex(TestCase):
+    """Tests getting the tag index of the process."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        cache.clear()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def test_usage(self):
+        """Test the index ranks tags by the block diagrams using them."""
+        user = self.make_user()
+        rare = Tag.objects.create(name='rare')
+        common = Tag.objects.create(name='common')
+        Tag.objects.create(name='unused')
+        for number in range(3):
+            bd = BlockDiagram.objects.create(
+                user=user, name=f'test{number}', content='<xml></xml>')
+            bd.owner_tags.add(common)
+        bd.admin_tags.add(rare)
+
+        index = get_tag_index()
+        self.assertDictEqual(
+            {'common': 3, 'rare': 1, 'unused': 0}, index.usage_counts)
+
+    def test_rebuild(self):
+        """Test the index is only rebuilt when tags change or it is old."""
+        Tag.objects.create(name='first')
+        index = get_tag_index()
+        self.assertIs(index, get_tag_index())
+
+        Tag.objects.create(name='second')
+        index = get_tag_index()
+        self.assertEqual(['first', 'second'], index.search('', 10))
+        self.assertIs(index, get_tag_index())
+
+        with patch.object(autocomplete, 'USAGE_REFRESH_INTERVAL', -1):
+            self.assertIsNot(index, get_tag_index())
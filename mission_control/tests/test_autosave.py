@@ -0,0 +1,200 @@
+"""Mission Control test autosave buffer."""
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from redis.exceptions import RedisError
+from test_plus.test import TestCase
+
+from curriculum.cache import get_catalog_version
+from curriculum.models import Course
+from curriculum.models import Lesson
+from mission_control import autosave
+from mission_control import live
+from mission_control.models import BlockDiagram
+from mission_control.tests.test_blockly import CONTENT
+
+
+def at(now):
+    """Autosave at a time, leaving the cache's clock alone."""
+    return patch.object(autosave, 'time', Mock(**{'time.return_value': now}))
+
+
+@override_settings(AUTOSAVE_FLUSH_INTERVAL=60)
+class TestAutosave(TestCase):
+    """Tests buffering autosaved content."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        cache.clear()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+        # Run the commit hooks now, the test case never commits
+        self.on_commit = patch(
+            'django.db.transaction.on_commit', lambda func: func())
+        self.on_commit.start()
+
+        user = self.make_user()
+        self.bd = BlockDiagram.objects.create(
+            user=user, name='Program', content='<xml></xml>')
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.on_commit.stop()
+        self.patcher.stop()
+
+    def autosave(self, content, now=1000):
+        """Autosave content at a time."""
+        bd = BlockDiagram.objects.get(pk=self.bd.pk)
+        with at(now):
+            return autosave.buffer(bd, content)
+
+    def read(self):
+        """Read the block diagram as the API does."""
+        bd = BlockDiagram.objects.get(pk=self.bd.pk)
+        autosave.overlay([bd])
+        return bd
+
+    def test_buffer(self):
+        """Test autosaves are read over the database until flushed."""
+        self.assertFalse(self.autosave(CONTENT))
+        self.bd.refresh_from_db()
+        self.assertEqual('<xml></xml>', self.bd.content)
+        bd = self.read()
+        self.assertEqual(CONTENT, bd.content)
+        self.assertEqual(4, bd.block_count)
+        self.assertEqual(1, bd.autosave_version)
+
+        self.assertFalse(self.autosave(CONTENT + ' ', 1059))
+        self.assertTrue(self.autosave(CONTENT, 1060))
+        self.bd.refresh_from_db()
+        self.assertEqual(CONTENT, self.bd.content)
+        self.assertEqual(4, self.bd.block_count)
+        self.assertIsNone(self.read().autosave_version)
+        self.assertFalse(autosave.flush(self.bd.pk))
+
+        # A new buffer starts when the last was flushed
+        self.assertFalse(self.autosave('<xml/>', 2000))
+        self.assertTrue(self.autosave('<xml></xml>', 2060))
+
+    def test_saved(self):
+        """Test saving the block diagram writes the autosave."""
+        self.autosave(CONTENT)
+        bd = self.read()
+        bd.save()
+        autosave.mark_flushed(bd.pk, bd.autosave_version)
+        self.bd.refresh_from_db()
+        self.assertEqual(CONTENT, self.bd.content)
+        self.assertEqual(4, self.bd.block_count)
+        self.assertIsNone(self.read().autosave_version)
+
+    def test_saved_before_autosave(self):
+        """Test later autosaves are read over a saved block diagram."""
+        self.autosave(CONTENT)
+        bd = self.read()
+        self.autosave('<xml/>')
+        autosave.mark_flushed(bd.pk, bd.autosave_version)
+        self.assertEqual('<xml/>', self.read().content)
+
+    def test_flush_after_edit(self):
+        """Test a flush never writes the buffer over a later edit."""
+        self.autosave(CONTENT)
+        # The edit committed, but its flushed version is not recorded yet
+        with patch.object(autosave, 'mark_flushed'):
+            live.edit(self.bd.pk, self.bd.user, 2, [
+                {'start': 0, 'end': len(CONTENT), 'text': '<xml/>'}])
+        self.assertFalse(autosave.flush(self.bd.pk))
+        self.bd.refresh_from_db()
+        self.assertEqual('<xml/>', self.bd.content)
+        self.assertEqual(3, self.bd.revision)
+        self.assertIsNone(self.read().autosave_version)
+
+    def test_flush_reference(self):
+        """Test flushing a lesson's reference invalidates the catalog."""
+        Lesson.objects.create(
+            course=Course.objects.create(name='Course'), sequence_number=1,
+            reference=self.bd)
+        version = get_catalog_version()
+        self.autosave(CONTENT)
+        self.assertEqual(version, get_catalog_version())
+        self.assertTrue(autosave.flush(self.bd.pk))
+        self.assertNotEqual(version, get_catalog_version())
+
+    def test_flushed_out_of_order(self):
+        """Test an earlier version never replaces a later one as written."""
+        autosave.mark_flushed(self.bd.pk, 3)
+        autosave.mark_flushed(self.bd.pk, 2)
+        self.assertEqual(3, cache.get(autosave.FLUSHED_KEY.format(self.bd.pk)))
+
+    @patch('mission_control.autosave.get_redis_connection')
+    def test_flushed_redis(self, get_redis_connection):
+        """Test the written version is recorded by a script in Redis."""
+        autosave._redis.clear()
+        script = get_redis_connection.return_value.register_script.return_value
+        try:
+            autosave.mark_flushed(self.bd.pk, 3)
+            script.side_effect = RedisError
+            autosave.mark_flushed(self.bd.pk, 4)
+        finally:
+            autosave._redis.clear()
+        script.assert_called_with(
+            keys=[cache.make_key(autosave.FLUSHED_KEY.format(self.bd.pk))],
+            args=[4, settings.AUTOSAVE_BUFFER_TIMEOUT])
+        get_redis_connection.return_value.register_script.assert_called_with(
+            autosave.FLUSHED_SCRIPT)
+
+    def test_flush_locked(self):
+        """Test only one call flushes at a time."""
+        self.autosave(CONTENT)
+        cache.add(autosave.FLUSH_LOCK_KEY, 'other')
+        self.assertIsNone(autosave.flush_due(flush_all=True))
+        self.assertEqual('other', cache.get(autosave.FLUSH_LOCK_KEY))
+
+        cache.delete(autosave.FLUSH_LOCK_KEY)
+        self.assertEqual(1, autosave.flush_due(flush_all=True))
+        self.assertIsNone(cache.get(autosave.FLUSH_LOCK_KEY))
+
+    @patch('mission_control.autosave.JOURNAL_CHUNK_SIZE', 2)
+    def test_flush_due(self):
+        """Test only the due buffers are flushed, unless all are."""
+        other = BlockDiagram.objects.create(
+            user=self.bd.user, name='Other', content='<xml></xml>')
+        with at(1000):
+            self.assertEqual(0, autosave.flush_due())
+        self.autosave(CONTENT, 1000)
+        with at(1001):
+            autosave.buffer(other, CONTENT)
+            self.autosave(CONTENT + ' ', 1002)
+            autosave.buffer(other, CONTENT + ' ')
+
+        with at(1060):
+            # Autosaves since the last flush are left for the next
+            self.assertEqual(0, autosave.flush_due())
+            self.assertEqual(1, autosave.flush_due())
+        self.bd.refresh_from_db()
+        self.assertEqual(CONTENT + ' ', self.bd.content)
+        self.assertEqual(
+            {'start': 4, 'seen': 4}, cache.get(autosave.FLUSH_STATE_KEY))
+
+        with at(1061):
+            self.assertEqual(1, autosave.flush_due())
+            self.assertEqual(0, autosave.flush_due())
+        other.refresh_from_db()
+        self.assertEqual(CONTENT + ' ', other.content)
+        self.assertEqual(
+            {'start': 5, 'seen': 4}, cache.get(autosave.FLUSH_STATE_KEY))
+
+    def test_flush_all(self):
+        """Test flushing all the buffers, as after a crash."""
+        self.autosave(CONTENT)
+        with at(1000):
+            self.assertEqual(1, autosave.flush_due(flush_all=True))
+        self.bd.refresh_from_db()
+        self.assertEqual(CONTENT, self.bd.content)
+        self.assertEqual(
+            {'start': 1, 'seen': 1}, cache.get(autosave.FLUSH_STATE_KEY))
@@ -0,0 +1,85 @@
+"""Mission Control test Blockly content analysis."""
+from test_plus.test import TestCase
+
+from mission_control.blockly import index_content
+
+CONTENT = (
+    '<xml xmlns="https://developers.google.com/blockly/xml">'
+    '<variables><variable id="v">count</variable></variables>'
+    '<block type="controls_repeat_ext" id="a" x="10" y="10">'
+    '<value name="TIMES">'
+    '<shadow type="math_number"><field name="NUM">10</field></shadow>'
+    '</value>'
+    '<statement name="DO">'
+    '<block type="motor_start" id="b">'
+    '<next><block type="motor_start" id="c">'
+    '<next><block type="motor_stop" id="d"></block></next>'
+    '</block></next>'
+    '</block>'
+    '</statement>'
+    '</block>'
+    '</xml>'
+)
+
+
+class TestIndexContent(TestCase):
+    """Tests indexing Blockly content."""
+
+    def test_index(self):
+        """Test counting the block types."""
+        index = index_content(CONTENT)
+        self.assertEqual(
+            ['controls_repeat_ext', 'motor_start', 'motor_stop'],
+            index.block_types)
+        self.assertDictEqual({
+            'controls_repeat_ext': 1,
+            'motor_start': 2,
+            'motor_stop': 1,
+        }, dict(index.block_type_counts))
+
+    def test_metrics(self):
+        """Test measuring the content."""
+        index = index_content(CONTENT)
+        self.assertEqual(4, index.block_count)
+        self.assertEqual(3, index.block_type_count)
+        self.assertEqual(2, index.max_depth)
+        self.assertEqual(len(CONTENT), index.content_size)
+
+    def test_nesting(self):
+        """Test the depth counts statement and value inputs, not stacks."""
+        index = index_content(
+            '<xml>'
+            '<block type="controls_if">'
+            '<value name="IF0"><block type="logic_compare">'
+            '<value name="A"><block type="sensor_read"></block></value>'
+            '</block></value>'
+            '</block>'
+            '<block type="motor_start">'
+            '<next><block type="motor_start">'
+            '<next><block type="motor_start"></block></next>'
+            '</block></next>'
+            '</block>'
+            '</xml>')
+        self.assertEqual(6, index.block_count)
+        self.assertEqual(3, index.max_depth)
+
+    def test_empty(self):
+        """Test content without blocks."""
+        self.assertEqual([], index_content('<xml></xml>').block_types)
+        self.assertEqual([], index_content('').block_types)
+        self.assertEqual([], index_content(None).block_types)
+
+    def test_malformed(self):
+        """Test content that is not well-formed."""
+        content = '<xml><block type="motor_start"></xml>'
+        index = index_content(content)
+        self.assertEqual([], index.block_types)
+        self.assertEqual(0, index.block_count)
+        self.assertEqual(len(content), index.content_size)
+
+    def test_entity_declaration(self):
+        """Test content declaring entities is refused."""
+        index = index_content(
+            '<!DOCTYPE xml [<!ENTITY a "motor_start">]>'
+            '<xml><block type="&a;"></block></xml>')
+        self.assertEqual([], index.block_types)
@@ -0,0 +1,128 @@
+"""Mission Control test management commands."""
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from test_plus.test import TestCase
+
+from mission_control import autosave
+from mission_control.models import BlockDiagram
+from mission_control.models import Tag
+from mission_control.tests.test_blockly import CONTENT
+
+
+class TestIndexBlockDiagrams(TestCase):
+    """Tests the index_block_diagrams command."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def test_index(self):
+        """Test re-indexing block diagrams saved without an index."""
+        user = self.make_user()
+        BlockDiagram.objects.bulk_create([
+            BlockDiagram(user=user, name=f'test{n}', content=CONTENT)
+            for n in range(3)
+        ])
+        self.assertEqual(
+            0, BlockDiagram.objects.filter(
+                block_types__contains=['motor_stop']).count())
+
+        out = StringIO()
+        call_command('index_block_diagrams', chunk_size=2, stdout=out)
+
+        self.assertEqual(
+            3, BlockDiagram.objects.filter(
+                block_types__contains=['motor_stop']).count())
+        self.assertEqual(
+            {'controls_repeat_ext': 1, 'motor_start': 2, 'motor_stop': 1},
+            BlockDiagram.objects.first().block_type_counts)
+        self.assertEqual(
+            3, BlockDiagram.objects.filter(block_count=4, max_depth=2).count())
+        self.assertIn('Indexed 3 block diagrams', out.getvalue())
+
+
+class TestReconcileTagCounts(TestCase):
+    """Tests the reconcile_tag_counts command."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def test_reconcile(self):
+        """Test correcting the counts that drifted."""
+        user = self.make_user()
+        tags = [Tag.objects.create(name=f'tag{n}') for n in range(3)]
+        bd = BlockDiagram.objects.create(
+            user=user, name='test', content='<xml></xml>')
+        bd.admin_tags.add(tags[0])
+        bd.owner_tags.add(tags[0], tags[1])
+        Tag.objects.filter(pk=tags[1].pk).update(
+            owner_count=5, usage_count=-1)
+
+        out = StringIO()
+        call_command('reconcile_tag_counts', stdout=out)
+        self.assertIn('Corrected the counts of 1 tags', out.getvalue())
+        self.assertEqual(
+            [(1, 1, 1), (0, 1, 1), (0, 0, 0)],
+            list(Tag.objects.order_by('name').values_list(
+                'admin_count', 'owner_count', 'usage_count')))
+
+        out = StringIO()
+        call_command('reconcile_tag_counts', stdout=out)
+        self.assertIn('Corrected the counts of 0 tags', out.getvalue())
+
+
+class TestFlushAutosaves(TestCase):
+    """Tests the flush_autosaves command."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def test_flush(self):
+        """Test writing the buffered autosaves."""
+        cache.clear()
+        bd = BlockDiagram.objects.create(
+            user=self.make_user(), name='test', content='<xml></xml>')
+        autosave.buffer(bd, CONTENT)
+
+        out = StringIO()
+        call_command('flush_autosaves', stdout=out)
+        self.assertIn(
+            'Wrote the autosaves of 0 block diagrams', out.getvalue())
+        call_command('flush_autosaves', '--all', stdout=out)
+        self.assertIn(
+            'Wrote the autosaves of 1 block diagrams', out.getvalue())
+        bd.refresh_from_db()
+        self.assertEqual(CONTENT, bd.content)
+
+        cache.add(autosave.FLUSH_LOCK_KEY, 'other')
+        call_command('flush_autosaves', stdout=out)
+        self.assertIn('Another flush is running', out.getvalue())
@@ -0,0 +1,140 @@
+"""Mission Control test websocket consumers."""
+from unittest import skipIf
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.test import TransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from mission_control import live
+from mission_control.models import BlockDiagram
+
+try:
+    from channels.db import database_sync_to_async
+    from channels.routing import URLRouter
+    from channels.testing import WebsocketCommunicator
+
+    from mission_control.routing import websocket_urlpatterns
+    from rovercode_web.users.middleware import JWTAuthMiddleware
+except ImportError:  # pragma: no cover
+    WebsocketCommunicator = None
+
+
+@skipIf(WebsocketCommunicator is None, 'Channels is not installed')
+class TestBlockDiagramConsumer(TransactionTestCase):
+    """Tests following and editing block diagrams over websockets."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        post_save.disconnect(
+            sender=settings.AUTH_USER_MODEL, dispatch_uid='new_user')
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+        self.application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+        User = get_user_model()
+        self.user = User.objects.create_user('owner', password='password')
+        self.other = User.objects.create_user('other', password='password')
+        self.bd = BlockDiagram.objects.create(
+            user=self.user, name='Program', content='<xml></xml>')
+
+    def tearDown(self):
+        """Tear down the tests."""
+        self.patcher.stop()
+
+    def communicator(self, user, pk=None):
+        """Open a websocket to the block diagram as the user."""
+        token = AccessToken.for_user(user) if user else ''
+        return WebsocketCommunicator(
+            self.application,
+            f'/ws/block-diagrams/{pk or self.bd.pk}/?token={token}')
+
+    async def connect(self, user):
+        """Connect as the user, returning the websocket and its snapshot."""
+        communicator = self.communicator(user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, await communicator.receive_json_from()
+
+    def test_refused(self):
+        """Test anonymous users and missing block diagrams are refused."""
+        async def test():
+            for communicator in (
+                    self.communicator(None),
+                    self.communicator(self.user, pk=self.bd.pk + 1)):
+                connected, _ = await communicator.connect()
+                self.assertFalse(connected)
+        async_to_sync(test)()
+
+    def test_edit(self):
+        """Test the owner's edits are saved and passed on."""
+        async def test():
+            owner, snapshot = await self.connect(self.user)
+            self.assertEqual({
+                'type': 'snapshot',
+                'revision': 1,
+                'content': '<xml></xml>',
+                'editable': True,
+            }, snapshot)
+            follower, snapshot = await self.connect(self.other)
+            self.assertFalse(snapshot['editable'])
+
+            operations = [{'start': 5, 'end': 5, 'text': '<block/>'}]
+            await owner.send_json_to({
+                'type': 'edit', 'revision': 1, 'operations': operations})
+            self.assertEqual(
+                {'type': 'ack', 'revision': 2},
+                await owner.receive_json_from())
+            self.assertEqual({
+                'type': 'change', 'revision': 2, 'operations': operations,
+            }, await follower.receive_json_from())
+            self.assertTrue(await owner.receive_nothing())
+
+            await owner.send_json_to({
+                'type': 'edit', 'revision': 1, 'operations': operations})
+            self.assertEqual({
+                'type': 'conflict',
+                'revision': 2,
+                'content': '<xml><block/></xml>',
+            }, await owner.receive_json_from())
+
+            await owner.send_json_to({
+                'type': 'edit', 'revision': 2, 'operations': []})
+            error = await owner.receive_json_from()
+            self.assertEqual('error', error['type'])
+            await owner.send_json_to({'type': 'snapshot'})
+            error = await owner.receive_json_from()
+            self.assertEqual('error', error['type'])
+            await follower.send_json_to({
+                'type': 'edit', 'revision': 2, 'operations': operations})
+            self.assertEqual(
+                'error', (await follower.receive_json_from())['type'])
+
+            await owner.disconnect()
+            await follower.disconnect()
+        async_to_sync(test)()
+
+        self.bd.refresh_from_db()
+        self.assertEqual('<xml><block/></xml>', self.bd.content)
+        self.assertEqual(2, self.bd.revision)
+
+    def test_saved(self):
+        """Test content saved through the API is passed on."""
+        def save():
+            bd = BlockDiagram.objects.get(pk=self.bd.pk)
+            bd.content = '<xml/>'
+            bd.save()
+            live.notify(bd)
+
+        async def test():
+            follower, _ = await self.connect(self.other)
+            await database_sync_to_async(save)()
+            self.assertEqual({
+                'type': 'change', 'revision': 2, 'content': '<xml/>',
+            }, await follower.receive_json_from())
+            await follower.disconnect()
+        async_to_sync(test)()
@@ -0,0 +1,183 @@
+"""Mission Control test live editing."""
+from unittest.mock import patch
+
+from django.core.cache import cache
+from test_plus.test import TestCase
+
+from curriculum.models import Course
+from curriculum.models import Lesson
+from mission_control import autosave
+from mission_control import live
+from mission_control.models import BlockDiagram
+from mission_control.tests.test_blockly import CONTENT
+
+
+class TestApplyOperations(TestCase):
+    """Tests applying the operations of an edit."""
+
+    def test_apply(self):
+        """Test the operations are applied in order."""
+        self.assertEqual('<xml><block/></xml>', live.apply_operations(
+            '<xml></xml>', [{'start': 5, 'end': 5, 'text': '<block/>'}]))
+        self.assertEqual('<a>', live.apply_operations('<xml></xml>', [
+            {'start': 5, 'end': 11, 'text': ''},
+            {'start': 1, 'end': 4, 'text': 'a'},
+        ]))
+
+    def test_utf16(self):
+        """Test offsets count UTF-16 code units, as the browser does."""
+        content = '<xml>\U0001f680é</xml>'
+        self.assertEqual('<xml>\U0001f680é!</xml>', live.apply_operations(
+            content, [{'start': 8, 'end': 8, 'text': '!'}]))
+        self.assertEqual('<xml>\U0001f431</xml>', live.apply_operations(
+            content, [
+                {'start': 5, 'end': 8, 'text': ''},
+                {'start': 5, 'end': 5, 'text': '\U0001f431'},
+            ]))
+        for operations in (
+                [{'start': 6, 'end': 6, 'text': ''}],
+                [{'start': 5, 'end': 6, 'text': ''}],
+                [{'start': 5, 'end': 5, 'text': '\ud83d'}],
+                [{'start': 0, 'end': 15, 'text': ''}]):
+            with self.assertRaises(ValueError):
+                live.apply_operations(content, operations)
+
+    def test_malformed(self):
+        """Test malformed edits are refused."""
+        for operations in (
+                [], {}, None,
+                [{'start': 0, 'end': 0, 'text': ''}] * (
+                    live.MAX_OPERATIONS + 1),
+                [None],
+                [{'start': 0, 'end': 0}],
+                [{'start': '0', 'end': 0, 'text': ''}],
+                [{'start': 0, 'end': True, 'text': ''}],
+                [{'start': 0, 'end': 0, 'text': 1}],
+                [{'start': 2, 'end': 1, 'text': ''}],
+                [{'start': -1, 'end': 1, 'text': ''}],
+                [{'start': 0, 'end': 12, 'text': ''}]):
+            with self.assertRaises(ValueError):
+                live.apply_operations('<xml></xml>', operations)
+
+
+class TestLive(TestCase):
+    """Tests editing block diagrams live."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        cache.clear()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+        # Run the commit hooks now, the test case never commits
+        self.on_commit = patch(
+            'django.db.transaction.on_commit', lambda func: func())
+        self.on_commit.start()
+
+        self.user = self.make_user()
+        self.bd = BlockDiagram.objects.create(
+            user=self.user, name='Program', content='<xml></xml>')
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.on_commit.stop()
+        self.patcher.stop()
+
+    def test_edit(self):
+        """Test edits are saved through the model."""
+        operations = [{'start': 0, 'end': 11, 'text': CONTENT}]
+        bd = live.edit(self.bd.pk, self.user, 1, operations)
+        self.assertEqual(2, bd.revision)
+        self.bd.refresh_from_db()
+        self.assertEqual(CONTENT, self.bd.content)
+        self.assertEqual(2, self.bd.revision)
+        self.assertEqual(4, self.bd.block_count)
+
+        with self.assertRaises(live.EditConflict) as conflict:
+            live.edit(self.bd.pk, self.user, 1, operations)
+        self.assertEqual(2, conflict.exception.revision)
+        self.assertEqual(CONTENT, conflict.exception.content)
+
+        with self.assertRaises(ValueError):
+            live.edit(self.bd.pk, self.user, 2, [])
+
+    def test_edit_not_owner(self):
+        """Test only the owner can edit the block diagram."""
+        other = self.make_user('other')
+        with self.assertRaises(BlockDiagram.DoesNotExist):
+            live.edit(self.bd.pk, other, 1, [
+                {'start': 0, 'end': 0, 'text': ''}])
+
+    def test_edit_autosaved(self):
+        """Test edits apply to, and write, the autosaved content."""
+        bd = BlockDiagram.objects.get(pk=self.bd.pk)
+        autosave.buffer(bd, '<xml/>')
+        bd = live.edit(self.bd.pk, self.user, 2, [
+            {'start': 4, 'end': 4, 'text': ' id="1"'}])
+        self.assertEqual(3, bd.revision)
+
+        bd = live.get_block_diagram(self.bd.pk, 1)
+        self.assertEqual('<xml id="1"/>', bd.content)
+        self.assertEqual(3, bd.revision)
+        self.assertIsNone(bd.autosave_version)
+
+    def test_edit_between_autosaves(self):
+        """Test edits and autosaves interleaved never share a revision."""
+        # The autosave read the block diagram before the edit was saved
+        stale = live.get_block_diagram(self.bd.pk, 1)
+        live.edit(self.bd.pk, self.user, 1, [
+            {'start': 4, 'end': 4, 'text': ' id="1"'}])
+        autosave.buffer(stale, '<xml id="2"></xml>')
+        self.assertEqual(3, stale.revision)
+
+        stale = live.get_block_diagram(self.bd.pk, 1)
+        # The edit's flush is not yet recorded when the autosave reads
+        with patch.object(autosave, 'mark_flushed'):
+            bd = live.edit(self.bd.pk, self.user, 3, [
+                {'start': 4, 'end': 4, 'text': ' id="3"'}])
+        self.assertEqual(4, bd.revision)
+        autosave.buffer(stale, '<xml id="4"></xml>')
+        self.assertEqual(5, stale.revision)
+        self.assertEqual(5, live.get_block_diagram(self.bd.pk, 1).revision)
+
+    def test_get_block_diagram(self):
+        """Test reference solutions are only followed on a high enough tier."""
+        course = Course.objects.create(name='Course')
+        Lesson.objects.create(
+            course=course, reference=self.bd, tier=2, sequence_number=0)
+        with self.assertRaises(BlockDiagram.DoesNotExist):
+            live.get_block_diagram(self.bd.pk, 1)
+        self.assertEqual(self.bd, live.get_block_diagram(self.bd.pk, 2))
+
+    def test_change_message(self):
+        """Test changes carry the operations, or else the content."""
+        self.assertEqual({
+            'type': 'content.changed',
+            'revision': 1,
+            'session': None,
+            'content': '<xml></xml>',
+        }, live.change_message(self.bd))
+        operations = [{'start': 0, 'end': 0, 'text': ''}]
+        self.assertEqual({
+            'type': 'content.changed',
+            'revision': 1,
+            'session': 'session',
+            'operations': operations,
+        }, live.change_message(self.bd, operations, 'session'))
+
+    @patch('mission_control.live.async_to_sync', create=True)
+    @patch('mission_control.live.get_channel_layer')
+    def test_notify(self, get_channel_layer, async_to_sync):
+        """Test the sessions are sent the saved content."""
+        layer = get_channel_layer.return_value
+        live.notify(self.bd)
+        async_to_sync.assert_called_once_with(layer.group_send)
+        async_to_sync.return_value.assert_called_once_with(
+            f'block-diagram-{self.bd.pk}', live.change_message(self.bd))
+
+        async_to_sync.reset_mock()
+        get_channel_layer.return_value = None
+        live.notify(self.bd)
+        self.assertFalse(async_to_sync.called)
@@ -6,6 +6,8 @@ from test_plus.test import TestCase
 from mission_control.models import BlockDiagram
 from mission_control.models import BlockDiagramBlogQuestion
 from mission_control.models import BlogQuestion
+from mission_control.models import Tag
+from mission_control.tests.test_blockly import CONTENT
 
 
 class BaseBlockDiagramTestCase(TestCase):
@@ -44,6 +46,198 @@ class TestBlockDiagram(BaseBlockDiagramTestCase):
         self.assertEqual(self.user.id, BlockDiagram.objects.first().user.id)
 
 
+class TestBlockDiagramContentIndex(BaseBlockDiagramTestCase):
+    """Tests the content index of the block diagram."""
+
+    def test_create(self):
+        """Test the content is indexed when created."""
+        self.assertEqual([], self.bd.block_types)
+        bd = BlockDiagram.objects.create(
+            user=self.user, name='blocks', content=CONTENT)
+        bd = BlockDiagram.objects.get(id=bd.id)
+        self.assertEqual(
+            ['controls_repeat_ext', 'motor_start', 'motor_stop'],
+            bd.block_types)
+        self.assertEqual(2, bd.block_type_counts['motor_start'])
+        self.assertEqual(4, bd.block_count)
+        self.assertEqual(3, bd.block_type_count)
+        self.assertEqual(2, bd.max_depth)
+        self.assertEqual(len(CONTENT), bd.content_size)
+
+    def test_update_fields(self):
+        """Test the content is indexed when saving only the content."""
+        bd = BlockDiagram.objects.get(id=self.bd.id)
+        bd.content = CONTENT
+        bd.save(update_fields=['content'])
+        self.assertEqual(
+            ['controls_repeat_ext', 'motor_start', 'motor_stop'],
+            BlockDiagram.objects.get(id=self.bd.id).block_types)
+
+    def test_unchanged(self):
+        """Test the content is not indexed again when it did not change."""
+        bd = BlockDiagram.objects.get(id=self.bd.id)
+        bd.name = 'renamed'
+        with patch('mission_control.blockly.index_content') as mock_index:
+            bd.save()
+        self.assertFalse(mock_index.called)
+
+    def test_revision(self):
+        """Test a revision is counted each time the content changes."""
+        self.assertEqual(1, self.bd.revision)
+        bd = BlockDiagram.objects.get(id=self.bd.id)
+        bd.name = 'renamed'
+        bd.save()
+        bd.content = CONTENT
+        bd.save(update_fields=['content'])
+        self.assertEqual(2, BlockDiagram.objects.get(id=self.bd.id).revision)
+
+    def test_content_not_checked(self):
+        """Test saving other fields than the name skips the name check."""
+        bd = BlockDiagram.objects.get(id=self.bd.id)
+        bd.content = CONTENT
+        self.mock_post.reset_mock()
+        bd.save(update_fields=['content'])
+        self.assertFalse(self.mock_post.called)
+
+
+class TestBlockDiagramTagNames(BaseBlockDiagramTestCase):
+    """Tests the combined tag names of the block diagram."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.tag1 = Tag.objects.create(name='tag1')
+        self.tag2 = Tag.objects.create(name='tag2')
+
+    def assertTagNames(self, names, bd=None):
+        """Assert the stored and in-memory tag names."""
+        bd = bd or self.bd
+        self.assertEqual(names, bd.tag_names)
+        self.assertEqual(names, BlockDiagram.objects.get(id=bd.id).tag_names)
+
+    def test_add_remove(self):
+        """Test adding and removing tags from either relation."""
+        self.bd.owner_tags.add(self.tag2)
+        self.bd.admin_tags.add(self.tag1, self.tag2)
+        self.assertTagNames(['tag1', 'tag2'])
+        self.assertEqual(2, self.bd.tags.count())
+
+        self.bd.admin_tags.remove(self.tag2)
+        self.assertTagNames(['tag1', 'tag2'])
+
+        self.bd.owner_tags.clear()
+        self.assertTagNames(['tag1'])
+
+    def test_reverse(self):
+        """Test changing the relation from the tag side."""
+        other = BlockDiagram.objects.create(
+            user=self.user, name='other', content='<xml></xml>')
+        self.tag1.owner_block_diagrams.add(self.bd, other)
+        self.assertEqual(
+            ['tag1'], BlockDiagram.objects.get(id=other.id).tag_names)
+
+        self.tag1.owner_block_diagrams.remove(other)
+        self.assertEqual(
+            [], BlockDiagram.objects.get(id=other.id).tag_names)
+
+        self.tag1.owner_block_diagrams.clear()
+        self.assertEqual(
+            [], BlockDiagram.objects.get(id=self.bd.id).tag_names)
+
+    def test_rename_tag(self):
+        """Test renaming a tag."""
+        self.bd.owner_tags.add(self.tag1, self.tag2)
+        self.tag1.name = 'renamed'
+        self.tag1.save()
+        self.tag2.save()
+        self.assertEqual(
+            ['renamed', 'tag2'],
+            BlockDiagram.objects.get(id=self.bd.id).tag_names)
+
+    def test_delete_tag(self):
+        """Test deleting a tag."""
+        self.bd.admin_tags.add(self.tag1, self.tag2)
+        self.tag1.delete()
+        self.assertEqual(
+            ['tag2'], BlockDiagram.objects.get(id=self.bd.id).tag_names)
+
+    def test_copy(self):
+        """Test copies start without tags."""
+        self.bd.owner_tags.add(self.tag1)
+        self.bd.pk = None
+        self.bd.name = 'copy'
+        self.bd.save()
+        self.assertTagNames([])
+
+
+class TestTagCounts(BaseBlockDiagramTestCase):
+    """Tests the usage counts of the tags."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.tag1 = Tag.objects.create(name='tag1')
+        self.tag2 = Tag.objects.create(name='tag2')
+        self.other = BlockDiagram.objects.create(
+            user=self.user, name='other', content='<xml></xml>')
+
+    def assertCounts(self, tag, admin, owner, usage):
+        """Assert the stored counts of the tag."""
+        tag.refresh_from_db()
+        self.assertEqual(
+            (admin, owner, usage),
+            (tag.admin_count, tag.owner_count, tag.usage_count))
+
+    def test_add_remove(self):
+        """Test adding and removing tags from the block diagrams."""
+        self.bd.owner_tags.add(self.tag1, self.tag2)
+        self.bd.admin_tags.add(self.tag1)
+        self.other.owner_tags.add(self.tag1)
+        self.assertCounts(self.tag1, 1, 2, 2)
+        self.assertCounts(self.tag2, 0, 1, 1)
+
+        # Adding existing and removing missing relations changes nothing
+        self.bd.owner_tags.add(self.tag1)
+        self.other.admin_tags.remove(self.tag1)
+        self.assertCounts(self.tag1, 1, 2, 2)
+
+        self.bd.owner_tags.remove(self.tag1)
+        self.assertCounts(self.tag1, 1, 1, 2)
+
+        self.bd.admin_tags.clear()
+        self.assertCounts(self.tag1, 0, 1, 1)
+
+        self.bd.owner_tags.set([self.tag1])
+        self.assertCounts(self.tag1, 0, 2, 2)
+        self.assertCounts(self.tag2, 0, 0, 0)
+
+    def test_reverse(self):
+        """Test changing the relation from the tag side."""
+        self.bd.admin_tags.add(self.tag1)
+        self.tag1.owner_block_diagrams.add(self.bd, self.other)
+        self.assertCounts(self.tag1, 1, 2, 2)
+
+        self.tag1.owner_block_diagrams.remove(self.other)
+        self.assertCounts(self.tag1, 1, 1, 1)
+
+        self.tag1.owner_block_diagrams.clear()
+        self.tag1.admin_block_diagrams.clear()
+        self.assertCounts(self.tag1, 0, 0, 0)
+
+    def test_delete_block_diagram(self):
+        """Test deleting a block diagram stops counting its tags."""
+        self.bd.admin_tags.add(self.tag1)
+        self.bd.owner_tags.add(self.tag1, self.tag2)
+        self.other.owner_tags.add(self.tag2)
+
+        self.bd.delete()
+        self.assertCounts(self.tag1, 0, 0, 0)
+        self.assertCounts(self.tag2, 0, 1, 1)
+
+        self.other.delete()
+        self.assertCounts(self.tag2, 0, 0, 0)
+
+
 class TestBlockDiagramBlogQuestion(BaseBlockDiagramTestCase):
     """Tests the block diagram blog question model."""
 
@@ -0,0 +1,45 @@
+"""Shared cache helpers."""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_version(key):
+    """Get the current version stamp stored at the key, starting one."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_version(key):
+    """Start a new version stamp at the key."""
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def invalidate_version(key):
+    """
+    Start a new version stamp at the key, now and on commit.
+
+    Bumping again once the transaction commits keeps anything rendered from
+    the old rows while the transaction was still open from being served
+    under the new version.
+    """
+    bump_version(key)
+    transaction.on_commit(lambda: bump_version(key))
+
+
+def count(key):
+    """Increment a counter."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def get_counts(*keys):
+    """Get the values of counters."""
+    return [cache.get(key) or 0 for key in keys]
@@ -0,0 +1,176 @@
+"""
+Compression of responses.
+
+Responses are compressed with the encoding the client prefers among those
+available: Brotli and Zstandard when their packages are installed, and
+gzip. Responses marked by cache_compressed keep their compressed bytes in
+the cache, keyed by a digest of the content, so identical responses (e.g.
+the catalog for users without remixes) are only compressed once, and then
+harder than others can afford to be.
+"""
+import gzip
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from rovercode_web.metrics import COMPRESSIONS
+from rovercode_web.metrics import REGISTRY
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Compressed bytes of a content digest in an encoding
+COMPRESSED_KEY = 'compressed:{}:{}'
+
+QUALITY_RE = re.compile(r'(?:^|;)\s*q\s*=\s*([0-9.]+)\s*(?:;|$)')
+
+
+def _compress_br(content, level):
+    """Compress with Brotli."""
+    return brotli.compress(content, quality=level)
+
+
+def _compress_zstd(content, level):
+    """Compress with Zstandard."""
+    return zstandard.ZstdCompressor(level=level).compress(content)
+
+
+def _compress_gzip(content, level):
+    """Compress with gzip."""
+    # Without a timestamp the same content always gives the same bytes
+    return gzip.compress(content, level, mtime=0)
+
+
+# Encoding: (compress, level for each response, level for cached responses),
+# in order of preference
+ENCODINGS = {
+    'br': (_compress_br, 5, 11),
+    'zstd': (_compress_zstd, 3, 19),
+    'gzip': (_compress_gzip, 6, 9),
+}
+
+
+def get_encodings():
+    """Get the encodings whose packages are installed."""
+    modules = {'br': brotli, 'zstd': zstandard, 'gzip': gzip}
+    return [
+        encoding for encoding in ENCODINGS if modules[encoding] is not None]
+
+
+def negotiate(accept_encoding):
+    """
+    Choose an encoding from the request's Accept-Encoding header.
+
+    The client's weights come first, then our preference. Returns None if
+    the client accepts none of the encodings.
+    """
+    weights = {}
+    for coding in accept_encoding.split(','):
+        name, _, parameters = coding.partition(';')
+        match = QUALITY_RE.search(parameters)
+        try:
+            weight = float(match.group(1)) if match else 1.0
+        except ValueError:
+            weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in get_encodings():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(content, encoding, cached=False):
+    """Compress the content, harder if the result is to be cached."""
+    function, level, cached_level = ENCODINGS[encoding]
+    return function(content, cached_level if cached else level)
+
+
+def get_compressed(content, encoding):
+    """
+    Get the content compressed from the cache, or compress and cache it.
+
+    Returns the compressed bytes, and whether they were in the cache.
+    """
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    key = COMPRESSED_KEY.format(encoding, digest)
+    compressed = cache.get(key)
+    if compressed is not None:
+        return compressed, True
+
+    compressed = compress(content, encoding, cached=True)
+    cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+    return compressed, False
+
+
+def cache_compressed(response):
+    """Mark the response's compressed bytes as worth caching."""
+    response.cache_compressed = True
+    return response
+
+
+def is_compressible(response):
+    """Determine if the response is worth compressing."""
+    content_type = response.get('Content-Type', '').split(';')[0].strip()
+    return (
+        not response.streaming and
+        not response.has_header('Content-Encoding') and
+        len(response.content) >= settings.COMPRESSION_MIN_SIZE and
+        content_type.startswith(settings.COMPRESSION_CONTENT_TYPES))
+
+
+class CompressionMiddleware:
+    """
+    Compress responses, as GZipMiddleware does, in the best encoding.
+
+    Only responses of COMPRESSION_MIN_SIZE bytes or more, of the
+    COMPRESSION_CONTENT_TYPES, are compressed. Compressed responses are
+    counted by encoding and whether they came from the cache.
+    """
+
+    def __init__(self, get_response):
+        """Initialize the middleware."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Handle the request, compressing the response."""
+        response = self.get_response(request)
+        if not is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if getattr(response, 'cache_compressed', False):
+            content, hit = get_compressed(response.content, encoding)
+            source = 'hit' if hit else 'miss'
+        else:
+            content = compress(response.content, encoding)
+            source = 'none'
+        if len(content) >= len(response.content):
+            return response
+
+        REGISTRY.inc(COMPRESSIONS, (encoding, source))
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # The bytes differ from the uncompressed response's, so a strong
+        # ETag becomes weak (RFC 7232 2.1), as GZipMiddleware does
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,194 @@
+"""Database routing."""
+import logging
+import random
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db import DatabaseError
+from django.db import DEFAULT_DB_ALIAS
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds between checks of the replication lag of a replica
+LAG_CHECK_INTERVAL = 2
+
+# Seconds since the replica last replayed a transaction, zero when it has
+# replayed everything it received (or it is not a replica at all)
+LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery()
+            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+        THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+# When each replica was last checked, and whether it could be used
+_replica_health = {}
+
+# The raw connection each database connection last finished a request with
+# and when
+_last_used = weakref.WeakKeyDictionary()
+
+
+def start_replica_reads():
+    """Send the following reads to a replica, returning a reset token."""
+    return _replica_reads.set(True)
+
+
+def stop_replica_reads(token):
+    """Go back to reading from wherever reads went before."""
+    _replica_reads.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """Send the reads in the block to a replica."""
+    token = start_replica_reads()
+    try:
+        yield
+    finally:
+        stop_replica_reads(token)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Send the reads in the block to the primary, even inside replica_reads.
+
+    For filling caches tied to a version read from the cache, which a
+    lagging replica could fill with data older than the version.
+    """
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _sticky_key(user):
+    """Get the cache key marking the user as reading from the primary."""
+    return f'db:sticky:{user.pk}'
+
+
+def stick_to_primary(user):
+    """Read from the primary for a while so the user sees their writes."""
+    cache.set(
+        _sticky_key(user), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def is_stuck_to_primary(user):
+    """Determine if the user recently wrote and should read the primary."""
+    return bool(cache.get(_sticky_key(user)))
+
+
+def get_replica_lag(alias):
+    """Get the replication lag of a replica in seconds, None if it is down."""
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+    except DatabaseError:
+        LOGGER.exception('Could not reach replica %s', alias)
+        return None
+
+
+def is_replica_healthy(alias):
+    """Determine if the replica is reachable and caught up."""
+    checked, healthy = _replica_health.get(alias, (None, False))
+    now = time.monotonic()
+    if checked is None or now - checked > LAG_CHECK_INTERVAL:
+        lag = get_replica_lag(alias)
+        healthy = lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG
+        if lag is not None and not healthy:
+            LOGGER.warning('Replica %s is %.1fs behind', alias, lag)
+        _replica_health[alias] = (now, healthy)
+
+    return healthy
+
+
+class ReplicaRouter:
+    """
+    Send reads to a replica inside `replica_reads`, everything else to the
+    primary.
+
+    Replicas that are down or lag more than DATABASE_REPLICA_MAX_LAG seconds
+    are skipped until they are checked again.
+    """
+
+    @staticmethod
+    def db_for_read(model, **hints):
+        """Pick the database to read from."""
+        if not _replica_reads.get():
+            return DEFAULT_DB_ALIAS
+
+        replicas = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if is_replica_healthy(alias)
+        ]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def db_for_write(model, **hints):
+        """Write to the primary, even objects read from a replica."""
+        return DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def allow_relation(obj1, obj2, **hints):
+        """Relate objects from any database, they all hold the same data."""
+        return True
+
+    @staticmethod
+    def allow_migrate(db, app_label, model_name=None, **hints):
+        """Only migrate the primary, the replicas follow it."""
+        return db not in settings.DATABASE_REPLICAS
+
+
+def check_idle_connections():
+    """
+    Close persistent connections that may have gone bad while idle.
+
+    A connection idle for more than DATABASE_CONN_HEALTH_CHECK_IDLE seconds
+    is pinged before it is reused, so a connection dropped by the server or
+    a failover fails here instead of in the middle of the request.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        raw, used = _last_used.get(connection, (None, now))
+        if (connection.connection is not None and
+                raw is connection.connection and
+                now - used > settings.DATABASE_CONN_HEALTH_CHECK_IDLE and
+                not connection.is_usable()):
+            LOGGER.warning('Closing unusable connection to %s',
+                           connection.alias)
+            connection.close()
+
+
+def mark_connections_used():
+    """Remember when the open connections were last used."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            _last_used[connection] = (connection.connection, now)
+
+
+class ConnectionHealthCheckMiddleware:
+    """Check persistent database connections before reusing them."""
+
+    def __init__(self, get_response):
+        """Initialize the middleware."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Check the connections, then handle the request."""
+        check_idle_connections()
+        response = self.get_response(request)
+        mark_connections_used()
+        return response
@@ -0,0 +1,392 @@
+"""Per-request performance metrics."""
+import bisect
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.fields import empty
+
+LOGGER = logging.getLogger(__name__)
+
+TIME_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Name: (help, buckets) of the histograms observed for each view and method
+HISTOGRAMS = {
+    'rovercode_request_duration_seconds': (
+        'Time to respond to a request.', TIME_BUCKETS),
+    'rovercode_request_db_queries': (
+        'Database queries made by a request.', QUERY_BUCKETS),
+    'rovercode_request_db_duration_seconds': (
+        'Time a request spent in database queries.', TIME_BUCKETS),
+    'rovercode_request_http_duration_seconds': (
+        'Time a request spent calling external services.', TIME_BUCKETS),
+    'rovercode_request_serializer_duration_seconds': (
+        'Time a request spent serializing and validating, including any '
+        'queries made while doing so.', TIME_BUCKETS),
+}
+RESPONSES = 'rovercode_responses_total'
+THROTTLES = 'rovercode_throttle_checks_total'
+COMPRESSIONS = 'rovercode_response_compressions_total'
+
+# Name: (help, label names) of the counters
+COUNTERS = {
+    RESPONSES: (
+        'Responses by view, method and status code.',
+        ('view', 'method', 'status')),
+    THROTTLES: (
+        'Requests checked by a throttle, by scope, whether they were '
+        'allowed and where the bucket was kept.',
+        ('scope', 'result', 'store')),
+    COMPRESSIONS: (
+        'Responses compressed, by encoding and whether the compressed bytes '
+        'were cached (hit or miss) or not (none).',
+        ('encoding', 'cache')),
+}
+
+# Metric name for each kind of timing
+TIMING_METRICS = {
+    'db': 'rovercode_request_db_duration_seconds',
+    'http': 'rovercode_request_http_duration_seconds',
+    'serializer': 'rovercode_request_serializer_duration_seconds',
+}
+
+# The file collecting the metrics of processes that have exited
+ARCHIVE = 'archive.json'
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Time spent on each kind of work during a request."""
+
+    def __init__(self):
+        """Start with no time recorded."""
+        self.durations = dict.fromkeys(TIMING_METRICS, 0.0)
+        self.counts = dict.fromkeys(TIMING_METRICS, 0)
+        self.active = set()
+
+    def add(self, name, duration):
+        """Record time spent on a kind of work."""
+        self.durations[name] += duration
+        self.counts[name] += 1
+
+    def execute(self, execute, sql, params, many, context):
+        """Time a database query (a connection execute wrapper)."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - start)
+
+    def server_timing(self, total):
+        """Describe the timings in a Server-Timing header."""
+        return ', '.join([
+            f'db;dur={self.durations["db"] * 1000:.1f};'
+            f'desc="{self.counts["db"]} queries"',
+            f'http;dur={self.durations["http"] * 1000:.1f}',
+            f'serializer;dur={self.durations["serializer"] * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+@contextmanager
+def timing(name):
+    """
+    Count the time spent in the block towards the current request.
+
+    Blocks of the same kind nested inside each other count once.
+    """
+    timings = _current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+
+    timings.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+        timings.active.discard(name)
+
+
+class TimedSerializerMixin:
+    """Count serializing and validating towards the request's timings."""
+
+    def to_representation(self, instance):
+        """Serialize the instance."""
+        with timing('serializer'):
+            return super().to_representation(instance)
+
+    def run_validation(self, data=empty):
+        """Validate the data."""
+        with timing('serializer'):
+            return super().run_validation(data)
+
+
+class Registry:
+    """Labelled histograms and counters."""
+
+    def __init__(self):
+        """Start with nothing observed."""
+        self.lock = threading.Lock()
+        # (name, labels): [count in each bucket..., sum, count]
+        self.histograms = {}
+        # (name, labels): count
+        self.counters = defaultdict(int)
+
+    def observe(self, name, labels, value):
+        """Add a value to a histogram."""
+        buckets = HISTOGRAMS[name][1]
+        index = bisect.bisect_left(buckets, value)
+        with self.lock:
+            values = self.histograms.get((name, labels))
+            if values is None:
+                values = self.histograms[(name, labels)] = (
+                    [0] * (len(buckets) + 3))
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def inc(self, name, labels):
+        """Increment a counter."""
+        with self.lock:
+            self.counters[(name, labels)] += 1
+
+    def snapshot(self):
+        """Copy the values out, in a form that can be stored as JSON."""
+        with self.lock:
+            return {
+                'histograms': [
+                    [name, list(labels), list(values)]
+                    for (name, labels), values in self.histograms.items()
+                ],
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+            }
+
+
+def merge(snapshots):
+    """Add up snapshots from several registries."""
+    histograms = {}
+    counters = defaultdict(int)
+    for snapshot in snapshots:
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(labels))
+            if key in histograms:
+                histograms[key] = [
+                    a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(labels))] += value
+
+    return {
+        'histograms': [
+            [name, list(labels), values]
+            for (name, labels), values in histograms.items()
+        ],
+        'counters': [
+            [name, list(labels), value]
+            for (name, labels), value in counters.items()
+        ],
+    }
+
+
+def _format_labels(names, values, extra=''):
+    """Format Prometheus labels."""
+    labels = [
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}'
+
+
+def render(snapshot):
+    """Render a snapshot in the Prometheus text format."""
+    lines = []
+    histograms = defaultdict(list)
+    for name, labels, values in snapshot['histograms']:
+        histograms[name].append((labels, values))
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for labels, values in sorted(histograms[name]):
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), values):
+                cumulative += count
+                label_text = _format_labels(
+                    ('view', 'method'), labels, f'le="{bound}"')
+                lines.append(f'{name}_bucket{label_text} {cumulative}')
+            label_text = _format_labels(('view', 'method'), labels)
+            lines.append(f'{name}_sum{label_text} {float(values[-2])!r}')
+            lines.append(f'{name}_count{label_text} {values[-1]}')
+
+    counters = defaultdict(list)
+    for name, labels, value in snapshot['counters']:
+        counters[name].append((labels, value))
+    for name, (help_text, label_names) in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for labels, value in sorted(counters[name]):
+            label_text = _format_labels(label_names, labels)
+            lines.append(f'{name}{label_text} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+_last_flush = time.monotonic()
+
+
+def _read_snapshot(path):
+    """Read a stored snapshot, or None if it is gone or partly written."""
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    """Store a snapshot, replacing the file in one step."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(temporary, path)
+
+
+def _is_running(pid):
+    """Determine if a process is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush():
+    """Store this process's metrics in METRICS_DIR for the exporter."""
+    global _last_flush  # pylint: disable=global-statement
+    _last_flush = time.monotonic()
+    if not settings.METRICS_DIR:
+        return
+    try:
+        _write_snapshot(
+            os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json'),
+            REGISTRY.snapshot())
+    except OSError:
+        LOGGER.exception(
+            'Could not store the metrics in %s', settings.METRICS_DIR)
+
+
+def collect():
+    """
+    Collect the metrics of every process sharing METRICS_DIR.
+
+    The metrics of processes that have exited (e.g. recycled workers) are
+    folded into one archive, so the totals keep counting up.
+    """
+    snapshots = [REGISTRY.snapshot()]
+    if not settings.METRICS_DIR:
+        return snapshots[0]
+
+    directory = settings.METRICS_DIR
+    try:
+        os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, '.lock'), 'w')
+    except OSError:
+        LOGGER.exception('Could not collect the metrics in %s', directory)
+        return snapshots[0]
+
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, ARCHIVE)
+        archived = [_read_snapshot(archive_path) or merge([])]
+        exited = []
+        for filename in os.listdir(directory):
+            pid, extension = os.path.splitext(filename)
+            if extension != '.json' or not pid.isdigit():
+                continue
+            if int(pid) == os.getpid():
+                # This process's own metrics are fresher in memory
+                continue
+
+            path = os.path.join(directory, filename)
+            snapshot = _read_snapshot(path)
+            if snapshot is None:
+                continue
+            if _is_running(int(pid)):
+                snapshots.append(snapshot)
+            else:
+                archived.append(snapshot)
+                exited.append(path)
+
+        if exited:
+            _write_snapshot(archive_path, merge(archived))
+            for path in exited:
+                os.remove(path)
+
+    return merge(snapshots + archived)
+
+
+class PerformanceMiddleware:
+    """
+    Time each request and record the timings by view.
+
+    The database, external service and serializer time, and the query
+    count, are sent back in a Server-Timing header and added to REGISTRY.
+    """
+
+    def __init__(self, get_response):
+        """Initialize the middleware."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Handle the request, timing it."""
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = timings.server_timing(total)
+
+        match = request.resolver_match
+        labels = (match.view_name if match else 'unresolved', request.method)
+        REGISTRY.observe('rovercode_request_duration_seconds', labels, total)
+        REGISTRY.observe(
+            'rovercode_request_db_queries', labels, timings.counts['db'])
+        for name, metric in TIMING_METRICS.items():
+            REGISTRY.observe(metric, labels, timings.durations[name])
+        REGISTRY.inc(RESPONSES, labels + (response.status_code,))
+
+        if time.monotonic() - _last_flush > settings.METRICS_FLUSH_INTERVAL:
+            flush()
+
+        return response
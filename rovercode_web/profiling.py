@@ -0,0 +1,272 @@
+"""
+Sampling profiler for selected requests.
+
+Profiling is off in gevent workers. Their requests are greenlets sharing
+one OS thread, so the stack sampled by thread would be whichever greenlet
+happens to be running, and the sampler would itself be a greenlet that
+only runs when the request yields. Use the sync or gthread workers to
+profile.
+"""
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    from gevent import monkey
+except ImportError:  # pragma: no cover
+    monkey = None
+
+# Header asking for a request to be profiled, holding PROFILER_TOKEN
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+# The number of requests being profiled
+_active = 0
+_active_lock = threading.Lock()
+_frame_names = {}
+
+
+def is_supported():
+    """Determine if requests can be profiled, i.e. not under gevent."""
+    return monkey is None or not monkey.is_module_patched('threading')
+
+
+def _start_profiling():
+    """Count a request as being profiled, unless too many already are."""
+    global _active  # pylint: disable=global-statement
+    if not is_supported():
+        return False
+    with _active_lock:
+        if _active >= settings.PROFILER_MAX_ACTIVE:
+            return False
+        _active += 1
+        return True
+
+
+def _stop_profiling():
+    """Count a request as no longer being profiled."""
+    global _active  # pylint: disable=global-statement
+    with _active_lock:
+        _active -= 1
+
+
+def frame_name(code):
+    """Name a function as 'path/to/module.py:function:first line'."""
+    name = _frame_names.get(code)
+    if name is None:
+        filename = code.co_filename
+        # Shorten paths to the longest import path they are under
+        for path in sorted(sys.path, key=len, reverse=True):
+            if path and filename.startswith(path + os.sep):
+                filename = filename[len(path) + 1:]
+                break
+        name = _frame_names[code] = (
+            f'{filename}:{code.co_name}:{code.co_firstlineno}')
+
+    return name
+
+
+class Sampler:
+    """Sample the stack of a thread at an interval."""
+
+    def __init__(self, thread_id, interval):
+        """Prepare to sample the thread."""
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        self._stopped.set()
+        self._thread.join()
+
+    def sample(self):
+        """Record the current stack of the thread."""
+        frame = sys._current_frames().get(  # pylint: disable=protected-access
+            self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(frame_name(frame.f_code))
+            frame = frame.f_back
+        if stack:
+            self.samples[tuple(reversed(stack))] += 1
+
+    def _run(self):
+        """Sample until stopped."""
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+
+def should_profile(request, view_name):
+    """
+    Decide whether to profile the request.
+
+    A request is profiled when it carries PROFILER_TOKEN in the X-Profile
+    header, or at random at the view's rate in PROFILER_SAMPLE_RATES.
+    """
+    token = request.META.get(PROFILE_HEADER)
+    if token and settings.PROFILER_TOKEN:
+        return hmac.compare_digest(
+            token.encode(), settings.PROFILER_TOKEN.encode())
+
+    rate = settings.PROFILER_SAMPLE_RATES.get(view_name, 0)
+    return rate > 0 and random.random() < rate
+
+
+@contextmanager
+def profile(request, view_name):
+    """
+    Profile the block, saving the profile when it exits.
+
+    Yields the profile's id, or None when PROFILER_MAX_ACTIVE requests are
+    already being profiled, or under gevent, and this one is not.
+    """
+    if not _start_profiling():
+        yield None
+        return
+
+    profile_id = uuid.uuid4().hex
+    started = timezone.now()
+    sampler = Sampler(threading.get_ident(), settings.PROFILER_INTERVAL)
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield profile_id
+    finally:
+        sampler.stop()
+        _stop_profiling()
+        save_profile({
+            'id': profile_id,
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'started': started.isoformat(),
+            'duration': time.perf_counter() - start,
+            'interval': settings.PROFILER_INTERVAL,
+            'samples': [
+                [list(stack), count]
+                for stack, count in sampler.samples.most_common()
+            ],
+        })
+
+
+def _profile_paths():
+    """List the stored profiles, oldest first."""
+    try:
+        filenames = os.listdir(settings.PROFILER_DIR)
+    except FileNotFoundError:
+        return []
+
+    return [
+        os.path.join(settings.PROFILER_DIR, filename)
+        for filename in sorted(filenames)
+        if filename.endswith('.json')
+    ]
+
+
+def save_profile(data):
+    """Store a profile, dropping the oldest beyond PROFILER_BUFFER_SIZE."""
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    # Named so they sort oldest first
+    path = os.path.join(
+        settings.PROFILER_DIR, f'{time.time_ns():020d}-{data["id"]}.json')
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(data, file)
+    os.replace(f'{path}.tmp', path)
+
+    for old_path in _profile_paths()[:-settings.PROFILER_BUFFER_SIZE]:
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles():
+    """Describe the stored profiles, newest first."""
+    profiles = []
+    for path in reversed(_profile_paths()):
+        data = _read_profile(path)
+        if data is not None:
+            data['sample_count'] = sum(
+                count for _, count in data.pop('samples'))
+            profiles.append(data)
+
+    return profiles
+
+
+def _read_profile(path):
+    """Read a stored profile, or None if it has since been dropped."""
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def get_profile(profile_id):
+    """Get a stored profile by id, or None."""
+    for path in _profile_paths():
+        if path.endswith(f'-{profile_id}.json'):
+            return _read_profile(path)
+
+    return None
+
+
+def to_collapsed(data):
+    """Convert a profile to collapsed stacks, as used by flamegraph.pl."""
+    return ''.join(
+        '{} {}\n'.format(';'.join(stack), count)
+        for stack, count in data['samples'])
+
+
+def to_speedscope(data):
+    """Convert a profile to the speedscope file format."""
+    frames = []
+    indexes = {}
+    samples = []
+    weights = []
+    for stack, count in data['samples']:
+        sample = []
+        for name in stack:
+            if name not in indexes:
+                indexes[name] = len(frames)
+                filename, function, line = name.rsplit(':', 2)
+                frames.append(
+                    {'name': function, 'file': filename, 'line': int(line)})
+            sample.append(indexes[name])
+        samples.append(sample)
+        weights.append(count * data['interval'])
+
+    name = f'{data["method"]} {data["path"]} ({data["view"]})'
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'rovercode-web',
+        'activeProfileIndex': 0,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': data['duration'],
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
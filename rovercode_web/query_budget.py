@@ -0,0 +1,129 @@
+"""Query budgets for API views."""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from rovercode_web.db import LAG_SQL
+
+LOGGER = logging.getLogger(__name__)
+
+# Transaction control depends on how the request is run (e.g. inside a
+# test's transaction) rather than on the view, so it is not counted, and
+# nor are the replica lag checks made every few seconds
+TRANSACTION_CONTROL = re.compile(
+    r'\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b',
+    re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    """A view made more queries than its budget allows."""
+
+
+class QueryRecorder:
+    """Record the SQL of database queries (a connection execute wrapper)."""
+
+    def __init__(self):
+        """Start with no queries recorded."""
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """Record the query."""
+        if sql != LAG_SQL and not TRANSACTION_CONTROL.match(sql):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def record_queries():
+    """Record the queries made on any connection, yielding their SQL."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder.queries
+
+
+def describe_queries(queries):
+    """List the queries, most repeated first as repeats point to an N+1."""
+    return '\n'.join(
+        f'  {count} x {sql}' for sql, count in Counter(queries).most_common())
+
+
+def get_budget(request):
+    """
+    Get the query budget of the view that handled the request.
+
+    Views declare their budgets in a query_budgets dict, keyed by the
+    viewset action, or by the lowercase method for other views. Returns the
+    view's name and the budget, or None if it has none.
+    """
+    match = request.resolver_match
+    view = match.func if match else None
+    view_class = getattr(view, 'cls', None)
+    budgets = getattr(view_class, 'query_budgets', None)
+    if not budgets:
+        return None
+
+    method = request.method.lower()
+    action = (getattr(view, 'actions', None) or {}).get(method, method)
+    if action not in budgets:
+        return None
+    return f'{view_class.__name__}.{action}', budgets[action]
+
+
+def assert_constant_queries(request, grow, sizes=(1, 2, 5)):
+    """
+    Check a request makes as many queries however much data there is.
+
+    grow(count) adds count more of the rows the request returns, before the
+    request is made at each of the sizes.
+    """
+    counts = []
+    size = 0
+    for new_size in sizes:
+        grow(new_size - size)
+        size = new_size
+        with record_queries() as queries:
+            request()
+        counts.append(len(queries))
+
+    if len(set(counts)) > 1:
+        raise AssertionError(
+            f'The queries grew with the data: {counts} queries for '
+            f'{list(sizes)} rows. At {size} rows:\n'
+            + describe_queries(queries))
+
+
+class QueryBudgetMiddleware:
+    """
+    Check views stay within their query budgets.
+
+    Meant for the test and development settings. When a view goes over its
+    budget, QueryBudgetExceeded is raised if QUERY_BUDGET_EXCEEDED is
+    'raise', or else a warning is logged, along with the queries made.
+    """
+
+    def __init__(self, get_response):
+        """Initialize the middleware."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Handle the request, counting its queries."""
+        with record_queries() as queries:
+            response = self.get_response(request)
+
+        budget = get_budget(request)
+        if budget is not None and len(queries) > budget[1]:
+            message = (
+                f'{budget[0]} made {len(queries)} queries, over its budget '
+                f'of {budget[1]}:\n{describe_queries(queries)}')
+            if settings.QUERY_BUDGET_EXCEEDED == 'raise':
+                raise QueryBudgetExceeded(message)
+            LOGGER.warning(message)
+
+        return response
@@ -0,0 +1 @@
+"""Rovercode Web tests."""
@@ -0,0 +1,225 @@
+"""Rovercode Web test response compression."""
+import gzip
+import hashlib
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.test import APIClient
+from test_plus.test import TestCase
+
+from curriculum.models import Course
+from curriculum.models import Lesson
+from mission_control.models import BlockDiagram
+from mission_control.models import Tag
+from rovercode_web import compression
+from rovercode_web.compression import CompressionMiddleware
+from rovercode_web.metrics import COMPRESSIONS
+from rovercode_web.metrics import REGISTRY
+
+User = get_user_model()
+
+CONTENT = b'{"content": "<xml></xml>"}' * 100
+
+
+def installed(**modules):
+    """Pretend the compression packages are installed."""
+    codecs = {
+        'brotli': Mock(**{'compress.return_value': b'br'}),
+        'zstandard': Mock(**{
+            'ZstdCompressor.return_value.compress.return_value': b'zstd'}),
+    }
+    return patch.multiple(compression, **{
+        name: codec if not modules or name in modules else None
+        for name, codec in codecs.items()})
+
+
+class TestNegotiate(TestCase):
+    """Tests choosing the encoding."""
+
+    def test_installed(self):
+        """Test the best encoding the client accepts is chosen."""
+        with installed():
+            self.assertEqual(
+                ['br', 'zstd', 'gzip'], compression.get_encodings())
+            self.assertEqual('br', compression.negotiate(
+                'gzip, deflate, br, zstd'))
+            self.assertEqual('zstd', compression.negotiate(
+                'gzip;q=0.5, br;q=0.8, zstd'))
+            self.assertEqual('zstd', compression.negotiate('*, br;q=0'))
+        with installed(zstandard=True):
+            self.assertEqual(
+                ['zstd', 'gzip'], compression.get_encodings())
+
+    @patch.multiple(compression, brotli=None, zstandard=None)
+    def test_gzip(self):
+        """Test gzip is used without the other packages."""
+        self.assertEqual(['gzip'], compression.get_encodings())
+        self.assertEqual('gzip', compression.negotiate('GZIP, br'))
+        self.assertEqual('gzip', compression.negotiate('*'))
+        self.assertEqual('gzip', compression.negotiate('gzip; q = 0.1'))
+
+    def test_not_accepted(self):
+        """Test responses are not compressed for other clients."""
+        for accept_encoding in (
+                '', 'identity', 'deflate', 'gzip;q=0', 'gzip;q=0.0.1',
+                '*;q=0'):
+            self.assertIsNone(compression.negotiate(accept_encoding))
+
+
+class TestCompress(TestCase):
+    """Tests compressing content."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        cache.clear()
+
+    def test_compress(self):
+        """Test content compresses to the same bytes each time."""
+        compressed = compression.compress(CONTENT, 'gzip')
+        self.assertEqual(CONTENT, gzip.decompress(compressed))
+        self.assertEqual(compressed, compression.compress(CONTENT, 'gzip'))
+        with installed():
+            self.assertEqual(b'br', compression.compress(CONTENT, 'br'))
+            compression.brotli.compress.assert_called_with(
+                CONTENT, quality=5)
+            self.assertEqual(
+                b'zstd', compression.compress(CONTENT, 'zstd', cached=True))
+            compression.zstandard.ZstdCompressor.assert_called_with(level=19)
+
+    def test_get_compressed(self):
+        """Test content is compressed once for the cache."""
+        with patch.object(
+                compression, 'compress', return_value=b'gz') as compress:
+            self.assertEqual(
+                (b'gz', False), compression.get_compressed(CONTENT, 'gzip'))
+            self.assertEqual(
+                (b'gz', True), compression.get_compressed(CONTENT, 'gzip'))
+            compress.assert_called_once_with(CONTENT, 'gzip', cached=True)
+
+
+class TestCompressionMiddleware(TestCase):
+    """Tests compressing responses."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        cache.clear()
+        self.request = RequestFactory().get(
+            '/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+    def respond(self, response, request=None):
+        """Pass a response through the middleware."""
+        return CompressionMiddleware(lambda request: response)(
+            request or self.request)
+
+    def test_compressed(self):
+        """Test large enough responses are compressed."""
+        labels = (COMPRESSIONS, ('gzip', 'none'))
+        count = REGISTRY.counters[labels]
+        response = HttpResponse(CONTENT, content_type='application/json')
+        response['ETag'] = '"1"'
+        response = self.respond(response)
+        self.assertEqual(CONTENT, gzip.decompress(response.content))
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual(
+            str(len(response.content)), response['Content-Length'])
+        self.assertEqual('Accept-Encoding', response['Vary'])
+        self.assertEqual('W/"1"', response['ETag'])
+        self.assertEqual(count + 1, REGISTRY.counters[labels])
+
+    def test_cached(self):
+        """Test marked responses are compressed from the cache."""
+        miss = REGISTRY.counters[(COMPRESSIONS, ('gzip', 'miss'))]
+        hit = REGISTRY.counters[(COMPRESSIONS, ('gzip', 'hit'))]
+        for _ in range(2):
+            response = self.respond(compression.cache_compressed(
+                HttpResponse(CONTENT, content_type='text/html')))
+            self.assertEqual(CONTENT, gzip.decompress(response.content))
+        self.assertEqual(
+            miss + 1, REGISTRY.counters[(COMPRESSIONS, ('gzip', 'miss'))])
+        self.assertEqual(
+            hit + 1, REGISTRY.counters[(COMPRESSIONS, ('gzip', 'hit'))])
+
+    def test_not_compressed(self):
+        """Test other responses are left alone."""
+        encoded = HttpResponse(CONTENT, content_type='application/json')
+        encoded['Content-Encoding'] = 'br'
+        for response in (
+                HttpResponse(CONTENT[:1023], content_type='application/json'),
+                HttpResponse(CONTENT, content_type='image/png'),
+                StreamingHttpResponse(
+                    [CONTENT], content_type='application/json'),
+                encoded):
+            response = self.respond(response)
+            self.assertFalse(response.has_header('Vary'))
+            self.assertNotEqual('gzip', response.get('Content-Encoding'))
+
+    def test_not_accepted(self):
+        """Test responses are sent as they are to other clients."""
+        response = self.respond(
+            HttpResponse(CONTENT, content_type='application/json'),
+            RequestFactory().get('/'))
+        self.assertEqual(CONTENT, response.content)
+        self.assertEqual('Accept-Encoding', response['Vary'])
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_incompressible(self):
+        """Test responses are sent as they are if compressing grows them."""
+        content = b''.join(
+            hashlib.sha256(bytes([n])).digest() for n in range(64))
+        response = self.respond(HttpResponse(content, content_type='text/csv'))
+        self.assertEqual(content, response.content)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class TestCompressedViews(TestCase):
+    """Tests the catalog and tag responses are compressed from the cache."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        cache.clear()
+        post_save.disconnect(
+            sender=settings.AUTH_USER_MODEL, dispatch_uid='new_user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user(), token={'tier': 1})
+        Tag.objects.bulk_create([Tag(name=f'tag{n}') for n in range(100)])
+
+    def test_tags(self):
+        """Test the tag list is compressed once."""
+        labels = (COMPRESSIONS, ('gzip', 'hit'))
+        hit = REGISTRY.counters[labels]
+        for _ in range(2):
+            response = self.client.get(
+                reverse('api:v1:tag-list'), HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual('gzip', response['Content-Encoding'])
+            self.assertIn(b'tag99', gzip.decompress(response.content))
+        self.assertEqual(hit + 1, REGISTRY.counters[labels])
+
+        # The weak ETag still matches
+        response = self.client.get(
+            reverse('api:v1:tag-list'), HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, response.status_code)
+
+    def test_catalog(self):
+        """Test the course catalog is marked for caching without remixes."""
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertTrue(response.cache_compressed)
+
+        user = User.objects.get()
+        course = Course.objects.create(name='Course')
+        lesson = Lesson.objects.create(
+            course=course, sequence_number=1,
+            reference=BlockDiagram.objects.create(
+                user=user, name='Reference', content='<xml></xml>'))
+        BlockDiagram.objects.create(
+            user=user, name='Remix', content='<xml></xml>', lesson=lesson)
+        response = self.client.get(reverse('api:v1:course-list'))
+        self.assertFalse(getattr(response, 'cache_compressed', False))
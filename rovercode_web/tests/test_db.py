@@ -0,0 +1,44 @@
+"""Rovercode Web test database helpers."""
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import override_settings
+from test_plus.test import TestCase
+
+from rovercode_web.db import check_idle_connections
+from rovercode_web.db import mark_connections_used
+
+
+class TestConnectionHealthCheck(TestCase):
+    """Tests checking persistent connections before reuse."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        connection.ensure_connection()
+        mark_connections_used()
+
+    @patch.object(connection, 'close')
+    @patch.object(connection, 'is_usable', return_value=False)
+    def test_recently_used(self, mock_is_usable, mock_close):
+        """Test recently used connections are not checked."""
+        check_idle_connections()
+        self.assertFalse(mock_is_usable.called)
+        self.assertFalse(mock_close.called)
+
+    @override_settings(DATABASE_CONN_HEALTH_CHECK_IDLE=-1)
+    @patch.object(connection, 'close')
+    @patch.object(connection, 'is_usable', return_value=True)
+    def test_idle_usable(self, mock_is_usable, mock_close):
+        """Test idle connections that still work are kept."""
+        check_idle_connections()
+        self.assertTrue(mock_is_usable.called)
+        self.assertFalse(mock_close.called)
+
+    @override_settings(DATABASE_CONN_HEALTH_CHECK_IDLE=-1)
+    @patch.object(connection, 'close')
+    @patch.object(connection, 'is_usable', return_value=False)
+    def test_idle_unusable(self, mock_is_usable, mock_close):
+        """Test idle connections that stopped working are closed."""
+        check_idle_connections()
+        self.assertTrue(mock_close.called)
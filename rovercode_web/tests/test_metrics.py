@@ -0,0 +1,282 @@
+"""Rovercode Web test request metrics."""
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import override_settings
+from django.test import RequestFactory
+from django.urls import resolve
+from test_plus.test import TestCase
+
+from rovercode_web import metrics
+from rovercode_web.metrics import collect
+from rovercode_web.metrics import flush
+from rovercode_web.metrics import PerformanceMiddleware
+from rovercode_web.metrics import Registry
+from rovercode_web.metrics import render
+from rovercode_web.metrics import timing
+
+User = get_user_model()
+
+
+def get_response(request):
+    """Do a bit of each kind of work."""
+    User.objects.count()
+    User.objects.count()
+    with timing('http'):
+        pass
+    with timing('serializer'):
+        with timing('serializer'):
+            pass
+    return HttpResponse()
+
+
+class TestPerformanceMiddleware(TestCase):
+    """Tests timing requests."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.registry = Registry()
+        patcher = patch.object(metrics, 'REGISTRY', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.request = RequestFactory().get('/metrics/')
+        self.request.resolver_match = resolve('/metrics/')
+
+    def test_server_timing(self):
+        """Test the timings are sent in a header."""
+        response = PerformanceMiddleware(get_response)(self.request)
+        entries = [
+            entry.split(';')[0]
+            for entry in response['Server-Timing'].split(', ')
+        ]
+        self.assertEqual(['db', 'http', 'serializer', 'total'], entries)
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_no_server_timing(self):
+        """Test the header can be turned off."""
+        response = PerformanceMiddleware(get_response)(self.request)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_registry(self):
+        """Test the timings are recorded by view."""
+        middleware = PerformanceMiddleware(get_response)
+        middleware(self.request)
+        middleware(self.request)
+        self.request.resolver_match = None
+        middleware(self.request)
+
+        snapshot = self.registry.snapshot()
+        histograms = {
+            (name, tuple(labels)): values
+            for name, labels, values in snapshot['histograms']
+        }
+        labels = ('metrics', 'GET')
+        # Two requests, with two queries each
+        queries = histograms[('rovercode_request_db_queries', labels)]
+        self.assertEqual(2, queries[-1])
+        self.assertEqual(4, queries[-2])
+        self.assertEqual(2, queries[2])
+        # Nested serializer timing counts once
+        self.assertEqual(2, histograms[(
+            'rovercode_request_serializer_duration_seconds', labels)][-1])
+        self.assertIn(
+            ('rovercode_request_duration_seconds', ('unresolved', 'GET')),
+            histograms)
+        self.assertEqual(
+            [['rovercode_responses_total', ['metrics', 'GET', 200], 2],
+             ['rovercode_responses_total', ['unresolved', 'GET', 200], 1]],
+            sorted(snapshot['counters']))
+
+    def test_timing_outside_request(self):
+        """Test timing outside a request does nothing."""
+        with timing('http'):
+            pass
+
+    def test_flush(self):
+        """Test the metrics are stored once the flush interval passes."""
+        # Start the interval now, however long the tests have run
+        interval_start = patch.object(
+            metrics, '_last_flush', time.monotonic())
+        with interval_start, tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_DIR=directory):
+                PerformanceMiddleware(get_response)(self.request)
+                self.assertEqual([], os.listdir(directory))
+
+                with override_settings(METRICS_FLUSH_INTERVAL=-1):
+                    PerformanceMiddleware(get_response)(self.request)
+                self.assertEqual(
+                    [f'{os.getpid()}.json'], os.listdir(directory))
+
+    def test_flush_directory(self):
+        """Test the metrics directory is made, and failing never fails."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics')
+            with override_settings(METRICS_DIR=path):
+                flush()
+            self.assertEqual([f'{os.getpid()}.json'], os.listdir(path))
+
+            # A file is in the way
+            path = os.path.join(path, f'{os.getpid()}.json', 'metrics')
+            with override_settings(
+                    METRICS_DIR=path, METRICS_FLUSH_INTERVAL=-1):
+                with self.assertLogs('rovercode_web.metrics', 'ERROR'):
+                    response = PerformanceMiddleware(get_response)(
+                        self.request)
+            self.assertEqual(200, response.status_code)
+
+
+class TestCollect(TestCase):
+    """Tests collecting the metrics of several processes."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.registry = Registry()
+        self.registry.observe(
+            'rovercode_request_duration_seconds', ('view', 'GET'), 0.2)
+        self.registry.inc('rovercode_responses_total', ('view', 'GET', 200))
+        patcher = patch.object(metrics, 'REGISTRY', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        temporary = tempfile.TemporaryDirectory()
+        self.directory = temporary.name
+        self.addCleanup(temporary.cleanup)
+        settings_override = override_settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write(self, filename, content):
+        """Write a file to the metrics directory."""
+        with open(os.path.join(self.directory, filename), 'w') as file:
+            file.write(content)
+
+    @override_settings(METRICS_DIR='')
+    def test_single_process(self):
+        """Test collecting without a metrics directory."""
+        self.assertEqual(self.registry.snapshot(), collect())
+
+    def test_collect(self):
+        """Test collecting from running and exited processes."""
+        flush()
+        snapshot = json.dumps(self.registry.snapshot())
+        # Running, this process's parent
+        self.write(f'{os.getppid()}.json', snapshot)
+        # Exited
+        self.write('999999999.json', snapshot)
+        # Partly written, or not snapshots at all
+        self.write('999999998.json', '{')
+        self.write('999999997.json.1.tmp', snapshot)
+        self.write('notes.txt', 'notes')
+
+        with patch.object(metrics, '_is_running',
+                          side_effect=lambda pid: pid != 999999999):
+            collected = collect()
+            self.assertFalse(os.path.exists(
+                os.path.join(self.directory, '999999999.json')))
+            self.assertEqual(collected, collect())
+
+        name, labels, values = collected['histograms'][0]
+        self.assertEqual('rovercode_request_duration_seconds', name)
+        self.assertEqual(['view', 'GET'], labels)
+        self.assertEqual(3, values[-1])
+        self.assertEqual(
+            [['rovercode_responses_total', ['view', 'GET', 200], 3]],
+            collected['counters'])
+
+    def test_collect_directory(self):
+        """Test the metrics directory is made, or else skipped."""
+        path = os.path.join(self.directory, 'metrics')
+        with override_settings(METRICS_DIR=path):
+            self.assertEqual(self.registry.snapshot(), collect())
+        self.assertEqual(['.lock'], os.listdir(path))
+
+        path = os.path.join(path, '.lock', 'metrics')
+        with override_settings(METRICS_DIR=path):
+            with self.assertLogs('rovercode_web.metrics', 'ERROR'):
+                self.assertEqual(self.registry.snapshot(), collect())
+
+    def test_is_running(self):
+        """Test checking for running processes."""
+        self.assertTrue(metrics._is_running(os.getpid()))
+        self.assertFalse(metrics._is_running(999999999))
+        with patch('os.kill', side_effect=PermissionError):
+            self.assertTrue(metrics._is_running(1))
+
+
+class TestRender(TestCase):
+    """Tests rendering metrics for Prometheus."""
+
+    def test_render(self):
+        """Test rendering histograms and counters."""
+        registry = Registry()
+        labels = ('a "quoted"\\view\n', 'GET')
+        registry.observe('rovercode_request_duration_seconds', labels, 0.02)
+        registry.observe('rovercode_request_duration_seconds', labels, 20)
+        registry.inc('rovercode_responses_total', labels + (200,))
+        registry.inc(
+            'rovercode_throttle_checks_total', ('save', 'allowed', 'local'))
+
+        lines = render(registry.snapshot()).splitlines()
+        label_text = 'view="a \\"quoted\\"\\\\view\\n",method="GET"'
+        self.assertIn(
+            '# TYPE rovercode_request_duration_seconds histogram', lines)
+        self.assertIn(
+            'rovercode_request_duration_seconds_bucket'
+            f'{{{label_text},le="0.01"}} 0', lines)
+        self.assertIn(
+            'rovercode_request_duration_seconds_bucket'
+            f'{{{label_text},le="0.025"}} 1', lines)
+        self.assertIn(
+            'rovercode_request_duration_seconds_bucket'
+            f'{{{label_text},le="+Inf"}} 2', lines)
+        self.assertIn(
+            f'rovercode_request_duration_seconds_sum{{{label_text}}} 20.02',
+            lines)
+        self.assertIn(
+            f'rovercode_request_duration_seconds_count{{{label_text}}} 2',
+            lines)
+        self.assertIn(
+            f'rovercode_responses_total{{{label_text},status="200"}} 1',
+            lines)
+        self.assertIn(
+            'rovercode_throttle_checks_total'
+            '{scope="save",result="allowed",store="local"} 1', lines)
+
+
+class TestMetricsView(TestCase):
+    """Tests exporting the metrics."""
+
+    def test_no_token(self):
+        """Test the export is off without a token."""
+        self.get('metrics')
+        self.response_404()
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_wrong_token(self):
+        """Test the token is required."""
+        self.get('metrics')
+        self.response_403()
+        self.get('metrics', extra={'HTTP_AUTHORIZATION': 'Bearer wrong'})
+        self.response_403()
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_export(self):
+        """Test exporting the metrics."""
+        self.get('metrics')
+        self.get('metrics', extra={'HTTP_AUTHORIZATION': 'Bearer secret'})
+        self.response_200()
+        self.assertTrue(self.last_response['Content-Type'].startswith(
+            'text/plain; version=0.0.4'))
+        self.assertIn(
+            b'rovercode_responses_total{view="metrics",method="GET",'
+            b'status="403"}',
+            self.last_response.content)
@@ -0,0 +1,197 @@
+"""Rovercode Web test request profiling."""
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.test import RequestFactory
+from test_plus.test import TestCase
+
+from rovercode_web import profiling
+from rovercode_web.profiling import frame_name
+from rovercode_web.profiling import get_profile
+from rovercode_web.profiling import list_profiles
+from rovercode_web.profiling import profile
+from rovercode_web.profiling import Sampler
+from rovercode_web.profiling import save_profile
+from rovercode_web.profiling import should_profile
+from rovercode_web.profiling import to_collapsed
+from rovercode_web.profiling import to_speedscope
+
+PROFILE = {
+    'id': 'a' * 32,
+    'view': 'CourseViewSet',
+    'method': 'GET',
+    'path': '/api/v1/courses/',
+    'started': '2021-03-05T03:33:00+00:00',
+    'duration': 0.02,
+    'interval': 0.005,
+    'samples': [
+        [['manage.py:<module>:1', 'api/views.py:list:10'], 3],
+        [['manage.py:<module>:1'], 1],
+    ],
+}
+
+
+def busy_function(duration):
+    """Keep the CPU busy."""
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        pass
+
+
+class TestSampler(TestCase):
+    """Tests sampling stacks."""
+
+    def test_sample(self):
+        """Test sampling the current thread."""
+        sampler = Sampler(threading.get_ident(), 0.001)
+        sampler.start()
+        busy_function(0.05)
+        sampler.stop()
+
+        self.assertTrue(sampler.samples)
+        name = frame_name(busy_function.__code__)
+        self.assertEqual(
+            'rovercode_web/tests/test_profiling.py:busy_function:39', name)
+        self.assertTrue(any(
+            stack[-1] == name for stack in sampler.samples))
+
+    def test_sample_finished_thread(self):
+        """Test sampling a thread that has finished."""
+        sampler = Sampler(-1, 0.001)
+        sampler.sample()
+        self.assertFalse(sampler.samples)
+
+    def test_frame_name_outside_path(self):
+        """Test naming functions from files outside the import path."""
+        code = compile('pass', '/nowhere/script.py', 'exec')
+        with patch.object(sys, 'path', ['', '/elsewhere']):
+            self.assertEqual('/nowhere/script.py:<module>:1', frame_name(code))
+
+
+class TestShouldProfile(TestCase):
+    """Tests selecting requests to profile."""
+
+    def test_token(self):
+        """Test selecting requests with the token."""
+        request = RequestFactory().get('/', HTTP_X_PROFILE='secret')
+        self.assertFalse(should_profile(request, 'CourseViewSet'))
+        with override_settings(PROFILER_TOKEN='secret'):
+            self.assertTrue(should_profile(request, 'CourseViewSet'))
+        with override_settings(PROFILER_TOKEN='other'):
+            self.assertFalse(should_profile(request, 'CourseViewSet'))
+
+    @override_settings(PROFILER_SAMPLE_RATES={'CourseViewSet': 0.5})
+    def test_sample_rate(self):
+        """Test selecting requests at random."""
+        request = RequestFactory().get('/')
+        with patch('random.random', return_value=0.4):
+            self.assertTrue(should_profile(request, 'CourseViewSet'))
+            self.assertFalse(should_profile(request, 'LessonViewSet'))
+        with patch('random.random', return_value=0.6):
+            self.assertFalse(should_profile(request, 'CourseViewSet'))
+
+
+class TestStorage(TestCase):
+    """Tests storing profiles."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = os.path.join(temporary.name, 'profiles')
+        settings_override = override_settings(
+            PROFILER_DIR=self.directory, PROFILER_BUFFER_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_profile(self):
+        """Test profiling a block."""
+        request = RequestFactory().post('/api/v1/courses/')
+        with profile(request, 'CourseViewSet') as profile_id:
+            busy_function(0.02)
+
+        data = get_profile(profile_id)
+        self.assertEqual('CourseViewSet', data['view'])
+        self.assertEqual('POST', data['method'])
+        self.assertEqual('/api/v1/courses/', data['path'])
+        self.assertGreaterEqual(data['duration'], 0.02)
+
+    @override_settings(PROFILER_MAX_ACTIVE=1)
+    def test_too_many_active(self):
+        """Test only so many requests are profiled at once."""
+        request = RequestFactory().get('/')
+        with profile(request, 'CourseViewSet') as first:
+            with profile(request, 'CourseViewSet') as second:
+                pass
+        self.assertIsNotNone(first)
+        self.assertIsNone(second)
+        self.assertEqual(1, len(list_profiles()))
+        self.assertEqual(0, profiling._active)
+
+    def test_gevent(self):
+        """Test requests are not profiled under gevent."""
+        with patch.object(profiling, 'monkey') as monkey:
+            monkey.is_module_patched.return_value = False
+            self.assertTrue(profiling.is_supported())
+            monkey.is_module_patched.return_value = True
+            self.assertFalse(profiling.is_supported())
+            with profile(RequestFactory().get('/'), 'CourseViewSet') as id_:
+                self.assertIsNone(id_)
+            monkey.is_module_patched.assert_called_with('threading')
+        self.assertEqual([], list_profiles())
+        self.assertEqual(0, profiling._active)
+
+    def test_ring_buffer(self):
+        """Test only the newest profiles are kept."""
+        self.assertEqual([], list_profiles())
+        for number in range(3):
+            save_profile(dict(PROFILE, id=str(number) * 32))
+
+        profiles = list_profiles()
+        self.assertEqual(['2' * 32, '1' * 32], [p['id'] for p in profiles])
+        self.assertEqual(4, profiles[0]['sample_count'])
+        self.assertIsNone(get_profile('0' * 32))
+
+    def test_dropped_concurrently(self):
+        """Test profiles dropped by another process in the meantime."""
+        save_profile(PROFILE)
+        with patch('os.remove', side_effect=FileNotFoundError):
+            save_profile(PROFILE)
+            save_profile(PROFILE)
+
+        with patch('builtins.open', side_effect=FileNotFoundError):
+            self.assertEqual([], list_profiles())
+
+
+class TestFormats(TestCase):
+    """Tests converting profiles."""
+
+    def test_collapsed(self):
+        """Test converting to collapsed stacks."""
+        self.assertEqual(
+            'manage.py:<module>:1;api/views.py:list:10 3\n'
+            'manage.py:<module>:1 1\n',
+            to_collapsed(PROFILE))
+
+    def test_speedscope(self):
+        """Test converting to the speedscope format."""
+        data = to_speedscope(PROFILE)
+        self.assertEqual([
+            {'name': '<module>', 'file': 'manage.py', 'line': 1},
+            {'name': 'list', 'file': 'api/views.py', 'line': 10},
+        ], data['shared']['frames'])
+        self.assertEqual({
+            'type': 'sampled',
+            'name': 'GET /api/v1/courses/ (CourseViewSet)',
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': 0.02,
+            'samples': [[0, 1], [0]],
+            'weights': [0.015, 0.005],
+        }, data['profiles'][0])
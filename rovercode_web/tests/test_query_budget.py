@@ -0,0 +1,120 @@
+"""Rovercode Web test query budgets."""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import override_settings
+from django.test import RequestFactory
+from django.urls import resolve
+from django.urls import reverse
+from rest_framework_simplejwt.views import TokenRefreshView
+from test_plus.test import TestCase
+
+from mission_control.models import Tag
+from rovercode_web.db import LAG_SQL
+from rovercode_web.query_budget import assert_constant_queries
+from rovercode_web.query_budget import get_budget
+from rovercode_web.query_budget import QueryBudgetExceeded
+from rovercode_web.query_budget import QueryBudgetMiddleware
+from rovercode_web.query_budget import record_queries
+
+User = get_user_model()
+
+
+def count_users(times):
+    """Make a view counting the users some number of times."""
+    def get_response(request):
+        with transaction.atomic():
+            for _ in range(times):
+                User.objects.count()
+        return HttpResponse()
+    return get_response
+
+
+class TestQueryBudget(TestCase):
+    """Tests checking the query budgets."""
+
+    def request(self, url, method='get'):
+        """Make a request resolved to the view at the URL."""
+        request = getattr(RequestFactory(), method)(url)
+        request.resolver_match = resolve(url)
+        return request
+
+    def test_get_budget(self):
+        """Test looking up the budget of the view's action."""
+        self.assertEqual(
+            ('TagViewSet.list', 1),
+            get_budget(self.request(reverse('api:v1:tag-list'))))
+        self.assertIsNone(get_budget(
+            self.request(reverse('api:v1:tag-list'), 'post')))
+        self.assertIsNone(get_budget(self.request(reverse('metrics'))))
+        self.assertIsNone(get_budget(RequestFactory().get('/')))
+
+    def test_get_budget_by_method(self):
+        """Test looking up the budget of a view that is not a viewset."""
+        request = self.request(reverse('api:api-token-refresh'), 'post')
+        self.assertIsNone(get_budget(request))
+        with patch.object(TokenRefreshView, 'query_budgets', {'post': 0},
+                          create=True):
+            self.assertEqual(
+                ('TokenRefreshView.post', 0), get_budget(request))
+
+    def test_within_budget(self):
+        """Test views within their budget, not counting savepoints."""
+        request = self.request(reverse('api:v1:tag-list'))
+        response = QueryBudgetMiddleware(count_users(1))(request)
+        self.assertEqual(200, response.status_code)
+
+    def test_over_budget(self):
+        """Test views over their budget fail, showing the queries."""
+        request = self.request(reverse('api:v1:tag-list'))
+        with self.assertRaises(QueryBudgetExceeded) as context:
+            QueryBudgetMiddleware(count_users(2))(request)
+        message = str(context.exception)
+        self.assertTrue(message.startswith(
+            'TagViewSet.list made 2 queries, over its budget of 1:\n'
+            '  2 x SELECT COUNT(*)'))
+
+    @override_settings(QUERY_BUDGET_EXCEEDED='log')
+    def test_over_budget_logged(self):
+        """Test views over their budget can be logged instead."""
+        request = self.request(reverse('api:v1:tag-list'))
+        with self.assertLogs('rovercode_web.query_budget', 'WARNING'):
+            response = QueryBudgetMiddleware(count_users(2))(request)
+        self.assertEqual(200, response.status_code)
+
+    def test_lag_checks_not_counted(self):
+        """Test the replica lag checks are left out."""
+        with record_queries() as queries:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+        self.assertEqual([], queries)
+
+
+class TestConstantQueries(TestCase):
+    """Tests checking the queries do not grow with the data."""
+
+    @staticmethod
+    def grow(count):
+        """Add tags."""
+        start = Tag.objects.count()
+        for number in range(start, start + count):
+            Tag.objects.create(name=f'tag{number}')
+
+    def test_constant(self):
+        """Test a request whose queries stay the same."""
+        assert_constant_queries(lambda: list(Tag.objects.all()), self.grow)
+
+    def test_growing(self):
+        """Test a request whose queries grow with the data."""
+        def request():
+            for tag in Tag.objects.all():
+                Tag.objects.filter(pk=tag.pk).count()
+
+        with self.assertRaises(AssertionError) as context:
+            assert_constant_queries(request, self.grow, sizes=(1, 3))
+        self.assertTrue(str(context.exception).startswith(
+            'The queries grew with the data: [2, 4] queries for [1, 3] rows. '
+            'At 3 rows:\n  3 x SELECT COUNT(*)'))
@@ -0,0 +1,197 @@
+"""Rovercode Web test fast list serializers."""
+from unittest.mock import patch
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from test_plus.test import TestCase
+
+from api.views import BlockDiagramViewSet
+from curriculum.models import Course
+from curriculum.models import Lesson
+from curriculum.models import ProgressState
+from curriculum.models import State
+from curriculum.serializers import CourseSerializer
+from curriculum.serializers import LessonSerializer
+from mission_control.models import BlockDiagram
+from mission_control.models import BlockDiagramBlogQuestion
+from mission_control.models import BlogAnswer
+from mission_control.models import BlogQuestion
+from mission_control.models import Tag
+from mission_control.serializers import BlockDiagramSerializer
+from mission_control.serializers import UserSerializer
+from rovercode_web import serializers as flat_serializers
+from rovercode_web.serializers import FlatListSerializer
+
+
+class ShoutingUserSerializer(UserSerializer):
+    """A serializer with its own to_representation."""
+
+    def to_representation(self, instance):
+        """Serialize the user, shouting."""
+        return {'username': instance.username.upper()}
+
+
+class OddSerializer(serializers.ModelSerializer):
+    """A serializer with fields read as DRF does."""
+
+    size = serializers.CharField(source='content_size')
+    owner_tag_ids = serializers.PrimaryKeyRelatedField(
+        source='owner_tags', many=True, read_only=True)
+    admin_tags = serializers.StringRelatedField(many=True)
+    user = ShoutingUserSerializer()
+
+    class Meta:
+        """Meta class."""
+
+        model = BlockDiagram
+        fields = ('id', 'size', 'owner_tag_ids', 'admin_tags', 'user')
+        list_serializer_class = FlatListSerializer
+
+
+class TagUsesSerializer(serializers.ModelSerializer):
+    """A serializer of the block diagrams using tags."""
+
+    admin_block_diagrams = serializers.StringRelatedField(many=True)
+
+    class Meta:
+        """Meta class."""
+
+        model = Tag
+        fields = ('name', 'admin_block_diagrams')
+        list_serializer_class = FlatListSerializer
+
+
+class TestFlatListSerializer(TestCase):
+    """Tests the fast list serializer gives the same JSON as DRF's."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        super().setUp()
+        self.patcher = patch('requests.post')
+        self.mock_post = self.patcher.start()
+        self.mock_post.return_value.status_code = 404
+
+        self.user = self.make_user()
+        self.student = self.make_user('student')
+        question = BlogQuestion.objects.create(question='Why?')
+        tags = [
+            Tag.objects.create(name=f'tag{number}') for number in range(3)]
+        self.course = Course.objects.create(name='Course')
+        for number in range(3):
+            reference = BlockDiagram.objects.create(
+                user=self.user, name=f'Lesson {number}',
+                content='<xml></xml>', description=f'Lesson {number} é')
+            Lesson.objects.create(
+                course=self.course, reference=reference,
+                sequence_number=number,
+                tutorial_link='https://example.com' if number else None,
+                goals='Goals' if number else None)
+
+        lessons = list(Lesson.objects.order_by('sequence_number'))
+        for number in range(4):
+            bd = BlockDiagram.objects.create(
+                user=self.student, name=f'Program {number}',
+                content='<xml><block type="motor_stop"></block></xml>',
+                lesson=lessons[number] if number < 3 else None,
+                state=State.objects.create(
+                    progress=ProgressState.COMPLETE) if number else None)
+            bd.owner_tags.add(*tags[:number])
+            bd.admin_tags.add(*tags[number:])
+            blog_question = BlockDiagramBlogQuestion.objects.create(
+                block_diagram=bd, blog_question=question, sequence_number=1,
+                required=bool(number % 2))
+            if number % 2:
+                BlogAnswer.objects.create(
+                    block_diagram_blog_question=blog_question,
+                    answer='Because')
+
+    def tearDown(self):
+        """Tear down the tests."""
+        super().tearDown()
+        self.patcher.stop()
+
+    def assertSameJSON(self, serializer_class, instances, **context):
+        """Check the fast serializer matches DRF's, byte for byte."""
+        expected = serializers.ListSerializer(
+            instances, child=serializer_class(), context=context).data
+        serializer = serializer_class(instances, many=True, context=context)
+        self.assertIsInstance(serializer, FlatListSerializer)
+        self.assertEqual(
+            JSONRenderer().render(expected),
+            JSONRenderer().render(serializer.data))
+
+    def request(self, path='/'):
+        """Make a request from the student."""
+        request = Request(APIRequestFactory().get(path))
+        request.user = self.student
+        return request
+
+    def test_block_diagrams(self):
+        """Test serializing block diagrams."""
+        instances = BlockDiagram.objects.order_by('pk')
+        self.assertSameJSON(
+            BlockDiagramSerializer, instances, request=self.request())
+        self.assertSameJSON(
+            BlockDiagramSerializer, instances,
+            request=self.request('/?metrics=true'))
+        # As the API fetches them
+        self.assertSameJSON(
+            BlockDiagramSerializer,
+            list(BlockDiagramViewSet._with_related(instances)),
+            request=self.request())
+
+    def test_lessons(self):
+        """Test serializing lessons, with and without the remixes."""
+        instances = Lesson.objects.order_by('sequence_number')
+        self.assertSameJSON(
+            LessonSerializer, instances, request=self.request())
+        self.assertSameJSON(
+            LessonSerializer, instances, request=self.request(),
+            remixes={})
+
+    def test_courses(self):
+        """Test serializing the lessons nested in courses."""
+        context = {'request': self.request()}
+        data = CourseSerializer(self.course, context=context).data
+        expected = serializers.ListSerializer(
+            self.course.lessons, child=LessonSerializer(),
+            context=context).data
+        self.assertEqual(
+            JSONRenderer().render(expected),
+            JSONRenderer().render(data['lessons']))
+
+    def test_fields_read_as_drf_does(self):
+        """Test fields and serializers the fast path does not recognize."""
+        instances = list(BlockDiagram.objects.order_by('pk'))
+        instances.append(BlockDiagram(user=self.user, name='Unsaved'))
+        self.assertSameJSON(OddSerializer, instances)
+        self.assertSameJSON(TagUsesSerializer, Tag.objects.order_by('pk'))
+        self.assertSameJSON(
+            TagUsesSerializer,
+            list(Tag.objects.prefetch_related('admin_block_diagrams')))
+        self.assertEqual(
+            [{'username': 'STUDENT'}],
+            FlatListSerializer([self.student],
+                               child=ShoutingUserSerializer()).data)
+
+    def test_plans(self):
+        """Test the fields read directly are recognized."""
+        BlockDiagramSerializer(
+            BlockDiagram.objects.all(), many=True,
+            context={'request': self.request()}).data
+        plans = {
+            name: kind
+            for (serializer_class, _), plan in flat_serializers._plans.items()
+            if serializer_class is BlockDiagramSerializer
+            for name, kind, _, _ in plan
+        }
+        self.assertEqual('plain', plans['name'])
+        self.assertEqual('plain', plans['lesson'])
+        self.assertEqual('strings', plans['admin_tags'])
+        self.assertEqual('method', plans['tags'])
+        self.assertEqual('nested', plans['user'])
+        self.assertEqual('nested_many', plans['blog_questions'])
+        self.assertEqual('pk', plans['reference_of'])
+        self.assertEqual('field', plans['blog_answers'])
@@ -0,0 +1,74 @@
+"""Users authentication."""
+from urllib.parse import parse_qs
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# Claims copied onto users built from a token, by field name
+TOKEN_USER_FIELDS = ('username', )
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    Authenticate with a JWT, only loading the user when writing.
+
+    Safe requests get a user built from the token's claims without a query.
+    Its other fields are deferred and loaded together the first time one is
+    read (see User.refresh_from_db). Such requests therefore trust the
+    token until it expires, even if the user has since been deactivated or
+    deleted. Other requests load and check the user as before.
+    """
+
+    stateless = False
+
+    def authenticate(self, request):
+        """Authenticate the request."""
+        self.stateless = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        """Get the user the token was issued to."""
+        if not self.stateless:
+            return super().get_user(validated_token)
+
+        try:
+            field_names = [api_settings.USER_ID_FIELD]
+            values = [validated_token[api_settings.USER_ID_CLAIM]]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'))
+        for name in TOKEN_USER_FIELDS:
+            if name in validated_token:
+                field_names.append(name)
+                values.append(validated_token[name])
+
+        user = User.from_db(None, field_names, values)
+        user.from_token = True
+        return user
+
+
+def authenticate_query_string(query_string):
+    """
+    Authenticate a websocket by the JWT in its query string, ?token=<JWT>.
+
+    Browsers cannot send headers with websockets. Returns the user, loaded
+    and checked, and the token's claims, or an anonymous user and no claims.
+    """
+    raw_token = parse_qs(query_string.decode()).get('token')
+    if not raw_token:
+        return AnonymousUser(), {}
+
+    authenticator = JWTAuthentication()
+    try:
+        token = authenticator.get_validated_token(raw_token[0])
+        return authenticator.get_user(token), token.payload
+    except AuthenticationFailed:
+        return AnonymousUser(), {}
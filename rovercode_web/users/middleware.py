@@ -0,0 +1,27 @@
+"""Users websocket middleware."""
+from channels.auth import UserLazyObject
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+
+from .authentication import authenticate_query_string
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate websockets by the JWT in their query string.
+
+    Sets the scope's user, and its token to the claims, as request.user and
+    request.auth are for the API.
+    """
+
+    def populate_scope(self, scope):
+        """Make room for the user and the claims."""
+        scope['user'] = UserLazyObject()
+        scope['token'] = {}
+
+    async def resolve_scope(self, scope):
+        """Authenticate the user."""
+        user, claims = await database_sync_to_async(
+            authenticate_query_string)(scope.get('query_string', b''))
+        scope['user']._wrapped = user
+        scope['token'].update(claims)
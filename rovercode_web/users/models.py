@@ -17,6 +17,16 @@ class User(AbstractUser):
     name = models.CharField(_('Name of User'), blank=True, max_length=255)
     show_guide = models.BooleanField(default=True)
 
+    # Set on users built from a token's claims, with their other fields
+    # deferred until they are needed
+    from_token = False
+
     def __str__(self):
         """Return the string representation."""
         return str(self.username)
+
+    def refresh_from_db(self, using=None, fields=None):
+        """Reload fields, loading all the deferred ones of a token's user."""
+        if self.from_token and fields is not None:
+            fields = set(fields) | self.get_deferred_fields()
+        super().refresh_from_db(using, fields)
@@ -0,0 +1,122 @@
+"""Revocation of refresh tokens, stored in the cache."""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+
+REVOKED_KEY = 'revoked-token:{}'
+
+
+class BloomFilter:
+    """
+    A set that may wrongly claim to contain an item, but never misses one.
+
+    Sized for a capacity of items at an error rate of false claims.
+    """
+
+    def __init__(self, capacity, error_rate):
+        """Make an empty filter."""
+        self.size = max(8, math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _indexes(self, item):
+        """Get the bits the item sets, by double hashing."""
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return (
+            (first + number * second) % self.size
+            for number in range(self.hash_count))
+
+    def add(self, item):
+        """Add an item."""
+        for index in self._indexes(item):
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, item):
+        """Check whether the item may have been added."""
+        return all(
+            self.bits[index >> 3] & (1 << (index & 7))
+            for index in self._indexes(item))
+
+
+class RevokedTokens:
+    """
+    The token ids this process has revoked or seen revoked.
+
+    Items cannot be removed from a Bloom filter, so two generations are
+    kept, each replaced after a refresh token lifetime, by when the tokens
+    it holds have expired.
+    """
+
+    def __init__(self):
+        """Start with no tokens."""
+        self._lock = threading.Lock()
+        self._filters = [self._new_filter()]
+        self._started = time.monotonic()
+
+    @staticmethod
+    def _new_filter():
+        """Make an empty filter."""
+        return BloomFilter(
+            settings.REVOKED_TOKENS_CAPACITY,
+            settings.REVOKED_TOKENS_ERROR_RATE)
+
+    def _rotate(self):
+        """Start a new generation once the current one is old enough."""
+        lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        if time.monotonic() - self._started >= lifetime:
+            self._filters = [self._new_filter(), self._filters[0]]
+            self._started = time.monotonic()
+
+    def add(self, jti):
+        """Remember a revoked token."""
+        with self._lock:
+            self._rotate()
+            self._filters[0].add(jti)
+
+    def __contains__(self, jti):
+        """Check whether the token may be revoked."""
+        return any(jti in bloom for bloom in self._filters)
+
+
+_revoked = RevokedTokens()
+
+
+def _timeout(token):
+    """Get the seconds left until the token expires, at least one."""
+    return max(1, int(token['exp'] - time.time()))
+
+
+def is_revoked(token):
+    """
+    Check whether the token was revoked.
+
+    Tokens this process has not seen revoked are answered from its Bloom
+    filter without going to the cache. The filter does not hear of other
+    processes' revocations, so anything relying on the answer must also
+    revoke the token with revoke(), which is decided by the cache.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    if jti not in _revoked:
+        return False
+
+    return cache.get(REVOKED_KEY.format(jti)) is not None
+
+
+def revoke(token):
+    """
+    Revoke the token until it expires.
+
+    Returns whether it was revoked now, rather than already revoked, so of
+    two requests using the same token only one goes ahead.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    _revoked.add(jti)
+    return cache.add(REVOKED_KEY.format(jti), True, _timeout(token))
@@ -4,6 +4,7 @@ import logging
 from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from rovercode_web.metrics import timing
 from rovercode_web.users.utils import JwtObtainPairSerializer
 
 import requests
@@ -21,12 +22,14 @@ def create_new_user(sender, instance, created, **kwargs):
     token['admin'] = True
     auth_jwt = str(token)
 
-    response = requests.post(
-        f'{settings.SUBSCRIPTION_SERVICE_HOST}/api/v1/customer/', json={
-            "id": instance.id,
-        },
-        headers={'Authorization': f'JWT {auth_jwt}'}
-    )
+    with timing('http'):
+        response = requests.post(
+            f'{settings.SUBSCRIPTION_SERVICE_HOST}/api/v1/customer/', json={
+                "id": instance.id,
+            },
+            headers={'Authorization': f'JWT {auth_jwt}'},
+            timeout=settings.EXTERNAL_SERVICE_TIMEOUT,
+        )
 
     if response.status_code != 200:
         LOGGER.error(
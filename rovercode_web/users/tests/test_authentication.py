@@ -0,0 +1,108 @@
+"""Authentication tests."""
+from django.conf import settings
+from django.db.models.signals import post_save
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+from test_plus.test import TestCase
+
+from rovercode_web.users.authentication import authenticate_query_string
+from rovercode_web.users.authentication import JWTAuthentication
+
+
+class TestJWTAuthentication(TestCase):
+    """Test authenticating with JWTs."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        post_save.disconnect(
+            sender=settings.AUTH_USER_MODEL, dispatch_uid='new_user')
+        self.user = self.make_user()
+        self.user.email = 'user@example.com'
+        self.user.save()
+
+    def authenticate(self, method='get', token=None):
+        """Authenticate a request with a token for the user."""
+        if token is None:
+            token = AccessToken.for_user(self.user)
+            token['username'] = self.user.username
+        request = getattr(APIRequestFactory(), method)(
+            '/', HTTP_AUTHORIZATION=f'JWT {token}')
+        return JWTAuthentication().authenticate(request)
+
+    def test_safe_method(self):
+        """Test safe requests get a user from the token."""
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+            self.assertEqual(self.user.pk, user.pk)
+            self.assertEqual('testuser', user.username)
+            self.assertEqual(self.user, user)
+            self.assertTrue(user.is_authenticated)
+
+        with self.assertNumQueries(1):
+            self.assertEqual('user@example.com', user.email)
+            self.assertFalse(user.is_staff)
+            self.assertTrue(user.show_guide)
+
+    def test_without_username(self):
+        """Test tokens without the username claim."""
+        user, _ = self.authenticate(token=AccessToken.for_user(self.user))
+        with self.assertNumQueries(1):
+            self.assertEqual('testuser', user.username)
+
+    def test_without_user_id(self):
+        """Test tokens without the user id."""
+        token = AccessToken.for_user(self.user)
+        del token['user_id']
+        with self.assertRaises(InvalidToken):
+            self.authenticate(token=token)
+        with self.assertRaises(InvalidToken):
+            self.authenticate('post', token=token)
+
+    def test_unsafe_method(self):
+        """Test other requests load and check the user."""
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate('post')
+        self.assertFalse(user.from_token)
+        self.assertFalse(user.get_deferred_fields())
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('post')
+        self.assertIsNotNone(self.authenticate())
+
+
+class TestAuthenticateQueryString(TestCase):
+    """Test authenticating websockets with JWTs."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        post_save.disconnect(
+            sender=settings.AUTH_USER_MODEL, dispatch_uid='new_user')
+        self.user = self.make_user()
+
+    def test_token(self):
+        """Test the user is loaded and checked."""
+        token = AccessToken.for_user(self.user)
+        token['tier'] = 2
+        with self.assertNumQueries(1):
+            user, claims = authenticate_query_string(
+                f'token={token}'.encode())
+        self.assertEqual(self.user, user)
+        self.assertFalse(user.from_token)
+        self.assertEqual(2, claims['tier'])
+
+        self.user.is_active = False
+        self.user.save()
+        user, claims = authenticate_query_string(f'token={token}'.encode())
+        self.assertFalse(user.is_authenticated)
+        self.assertEqual({}, claims)
+
+    def test_no_token(self):
+        """Test websockets without a valid token are anonymous."""
+        for query_string in (b'', b'other=1', b'token=invalid'):
+            user, claims = authenticate_query_string(query_string)
+            self.assertFalse(user.is_authenticated)
+            self.assertEqual({}, claims)
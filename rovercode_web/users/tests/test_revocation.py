@@ -0,0 +1,76 @@
+"""Revocation tests."""
+import datetime
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from rest_framework_simplejwt.tokens import RefreshToken
+from test_plus.test import TestCase
+
+from rovercode_web.users import revocation
+from rovercode_web.users.revocation import BloomFilter
+from rovercode_web.users.revocation import RevokedTokens
+
+
+class TestBloomFilter(TestCase):
+    """Test the Bloom filter."""
+
+    def test_contains(self):
+        """Test added items are always found, and others seldom are."""
+        bloom = BloomFilter(1000, 0.01)
+        items = [f'item{number}' for number in range(1000)]
+        for item in items:
+            bloom.add(item)
+
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(
+            f'other{number}' in bloom for number in range(10000))
+        self.assertLess(false_positives, 200)
+
+
+class TestRevokedTokens(TestCase):
+    """Test the filter of revoked tokens."""
+
+    def test_generations(self):
+        """Test revoked tokens are kept for at least a token lifetime."""
+        lifetime = datetime.timedelta(days=7).total_seconds()
+        with patch('time.monotonic', return_value=0):
+            revoked = RevokedTokens()
+            revoked.add('first')
+        with patch('time.monotonic', return_value=lifetime):
+            revoked.add('second')
+            self.assertIn('first', revoked)
+        with patch('time.monotonic', return_value=2 * lifetime):
+            revoked.add('third')
+        self.assertNotIn('first', revoked)
+        self.assertIn('second', revoked)
+        self.assertIn('third', revoked)
+
+
+class TestRevocation(TestCase):
+    """Test revoking tokens."""
+
+    def setUp(self):
+        """Initialize the tests."""
+        post_save.disconnect(
+            sender=settings.AUTH_USER_MODEL, dispatch_uid='new_user')
+        self.token = RefreshToken.for_user(self.make_user())
+
+    def test_revoke(self):
+        """Test revoking a token."""
+        self.assertFalse(revocation.is_revoked(self.token))
+        self.assertTrue(revocation.revoke(self.token))
+        self.assertTrue(revocation.is_revoked(self.token))
+        self.assertFalse(revocation.revoke(self.token))
+
+    def test_revoked_by_another_process(self):
+        """Test tokens revoked elsewhere can only be revoked once."""
+        revocation.revoke(self.token)
+        with patch.object(revocation, '_revoked', RevokedTokens()):
+            self.assertFalse(revocation.is_revoked(self.token))
+            self.assertFalse(revocation.revoke(self.token))
+
+    def test_false_positive(self):
+        """Test tokens wrongly found in the filter are checked."""
+        with patch.object(RevokedTokens, '__contains__', return_value=True):
+            self.assertFalse(revocation.is_revoked(self.token))
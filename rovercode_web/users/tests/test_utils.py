@@ -4,7 +4,9 @@ from django.db.models.signals import post_save
 from django.test import override_settings
 from test_plus.test import TestCase
 
+import requests
 import responses
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from rovercode_web.users.utils import JwtObtainPairSerializer
@@ -33,6 +35,18 @@ class TestUtils(TestCase):
         self.assertEqual(len(responses.calls), 1)
         self.assertEqual(payload['tier'], 1)
 
+    @responses.activate
+    def test_jwt_payload_timeout(self):
+        """Test creating the JWT payload when the service is too slow."""
+        responses.add(
+            responses.GET,
+            f'http://test.test/api/v1/customer/{self.user.id}/',
+            body=requests.exceptions.ReadTimeout(),
+        )
+        payload = JwtObtainPairSerializer.get_token(self.user)
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(payload['tier'], 1)
+
     @responses.activate
     def test_jwt_payload(self):
         """Test creating the JWT payload."""
@@ -66,3 +80,22 @@ class TestUtils(TestCase):
         token = RefreshToken(serializer.validated_data['refresh'])
         self.assertEqual(token['show_guide'], self.user.show_guide)
         self.assertEqual(token['tier'], 2)
+
+    @responses.activate
+    def test_jwt_refresh_reused(self):
+        """Test refresh tokens cannot be used again once rotated."""
+        responses.add(
+            responses.GET,
+            f'http://test.test/api/v1/customer/{self.user.id}/',
+            json={'subscription': {'plan': '2'}},
+            status=200
+        )
+        refresh_token = str(RefreshToken.for_user(self.user))
+        serializer = JwtRefreshSerializer(data={'refresh': refresh_token})
+        self.assertTrue(serializer.is_valid())
+        new_token = serializer.validated_data['refresh']
+
+        with self.assertRaises(TokenError):
+            JwtRefreshSerializer(data={'refresh': refresh_token}).is_valid()
+        self.assertTrue(
+            JwtRefreshSerializer(data={'refresh': new_token}).is_valid())
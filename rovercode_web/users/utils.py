@@ -2,12 +2,17 @@
 import json
 
 from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 
 import requests
 
+from rovercode_web.metrics import timing
+from rovercode_web.users import revocation
+
 
 class BaseJwtSerializer:
     """Base JWT serializer to customize claims."""
@@ -17,17 +22,20 @@ class BaseJwtSerializer:
         """Get the user's tier for the subscription service."""
         subscription_service = settings.SUBSCRIPTION_SERVICE_HOST
         try:
-            response = requests.get(
-                f'{subscription_service}/api/v1/customer/{user_id}/',
-                headers={'Authorization': f'JWT {auth_jwt}'}
-            )
+            with timing('http'):
+                response = requests.get(
+                    f'{subscription_service}/api/v1/customer/{user_id}/',
+                    headers={'Authorization': f'JWT {auth_jwt}'},
+                    timeout=settings.EXTERNAL_SERVICE_TIMEOUT,
+                )
             data = response.json()
             return int(data['subscription']['plan'])
         except (
             json.decoder.JSONDecodeError,
             KeyError,
             ValueError,
-            requests.exceptions.ConnectionError
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
         ):
             # If unable to determine tier, set to lowest
             return 1
@@ -54,10 +62,13 @@ class JwtRefreshSerializer(BaseJwtSerializer, TokenRefreshSerializer):
     """Custom serializer to add claims to the token."""
 
     def validate(self, attrs):
-        """Validate and return a new token."""
-        response = super().validate(attrs)
+        """Validate and return a new token, revoking the old one."""
+        refresh = RefreshToken(attrs['refresh'])
+        if revocation.is_revoked(refresh) or not revocation.revoke(refresh):
+            raise TokenError(_('Token is blacklisted'))
 
-        refresh = RefreshToken(response['refresh'])
+        refresh.set_jti()
+        refresh.set_exp()
         refresh['tier'] = self.get_user_tier(refresh['user_id'], str(refresh))
 
         return {
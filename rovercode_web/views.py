@@ -0,0 +1,26 @@
+"""Rovercode Web views."""
+import hmac
+
+from django.conf import settings
+from django.http import Http404
+from django.http import HttpResponse
+from django.http import HttpResponseForbidden
+
+from rovercode_web.metrics import collect
+from rovercode_web.metrics import render
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics(request):
+    """Export the request metrics for Prometheus, given METRICS_TOKEN."""
+    if not settings.METRICS_TOKEN:
+        raise Http404
+
+    expected = f'Bearer {settings.METRICS_TOKEN}'.encode()
+    provided = request.META.get('HTTP_AUTHORIZATION', '').encode()
+    if not hmac.compare_digest(provided, expected):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        render(collect()), content_type=PROMETHEUS_CONTENT_TYPE)